@@ -1,91 +1,64 @@
 import tkinter as tk 
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 import ttkbootstrap as tb
 import pandas as pd
 from pathlib import Path
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
-import os
-
-RUTA_DATOS = Path("Ventas.xlsx")
-HOJA_INVENTARIO = "Inventario"
-HOJA_CLIENTES   = "Clientes"
-HOJA_VENTAS     = "Ventas"
-
-def crear_archivo_excel_si_no_existe():
-    """Crea Ventas.xlsx con las hojas necesarias si no existe."""
-    if not RUTA_DATOS.exists():
-        with pd.ExcelWriter(RUTA_DATOS, engine="openpyxl") as writer:
-            pd.DataFrame(columns=["codigo", "nombre", "existencia", "proveedor", "precio"])\
-                .to_excel(writer, sheet_name=HOJA_INVENTARIO, index=False)
-            pd.DataFrame(columns=["codigo", "nombre", "direccion"])\
-                .to_excel(writer, sheet_name=HOJA_CLIENTES, index=False)
-            # Hoja Ventas con columnas estándar + alias para reportes
-            pd.DataFrame(columns=[
-                "id","fecha","producto","cliente","cantidad","precio_unit","total","anulada",
-                "Producto","Cliente"
-            ]).to_excel(writer, sheet_name=HOJA_VENTAS, index=False)
-        print(f"Creado {RUTA_DATOS}")
-
-def inicializar_excel():
-    """Valida que exista el archivo y al menos la hoja Inventario; si no, lo crea."""
-    try:
-        if not RUTA_DATOS.exists():
-            crear_archivo_excel_si_no_existe()
-        else:
-            pd.read_excel(RUTA_DATOS, sheet_name=HOJA_INVENTARIO, dtype={"codigo": str})
-    except Exception:
-        crear_archivo_excel_si_no_existe()
 
+import ejecutor
+import instrumentacion
+import nucleo_ventas
+import reportes
+import servidor
+from nucleo_ventas import HOJA_INVENTARIO, HOJA_CLIENTES, HOJA_VENTAS
 
-# INVENTARIO
+# Con VENTAS_SERVIDOR=http://host:puerto el inventario, los clientes y las ventas
+# se leen y modifican en el servidor (servidor.py) en lugar del libro local.
+nucleo = servidor.ClienteRemoto(servidor.URL_SERVIDOR) if servidor.URL_SERVIDOR else nucleo_ventas
 
-def leer_inventario() -> pd.DataFrame:
-    inicializar_excel()
-    return pd.read_excel(RUTA_DATOS, sheet_name=HOJA_INVENTARIO, dtype={"codigo": str})
+# Ejecutor de E/S de la ventana abierta; sin ventana (scripts, pruebas) todo corre en línea.
+_EJECUTOR = None
 
-def escribir_inventario(df: pd.DataFrame):
-    inicializar_excel()
-    with pd.ExcelWriter(RUTA_DATOS, engine="openpyxl", mode="a", if_sheet_exists="replace") as libro:
-        df.to_excel(libro, sheet_name=HOJA_INVENTARIO, index=False)
+def _mostrar_error(e):
+    if isinstance(e, nucleo.ErrorVentas):
+        messagebox.showerror("Error", str(e))
+    else:
+        messagebox.showerror("Error", f"Error inesperado: {e}")
+
+def _en_segundo_plano(trabajo, al_terminar=None, al_fallar=_mostrar_error, accion=None):
+    """Corre trabajo() fuera del hilo de Tk y entrega el resultado a al_terminar.
+
+    trabajo no debe tocar widgets; los callbacks sí, porque vuelven al bucle de Tk.
+    Con la traza activa, trabajo queda medido como una acción (accion o su nombre).
+    """
+    if instrumentacion.ACTIVA:
+        trabajo = instrumentacion.en_accion(accion or instrumentacion.nombre_accion(trabajo), trabajo)
+    if _EJECUTOR is None:
+        try:
+            resultado = trabajo()
+        except Exception as e:
+            if al_fallar:
+                al_fallar(e)
+            return
+        if al_terminar:
+            al_terminar(resultado)
+        return
+    _EJECUTOR.enviar(trabajo, al_terminar, al_fallar)
+
+
+# INVENTARIO
 
 def listar_productos(tabla: ttk.Treeview):
-    df = leer_inventario()
-    tabla.delete(*tabla.get_children())
-    for _, fila in df.iterrows():
-        tabla.insert("", "end", values=(fila["codigo"], fila["nombre"], fila["existencia"], fila["proveedor"], fila["precio"]))
+    _listar_en_tabla(
+        tabla, HOJA_INVENTARIO,
+        lambda: nucleo.leer_inventario()[["codigo", "nombre", "existencia", "proveedor", "precio"]],
+        clave="codigo"
+    )
 
 def crear_producto(codigo, nombre, existencia, proveedor, precio, tabla):
-    try:
-        codigo = str(codigo).strip()
-        nombre = str(nombre).strip()
-        proveedor = str(proveedor).strip()
-        existencia = int(float(existencia)) if str(existencia).strip() != "" else 0
-        precio = float(precio) if str(precio).strip() != "" else 0.0
-
-        if not codigo or not nombre:
-            raise ValueError("Código y nombre son obligatorios.")
-
-        df = leer_inventario()
-        if (df["codigo"].astype(str) == codigo).any():
-            raise ValueError(f"Ya existe un producto con código {codigo}.")
-
-        nuevo_producto = pd.DataFrame([{
-            "codigo": codigo,
-            "nombre": nombre,
-            "existencia": existencia,
-            "proveedor": proveedor,
-            "precio": precio
-        }])
-        df = pd.concat([df, nuevo_producto], ignore_index=True)
-        escribir_inventario(df)
+    def listo(_):
         listar_productos(tabla)
         messagebox.showinfo("Éxito", "Producto creado correctamente.")
-    except Exception as e:
-        messagebox.showerror("Error", str(e))
+    _en_segundo_plano(lambda: nucleo.crear_producto(codigo, nombre, existencia, proveedor, precio), listo)
 
 def actualizar_producto(tabla, nombre, existencia, proveedor, precio):
     try:
@@ -94,23 +67,14 @@ def actualizar_producto(tabla, nombre, existencia, proveedor, precio):
             raise ValueError("Selecciona un producto en la tabla.")
         valores = tabla.item(seleccion, "values")
         codigo_sel = valores[0]
+    except Exception as e:
+        messagebox.showerror("Error", str(e))
+        return
 
-        df = leer_inventario()
-        indice = df.index[df["codigo"].astype(str) == str(codigo_sel)]
-        if indice.empty:
-            raise ValueError("No se encontró el producto en el archivo.")
-
-        df.loc[indice, ["nombre", "existencia", "proveedor", "precio"]] = [
-            str(nombre).strip(),
-            int(float(existencia)),
-            str(proveedor).strip(),
-            float(precio)
-        ]
-        escribir_inventario(df)
+    def listo(_):
         listar_productos(tabla)
         messagebox.showinfo("Éxito", "Producto actualizado correctamente.")
-    except Exception as e:
-        messagebox.showerror("Error", str(e))
+    _en_segundo_plano(lambda: nucleo.actualizar_producto(codigo_sel, nombre, existencia, proveedor, precio), listo)
 
 def eliminar_producto(tabla):
     try:
@@ -118,26 +82,134 @@ def eliminar_producto(tabla):
         if not seleccion:
             raise ValueError("Selecciona un producto en la tabla.")
         codigo_sel = tabla.item(seleccion, "values")[0]
+    except Exception as e:
+        messagebox.showerror("Error", str(e))
+        return
 
-        if not messagebox.askyesno("Confirmar", f"¿Eliminar producto {codigo_sel}?"):
-            return
+    if not messagebox.askyesno("Confirmar", f"¿Eliminar producto {codigo_sel}?"):
+        return
 
-        df = leer_inventario()
-        df["codigo"] = df["codigo"].astype(str)
-        df = df[df["codigo"] != str(codigo_sel)]
-        escribir_inventario(df)
+    def listo(_):
         listar_productos(tabla)
         messagebox.showinfo("Éxito", "Producto eliminado correctamente.")
-    except Exception as e:
-        messagebox.showerror("Error", str(e))
+    _en_segundo_plano(lambda: nucleo.eliminar_producto(codigo_sel), listo)
+
+class TablaVirtual(ttk.Treeview):
+    """Treeview que no inserta todas las filas de una vez.
+
+    Guarda el DataFrame a mostrar y solo crea los ítems de la ventana visible
+    más un margen (SOBRECARGA); al acercarse al final con el scroll se
+    agrega el siguiente bloque. Si se indica una columna clave, cada ítem usa
+    esa clave como iid y al volver a mostrar solo se aplican las filas
+    insertadas, modificadas o borradas.
+    """
+    SOBRECARGA = 50
+
+    def __init__(self, parent, **kwargs):
+        super().__init__(parent, **kwargs)
+        self._datos = None
+        self._claves = None
+        self._clave = None
+        self._valores = {}
+        self._cargadas = 0
+        self._barra = None
+        self.version = None
+
+    def mostrar(self, df: pd.DataFrame, clave=None, version=None):
+        datos = df.reset_index(drop=True)
+        claves = datos[clave].astype(str) if clave else None
+        if clave is None or clave != self._clave or not claves.is_unique:
+            self.delete(*self.get_children())
+            self._valores = {}
+            self._datos, self._claves, self._clave = datos, (claves if clave and claves.is_unique else None), clave
+            self._cargadas = 0
+            self._cargar_mas()
+        else:
+            self._aplicar_diferencias(datos, claves)
+        self.version = version
+
+    def _aplicar_diferencias(self, datos: pd.DataFrame, claves: pd.Series):
+        n = min(len(datos), max(self._cargadas, int(self.cget("height")) + self.SOBRECARGA))
+        objetivo = list(claves.iloc[:n])
+        nuevos = {k: tuple(map(str, v)) for k, v in zip(objetivo, datos.iloc[:n].itertuples(index=False, name=None))}
+        for iid in self.get_children():
+            if iid not in nuevos:
+                self.delete(iid)
+                self._valores.pop(iid, None)
+        for pos, k in enumerate(objetivo):
+            valores = nuevos[k]
+            if k not in self._valores:
+                self.insert("", pos, iid=k, values=valores)
+            elif self._valores[k] != valores:
+                self.item(k, values=valores)
+            self._valores[k] = valores
+        if list(self.get_children()) != objetivo:
+            for pos, k in enumerate(objetivo):
+                self.move(k, "", pos)
+        self._datos, self._claves, self._cargadas = datos, claves, n
+
+    def filas_totales(self) -> int:
+        return 0 if self._datos is None else len(self._datos)
+
+    def _cargar_mas(self):
+        if self._datos is None or self._cargadas >= len(self._datos):
+            return
+        inicio = self._cargadas
+        fin = min(len(self._datos), inicio + int(self.cget("height")) + self.SOBRECARGA)
+        filas = self._datos.iloc[inicio:fin].itertuples(index=False, name=None)
+        if self._claves is None:
+            for valores in filas:
+                self.insert("", "end", values=valores)
+        else:
+            for k, valores in zip(self._claves.iloc[inicio:fin], filas):
+                valores = tuple(map(str, valores))
+                self.insert("", "end", iid=k, values=valores)
+                self._valores[k] = valores
+        self._cargadas = fin
+
+    def _al_desplazar(self, primero, ultimo):
+        if self._barra is not None:
+            self._barra.set(primero, ultimo)
+        if float(ultimo) >= 0.9 and self._datos is not None and self._cargadas < len(self._datos):
+            self.after_idle(self._cargar_mas)
+
+def _tabla_al_dia(tabla, version) -> bool:
+    """True si la tabla ya muestra esa versión de los datos (no hace falta releer)."""
+    return version is not None and getattr(tabla, "version", None) == version
+
+def _mostrar_en_tabla(tabla, df: pd.DataFrame, clave=None, version=None):
+    """Muestra el DataFrame en la tabla (virtual si fue creada con crear_tabla)."""
+    if isinstance(tabla, TablaVirtual):
+        tabla.mostrar(df, clave=clave, version=version)
+        return
+    tabla.delete(*tabla.get_children())
+    for valores in df.itertuples(index=False, name=None):
+        tabla.insert("", "end", values=valores)
+
+def _listar_en_tabla(tabla, hoja, obtener, clave):
+    """Lee en segundo plano y actualiza la tabla en el hilo de Tk.
+
+    Si la tabla ya muestra la versión actual de la hoja no se lee nada.
+    """
+    def trabajo():
+        version = nucleo.version(hoja)
+        if _tabla_al_dia(tabla, version):
+            return None
+        return obtener(), version
+
+    def mostrar(resultado):
+        if resultado is not None:
+            _mostrar_en_tabla(tabla, resultado[0], clave=clave, version=resultado[1])
+    _en_segundo_plano(trabajo, mostrar, accion=f"listar_{hoja.lower()}")
 
 def crear_tabla(parent, columnas, encabezados):
-    tabla = ttk.Treeview(parent, columns=columnas, show="headings", height=12)
+    tabla = TablaVirtual(parent, columns=columnas, show="headings", height=12)
     for c, h in zip(columnas, encabezados):
         tabla.heading(c, text=h)
         tabla.column(c, width=120, anchor="center")
     barra = ttk.Scrollbar(parent, orient="vertical", command=tabla.yview)
-    tabla.configure(yscrollcommand=barra.set)
+    tabla._barra = barra
+    tabla.configure(yscrollcommand=tabla._al_desplazar)
     tabla.grid(row=0, column=0, sticky="nsew")
     barra.grid(row=0, column=1, sticky="ns")
     parent.grid_rowconfigure(0, weight=1)
@@ -204,55 +276,15 @@ def pestaña_inventario(notebook):
 
 # CLIENTES
 
-def leer_clientes() -> pd.DataFrame:
-    """Lee la hoja Clientes y normaliza columnas."""
-    inicializar_excel()
-    try:
-        df = pd.read_excel(RUTA_DATOS, sheet_name=HOJA_CLIENTES, dtype={"codigo": str})
-        df.columns = [c.lower().strip() for c in df.columns]
-        for col in ["codigo", "nombre", "direccion"]:
-            if col not in df.columns:
-                df[col] = ""
-        return df[["codigo", "nombre", "direccion"]]
-    except Exception as e:
-        print("Error al leer clientes:", e)
-        return pd.DataFrame(columns=["codigo", "nombre", "direccion"])
-
-def escribir_clientes(df: pd.DataFrame):
-    """Escribe la hoja Clientes en el archivo sin tocar otras hojas."""
-    inicializar_excel()
-    try:
-        with pd.ExcelWriter(RUTA_DATOS, engine="openpyxl", mode="a", if_sheet_exists="replace") as writer:
-            df.to_excel(writer, sheet_name=HOJA_CLIENTES, index=False)
-    except Exception as e:
-        messagebox.showerror("Error", f"No se pudo escribir Clientes: {e}")
-
 def listar_clientes(tabla: ttk.Treeview):
-    df = leer_clientes()
-    tabla.delete(*tabla.get_children())
-    for _, fila in df.iterrows():
-        tabla.insert("", "end", values=(fila["codigo"], fila["nombre"], fila["direccion"]))
+    _listar_en_tabla(tabla, HOJA_CLIENTES, lambda: nucleo.leer_clientes()[["codigo", "nombre", "direccion"]],
+                     clave="codigo")
 
 def crear_cliente(codigo, nombre, direccion, tabla):
-    try:
-        codigo = str(codigo).strip()
-        nombre = str(nombre).strip()
-        direccion = str(direccion).strip()
-
-        if not codigo or not nombre or not direccion:
-            raise ValueError("Código, Nombre y Dirección son obligatorios.")
-
-        df = leer_clientes()
-        if (df["codigo"].astype(str) == codigo).any():
-            raise ValueError(f"Ya existe un cliente con código {codigo}.")
-
-        nuevo = pd.DataFrame([{"codigo": codigo, "nombre": nombre, "direccion": direccion}])
-        df = pd.concat([df, nuevo], ignore_index=True)
-        escribir_clientes(df)
+    def listo(_):
         listar_clientes(tabla)
         messagebox.showinfo("Éxito", "Cliente agregado correctamente.")
-    except Exception as e:
-        messagebox.showerror("Error", str(e))
+    _en_segundo_plano(lambda: nucleo.crear_cliente(codigo, nombre, direccion), listo)
 
 def actualizar_cliente(tabla, nombre, direccion):
     try:
@@ -260,21 +292,14 @@ def actualizar_cliente(tabla, nombre, direccion):
         if not seleccion:
             raise ValueError("Selecciona un cliente.")
         codigo_sel = tabla.item(seleccion, "values")[0]
+    except Exception as e:
+        messagebox.showerror("Error", str(e))
+        return
 
-        df = leer_clientes()
-        idx = df.index[df["codigo"].astype(str) == str(codigo_sel)]
-        if idx.empty:
-            raise ValueError("No se encontró el cliente en el archivo.")
-
-        if not nombre.strip() or not direccion.strip():
-            raise ValueError("Nombre y Dirección son obligatorios.")
-
-        df.loc[idx, ["nombre", "direccion"]] = [str(nombre).strip(), str(direccion).strip()]
-        escribir_clientes(df)
+    def listo(_):
         listar_clientes(tabla)
         messagebox.showinfo("Éxito", "Cliente actualizado correctamente.")
-    except Exception as e:
-        messagebox.showerror("Error", str(e))
+    _en_segundo_plano(lambda: nucleo.actualizar_cliente(codigo_sel, nombre, direccion), listo)
 
 def eliminar_cliente(tabla):
     try:
@@ -282,17 +307,17 @@ def eliminar_cliente(tabla):
         if not seleccion:
             raise ValueError("Selecciona un cliente.")
         codigo_sel = tabla.item(seleccion, "values")[0]
+    except Exception as e:
+        messagebox.showerror("Error", str(e))
+        return
 
-        if not messagebox.askyesno("Confirmar", f"¿Eliminar cliente {codigo_sel}?"):
-            return
+    if not messagebox.askyesno("Confirmar", f"¿Eliminar cliente {codigo_sel}?"):
+        return
 
-        df = leer_clientes()
-        df = df[df["codigo"].astype(str) != str(codigo_sel)]
-        escribir_clientes(df)
+    def listo(_):
         listar_clientes(tabla)
         messagebox.showinfo("Éxito", "Cliente eliminado correctamente.")
-    except Exception as e:
-        messagebox.showerror("Error", str(e))
+    _en_segundo_plano(lambda: nucleo.eliminar_cliente(codigo_sel), listo)
 
 def pestaña_clientes(notebook):
     pestaña = ttk.Frame(notebook)
@@ -330,281 +355,69 @@ def pestaña_clientes(notebook):
 
 # VENTAS 
 
-VENTAS_COLUMNS = ["id","fecha","producto","cliente","cantidad","precio_unit","total","anulada"]
-
-def _asegurar_hoja_ventas():
-    """Crea/normaliza la hoja Ventas sin tocar Inventario/Clientes."""
-    crear_archivo_excel_si_no_existe()
-    try:
-        libro = pd.ExcelFile(RUTA_DATOS)
-        if HOJA_VENTAS not in libro.sheet_names:
-            with pd.ExcelWriter(RUTA_DATOS, engine="openpyxl", mode="a") as w:
-                pd.DataFrame(columns=VENTAS_COLUMNS + ["Producto", "Cliente"]).to_excel(
-                    w, sheet_name=HOJA_VENTAS, index=False
-                )
-            return
-
-        df = pd.read_excel(RUTA_DATOS, sheet_name=HOJA_VENTAS)
-        for col in VENTAS_COLUMNS:
-            if col not in df.columns:
-                if col in ("cantidad","precio_unit","total"):
-                    df[col] = 0
-                elif col == "anulada":
-                    df[col] = False
-                else:
-                    df[col] = ""
-        if "Producto" not in df.columns:
-            df["Producto"] = df["producto"] if "producto" in df.columns else ""
-        if "Cliente" not in df.columns:
-            df["Cliente"] = df["cliente"] if "cliente" in df.columns else ""
-        base = [c for c in (VENTAS_COLUMNS + ["Producto","Cliente"]) if c in df.columns]
-        df = df[base + [c for c in df.columns if c not in base]]
-        with pd.ExcelWriter(RUTA_DATOS, engine="openpyxl", mode="a", if_sheet_exists="replace") as w:
-            df.to_excel(w, sheet_name=HOJA_VENTAS, index=False)
-    except Exception as e:
-        messagebox.showerror("Error", f"No se pudo preparar la hoja Ventas: {e}")
-
-def _ventas_leer_base() -> pd.DataFrame:
-    """Lee y normaliza la hoja Ventas."""
-    _asegurar_hoja_ventas()
-    df = pd.read_excel(RUTA_DATOS, sheet_name=HOJA_VENTAS)
-    for col in VENTAS_COLUMNS:
-        if col not in df.columns:
-            if col in ("cantidad","precio_unit","total"):
-                df[col] = 0
-            elif col == "anulada":
-                df[col] = False
-            else:
-                df[col] = ""
-    df["anulada"] = df["anulada"].fillna(False).astype(bool)
-    df["Producto"] = df.get("producto", "").astype(str) if "producto" in df.columns else ""
-    df["Cliente"]  = df.get("cliente", "").astype(str)  if "cliente"  in df.columns else ""
-    return df
-
-def escribir_ventas(df: pd.DataFrame) -> None:
-    """Escribe el DataFrame completo en la hoja Ventas (compatibilidad con reportes)."""
-    _asegurar_hoja_ventas()
-    for col in VENTAS_COLUMNS:
-        if col not in df.columns:
-            if col in ("cantidad","precio_unit","total"):
-                df[col] = 0
-            elif col == "anulada":
-                df[col] = False
-            else:
-                df[col] = ""
-    df["Producto"] = df["producto"].astype(str)
-    df["Cliente"]  = df["cliente"].astype(str)
-    base = [c for c in (VENTAS_COLUMNS + ["Producto","Cliente"]) if c in df.columns]
-    out = df[base + [c for c in df.columns if c not in base]]
-    with pd.ExcelWriter(RUTA_DATOS, engine="openpyxl", mode="a", if_sheet_exists="replace") as w:
-        out.to_excel(w, sheet_name=HOJA_VENTAS, index=False)
-
-def calcular_total(cantidad, precio_unit) -> float:
-    return float(cantidad) * float(precio_unit)
-
-def validar_existencia(codigo, cantidad) -> bool:
-    inv = leer_inventario().copy()
-    inv["codigo"] = inv["codigo"].astype(str)
-    try:
-        cantidad = float(cantidad)
-    except Exception:
-        return False
-    fila = inv.loc[inv["codigo"] == str(codigo)]
-    if fila.empty:
-        return False
-    existencia = float(fila.iloc[0]["existencia"])
-    return existencia >= cantidad
-
-def actualizar_stock(codigo: str, cantidad_vendida: float) -> None:
-    inv = leer_inventario()
-    inv["codigo"] = inv["codigo"].astype(str)
-    idx = inv.index[inv["codigo"] == str(codigo)]
-    if idx.empty:
-        raise ValueError(f"Producto {codigo} no existe en inventario.")
-    i = idx[0]
-    nuevo = float(inv.at[i, "existencia"]) - float(cantidad_vendida)
-    if nuevo < 0:
-        raise ValueError("Stock insuficiente.")
-    inv.at[i, "existencia"] = nuevo
-    escribir_inventario(inv)
-
-def restaurar_stock(codigo: str, cantidad: float) -> None:
-    inv = leer_inventario()
-    inv["codigo"] = inv["codigo"].astype(str)
-    idx = inv.index[inv["codigo"] == str(codigo)]
-    if idx.empty:
-        raise ValueError(f"Producto {codigo} no existe en inventario.")
-    i = idx[0]
-    nuevo = float(inv.at[i, "existencia"]) + float(cantidad)
-    inv.at[i, "existencia"] = nuevo
-    escribir_inventario(inv)
-
-def _siguiente_id(df: pd.DataFrame) -> int:
-    if df.empty or ("id" not in df.columns) or df["id"].isna().all():
-        return 1
-    return int(pd.to_numeric(df["id"], errors="coerce").max()) + 1
-
-def _nombre_producto_por_codigo(codigo: str) -> str:
-    inv = leer_inventario()
-    inv["codigo"] = inv["codigo"].astype(str)
-    fila = inv.loc[inv["codigo"] == str(codigo)]
-    if fila.empty:
-        raise ValueError(f"Código de producto {codigo} no existe.")
-    return str(fila.iloc[0]["nombre"])
-
-def _nombre_cliente_por_codigo(codigo: str) -> str:
-    cli = leer_clientes()
-    cli["codigo"] = cli["codigo"].astype(str)
-    fila = cli.loc[cli["codigo"] == str(codigo)]
-    if fila.empty:
-        raise ValueError(f"Código de cliente {codigo} no existe.")
-    return str(fila.iloc[0]["nombre"])
-
-def _codigo_producto_por_nombre(nombre: str) -> str:
-    inv = leer_inventario()
-    fila = inv.loc[inv["nombre"] == str(nombre)]
-    if fila.empty:
-        raise ValueError("Producto no encontrado en inventario para ajuste.")
-    return str(fila.iloc[0]["codigo"])
-
 def listar_ventas(tabla: ttk.Treeview):
-    df = _ventas_leer_base()
-    tabla.delete(*tabla.get_children())
-    if df.empty:
-        return
-    for _, f in df.iterrows():
-        tabla.insert("", "end", values=(
-            f.get("id", ""),
-            f.get("fecha", ""),
-            f.get("producto", ""),
-            f.get("cliente", ""),
-            f.get("cantidad", ""),
-            f.get("precio_unit", ""),
-            f.get("total", ""),
-            "Sí" if bool(f.get("anulada", False)) else "No"
-        ))
+    _listar_en_tabla(tabla, HOJA_VENTAS, nucleo.vista_ventas, clave="id")
 
 def crear_venta(producto_codigo, cliente_codigo, cantidad, precio_unit, tabla):
-    """Crea venta: valida existencia, descuenta stock, registra total."""
-    try:
-        cantidad = float(cantidad)
-        precio_unit = float(precio_unit)
-        if cantidad <= 0 or precio_unit < 0:
-            raise ValueError("Cantidad > 0 y precio_unit ≥ 0.")
-        if not validar_existencia(producto_codigo, cantidad):
-            raise ValueError("No hay existencia suficiente para esta venta.")
-
-        ventas = _ventas_leer_base()
-        vid = _siguiente_id(ventas)
-        prod_nom = _nombre_producto_por_codigo(producto_codigo)
-        cli_nom  = _nombre_cliente_por_codigo(cliente_codigo)
-        total = calcular_total(cantidad, precio_unit)
-        fecha_txt = pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S")
-
-        actualizar_stock(producto_codigo, cantidad)  # regla: restar stock
-
-        nueva = {
-            "id": vid,
-            "fecha": fecha_txt,
-            "producto": prod_nom,
-            "cliente": cli_nom,
-            "cantidad": cantidad,
-            "precio_unit": precio_unit,
-            "total": total,
-            "anulada": False
-        }
-        ventas = pd.concat([ventas, pd.DataFrame([nueva])], ignore_index=True)
-        escribir_ventas(ventas)
+    def listo(_):
         if tabla:
             listar_ventas(tabla)
         messagebox.showinfo("Éxito", "Venta creada correctamente.")
-    except Exception as e:
-        messagebox.showerror("Error", str(e))
+    _en_segundo_plano(lambda: nucleo.crear_venta(producto_codigo, cliente_codigo, cantidad, precio_unit), listo)
 
-def actualizar_venta(tabla, id_venta: int, cantidad=None, precio_unit=None):
-    """Actualiza cantidad/precio; ajusta stock por diferencia en cantidad."""
-    try:
-        ventas = _ventas_leer_base()
-        idx = ventas.index[ventas["id"] == id_venta]
-        if idx.empty:
-            raise ValueError("ID de venta no existe.")
-        i = idx[0]
-        if bool(ventas.at[i, "anulada"]):
-            raise ValueError("No se puede actualizar una venta anulada.")
-
-        old_cant = float(ventas.at[i, "cantidad"])
-        old_prec = float(ventas.at[i, "precio_unit"])
-        new_cant = float(cantidad) if cantidad not in (None, "") else old_cant
-        new_prec = float(precio_unit) if precio_unit not in (None, "") else old_prec
-        if new_cant <= 0 or new_prec < 0:
-            raise ValueError("Cantidad > 0 y precio_unit ≥ 0.")
-
-        diff = new_cant - old_cant
-        if diff != 0:
-            prod_nom = str(ventas.at[i, "producto"])
-            codigo = _codigo_producto_por_nombre(prod_nom)
-            if diff > 0:
-                if not validar_existencia(codigo, diff):
-                    raise ValueError("Stock insuficiente para aumentar cantidad.")
-                actualizar_stock(codigo, diff)
-            else:
-                restaurar_stock(codigo, -diff)
+def crear_pedido(cliente_codigo, lineas, tabla, al_terminar=None):
+    """Registra el carrito como un solo pedido; al_terminar() corre si se guardó."""
+    def listo(pedido):
+        if tabla:
+            listar_ventas(tabla)
+        if al_terminar:
+            al_terminar()
+        messagebox.showinfo("Éxito", f"Pedido {pedido['pedido']} creado: {len(pedido['lineas'])} líneas, "
+                                     f"total {pedido['total']:.2f}.")
+    _en_segundo_plano(lambda: nucleo.crear_pedido(cliente_codigo, lineas), listo)
 
-        ventas.at[i, "cantidad"] = new_cant
-        ventas.at[i, "precio_unit"] = new_prec
-        ventas.at[i, "total"] = calcular_total(new_cant, new_prec)
-        escribir_ventas(ventas)
+def actualizar_venta(tabla, id_venta: int, cantidad=None, precio_unit=None):
+    def listo(_):
         if tabla:
             listar_ventas(tabla)
         messagebox.showinfo("Éxito", "Venta actualizada.")
-    except Exception as e:
-        messagebox.showerror("Error", str(e))
+    _en_segundo_plano(lambda: nucleo.actualizar_venta(id_venta, cantidad, precio_unit), listo)
 
 def anular_venta(tabla, id_venta: int):
-    """Marca anulada=True y repone stock."""
-    try:
-        ventas = _ventas_leer_base()
-        idx = ventas.index[ventas["id"] == id_venta]
-        if idx.empty:
-            raise ValueError("ID de venta no existe.")
-        i = idx[0]
-        if bool(ventas.at[i, "anulada"]):
-            raise ValueError("La venta ya estaba anulada.")
-
-        prod_nom = str(ventas.at[i, "producto"])
-        cant = float(ventas.at[i, "cantidad"])
-        codigo = _codigo_producto_por_nombre(prod_nom)
-
-        restaurar_stock(codigo, cant)
-        ventas.at[i, "anulada"] = True
-        escribir_ventas(ventas)
+    def listo(_):
         if tabla:
             listar_ventas(tabla)
-        messagebox.showinfo("Éxito", "Venta anulada y stock repuesto.")
-    except Exception as e:
-        messagebox.showerror("Error", str(e))
+        messagebox.showinfo("Éxito", "Venta anulada (con todo su pedido) y stock repuesto.")
+    _en_segundo_plano(lambda: nucleo.anular_venta(id_venta), listo)
 
 def eliminar_venta(tabla, id_venta: int):
-    """Elimina la venta. Si no estaba anulada, repone stock primero."""
-    try:
-        ventas = _ventas_leer_base()
-        idx = ventas.index[ventas["id"] == id_venta]
-        if idx.empty:
-            raise ValueError("ID de venta no existe.")
-        i = idx[0]
-        if not bool(ventas.at[i, "anulada"]):
-            prod_nom = str(ventas.at[i, "producto"])
-            cant = float(ventas.at[i, "cantidad"])
-            codigo = _codigo_producto_por_nombre(prod_nom)
-            restaurar_stock(codigo, cant)
-
-        ventas = ventas.drop(index=i).reset_index(drop=True)
-        escribir_ventas(ventas)
+    def listo(_):
         if tabla:
             listar_ventas(tabla)
-        messagebox.showinfo("Éxito", "Venta eliminada.")
-    except Exception as e:
-        messagebox.showerror("Error", str(e))
+        messagebox.showinfo("Éxito", "Venta eliminada (con todo su pedido).")
+    _en_segundo_plano(lambda: nucleo.eliminar_venta(id_venta), listo)
+
+def importar_ventas_csv(tabla):
+    """Pide un CSV, importa el lote y deja los rechazos en <archivo>_errores.csv."""
+    ruta = filedialog.askopenfilename(title="Importar ventas",
+                                      filetypes=[("CSV", "*.csv"), ("Todos", "*.*")])
+    if not ruta:
+        return
+
+    def trabajo():
+        creadas, errores = nucleo.importar_ventas_lote(ruta)
+        mensaje = f"Ventas importadas: {len(creadas)}\nLíneas rechazadas: {len(errores)}"
+        if not errores.empty:
+            ruta_errores = Path(ruta).with_name(Path(ruta).stem + "_errores.csv")
+            errores.to_csv(ruta_errores, index=False)
+            mensaje += f"\nDetalle de errores: {ruta_errores}"
+        return mensaje
+
+    def listo(mensaje):
+        if tabla:
+            listar_ventas(tabla)
+        messagebox.showinfo("Importación", mensaje)
+    _en_segundo_plano(trabajo, listo)
 
 def pestaña_ventas(notebook):
     
@@ -613,19 +426,14 @@ def pestaña_ventas(notebook):
 
     cont = ttk.Frame(pestaña)
     cont.pack(fill="both", expand=True, padx=10, pady=8)
-    cols = ("id","fecha","producto","cliente","cantidad","precio_unit","total","anulada")
-    tabla = crear_tabla(cont, cols, ["ID","Fecha","Producto","Cliente","Cantidad","Precio Unit","Total","Anulada"])
+    cols = ("id","pedido","fecha","producto","cliente","cantidad","precio_unit","total","anulada")
+    tabla = crear_tabla(cont, cols, ["ID","Pedido","Fecha","Producto","Cliente","Cantidad","Precio Unit","Total","Anulada"])
 
     form = ttk.Frame(pestaña)
     form.pack(fill="x", padx=10, pady=8)
 
-    inv = leer_inventario().copy(); inv["codigo"] = inv["codigo"].astype(str)
-    cli = leer_clientes().copy();   cli["codigo"] = cli["codigo"].astype(str)
-    productos_vals = [f'{r["codigo"]} | {r["nombre"]}' for _, r in inv.iterrows()]
-    clientes_vals  = [f'{r["codigo"]} | {r["nombre"]}' for _, r in cli.iterrows()]
-
-    cb_prod = ttk.Combobox(form, values=productos_vals, width=35)
-    cb_cli  = ttk.Combobox(form, values=clientes_vals,  width=35)
+    cb_prod = ttk.Combobox(form, width=35)
+    cb_cli  = ttk.Combobox(form, width=35)
     ent_cant = tb.Entry(form, width=10)
     ent_prec = tb.Entry(form, width=12)
     ent_id   = tb.Entry(form, width=10)
@@ -637,11 +445,29 @@ def pestaña_ventas(notebook):
     tb.Label(form, text="ID venta:").grid(row=1, column=0, padx=4, pady=4, sticky="e"); ent_id.grid(row=1, column=1, padx=4, pady=4)
 
     # --- AGREGADO: recargar combos dinámicamente y refrescar al mostrar la pestaña ---
+    versiones_combo = {}
+
     def _recargar_combobox():
-        inv2 = leer_inventario().copy(); inv2["codigo"] = inv2["codigo"].astype(str)
-        cli2 = leer_clientes().copy();   cli2["codigo"] = cli2["codigo"].astype(str)
-        cb_prod["values"] = [f'{r["codigo"]} | {r["nombre"]}' for _, r in inv2.iterrows()]
-        cb_cli["values"]  = [f'{r["codigo"]} | {r["nombre"]}' for _, r in cli2.iterrows()]
+        # solo se releen las hojas que cambiaron desde la última carga
+        def trabajo():
+            cambios = []
+            for combo, hoja, leer in ((cb_prod, HOJA_INVENTARIO, nucleo.leer_inventario),
+                                      (cb_cli, HOJA_CLIENTES, nucleo.leer_clientes)):
+                version = nucleo.version(hoja)
+                if version is not None and versiones_combo.get(hoja) == version:
+                    continue
+                df = leer()
+                cambios.append((combo, hoja, version,
+                                (df["codigo"].astype(str) + " | " + df["nombre"].astype(str)).tolist()))
+            return cambios
+
+        def aplicar(cambios):
+            for combo, hoja, version, valores in cambios:
+                combo["values"] = valores
+                versiones_combo[hoja] = version
+        _en_segundo_plano(trabajo, aplicar)
+
+    _recargar_combobox()
 
     cb_prod.configure(postcommand=_recargar_combobox, state="readonly")
     cb_cli.configure(postcommand=_recargar_combobox,  state="readonly")
@@ -680,6 +506,75 @@ def pestaña_ventas(notebook):
               command=lambda: listar_ventas(tabla)
               ).grid(row=2, column=8, pady=6)
 
+    tb.Button(form, text="Importar CSV", bootstyle="primary",
+              command=lambda: importar_ventas_csv(tabla)
+              ).grid(row=3, column=1, pady=6)
+
+    # --- Carrito: varias líneas que se guardan como un solo pedido ---
+    marco_carrito = ttk.LabelFrame(pestaña, text="Carrito (pedido de varias líneas)")
+    marco_carrito.pack(fill="x", padx=10, pady=8)
+    carrito = ttk.Treeview(marco_carrito, columns=("producto","cantidad","precio_unit","total"),
+                           show="headings", height=5)
+    for c, h in zip(carrito["columns"], ("Producto","Cantidad","Precio Unit","Total")):
+        carrito.heading(c, text=h)
+        carrito.column(c, width=140, anchor="center")
+    carrito.grid(row=0, column=0, rowspan=5, padx=4, pady=4, sticky="nsew")
+    marco_carrito.grid_columnconfigure(0, weight=1)
+    lbl_total = tb.Label(marco_carrito, text="Total: 0.00")
+    lbl_total.grid(row=4, column=1, padx=4, pady=4, sticky="w")
+    lineas = {}  # iid de la fila del carrito -> (producto_codigo, cantidad, precio_unit)
+
+    def _total_carrito():
+        lbl_total.configure(text=f"Total: {sum(c * p for _, c, p in lineas.values()):.2f}")
+
+    def _agregar_linea():
+        codigo = _cod(cb_prod.get())
+        if not codigo:
+            messagebox.showwarning("Atención", "Elige un producto.")
+            return
+        try:
+            cantidad, precio = float(ent_cant.get()), float(ent_prec.get())
+        except ValueError:
+            messagebox.showwarning("Atención", "Cantidad y precio unit deben ser números.")
+            return
+        if cantidad <= 0 or precio < 0:
+            messagebox.showwarning("Atención", "Cantidad > 0 y precio_unit ≥ 0.")
+            return
+        iid = carrito.insert("", "end", values=(cb_prod.get(), f"{cantidad:g}", f"{precio:.2f}", f"{cantidad * precio:.2f}"))
+        lineas[iid] = (codigo, cantidad, precio)
+        _total_carrito()
+
+    def _quitar_lineas():
+        for iid in carrito.selection():
+            carrito.delete(iid)
+            lineas.pop(iid, None)
+        _total_carrito()
+
+    def _vaciar():
+        carrito.delete(*carrito.get_children())
+        lineas.clear()
+        _total_carrito()
+
+    def _confirmar():
+        if not lineas:
+            messagebox.showwarning("Atención", "El carrito está vacío.")
+            return
+        cliente = _cod(cb_cli.get())
+        if not cliente:
+            messagebox.showwarning("Atención", "Elige un cliente.")
+            return
+        orden = [lineas[iid] for iid in carrito.get_children()]
+        crear_pedido(cliente, orden, tabla, al_terminar=_vaciar)
+
+    tb.Button(marco_carrito, text="Agregar línea", bootstyle="info",
+              command=_agregar_linea).grid(row=0, column=1, padx=4, pady=2, sticky="ew")
+    tb.Button(marco_carrito, text="Quitar línea", bootstyle="warning",
+              command=_quitar_lineas).grid(row=1, column=1, padx=4, pady=2, sticky="ew")
+    tb.Button(marco_carrito, text="Vaciar carrito", bootstyle="secondary",
+              command=_vaciar).grid(row=2, column=1, padx=4, pady=2, sticky="ew")
+    tb.Button(marco_carrito, text="Confirmar pedido", bootstyle="success",
+              command=_confirmar).grid(row=3, column=1, padx=4, pady=2, sticky="ew")
+
     listar_ventas(tabla)
     return pestaña
 
@@ -687,19 +582,12 @@ def pestaña_ventas(notebook):
 # REPORTES
 def generar_reporte(columna, valor):
     """Genera reporte filtrando por la columna y valor indicados"""
-    df = leer_ventas()
-    if df is None:
-        return None
-
-    # Aseguramos que la columna exista
-    if columna not in df.columns:
-        messagebox.showerror("Error", f"No hay columna '{columna}' en la hoja Ventas.")
+    try:
+        resultado = nucleo.generar_reporte(columna, valor)
+    except nucleo.ErrorVentas as e:
+        messagebox.showerror("Error", str(e))
         return None
 
-    # Filtro tipo contiene (case-insensitive)
-    filtro = df[columna].astype(str).str.contains(str(valor), case=False, na=False)
-    resultado = df[filtro]
-
     if resultado.empty:
         messagebox.showinfo("Sin resultados", f"No se encontraron ventas de '{valor}' en {columna}.")
         return None
@@ -708,63 +596,23 @@ def generar_reporte(columna, valor):
 
 def generar_txt_reporte(df: pd.DataFrame, ruta_archivo: Path):
     try:
-        lineas = []
-        # encabezados
-        encabezado = " | ".join(df.columns.astype(str))
-        lineas.append(encabezado)
-        lineas.append("-" * len(encabezado))
-
-        # filas
-        for _, fila in df.iterrows():
-            fila_txt = " | ".join(str(fila[col]) for col in df.columns)
-            lineas.append(fila_txt)
-
-        contenido = "\n".join(lineas)
-
-        with open(ruta_archivo, "w", encoding="utf-8") as f:
-            f.write(contenido)
-
-        return ruta_archivo
+        return reportes.escribir_txt(df, ruta_archivo)
     except Exception as e:
         messagebox.showerror("Error", f"No se pudo generar el archivo de reporte: {e}")
         return None
 
 def leer_ventas():
     """Lee los datos del archivo Ventas.xlsx (para reportes)."""
-    if not RUTA_DATOS.exists():
-        messagebox.showerror("Error", "No se encontró el archivo Ventas.xlsx")
-        return None
     try:
-        return pd.read_excel(RUTA_DATOS, sheet_name=HOJA_VENTAS)
-    except Exception as e:
-        messagebox.showerror("Error", f"No se pudo leer el archivo: {e}")
+        return nucleo.leer_ventas()
+    except nucleo.ErrorVentas as e:
+        messagebox.showerror("Error", str(e))
         return None
 
 def enviar_mail_con_adjunto(destinatario: str, asunto: str, cuerpo: str, ruta_adjunto: Path):
     try:
-        remitente = os.getenv("GOOGLE_APP_EMAIL")
-        password_app = os.getenv("GOOGLE_APP_PASS")
-
-        msg = MIMEMultipart()
-        msg["From"] = remitente
-        msg["To"] = destinatario
-        msg["Subject"] = asunto
-        msg.attach(MIMEText(cuerpo, "plain"))
-
-        with open(ruta_adjunto, "rb") as f:
-            parte = MIMEBase("application", "octet-stream")
-            parte.set_payload(f.read())
-        encoders.encode_base64(parte)
-        parte.add_header("Content-Disposition", f'attachment; filename="{ruta_adjunto.name}"')
-        msg.attach(parte)
-
-        servidor = smtplib.SMTP("smtp.gmail.com", 587)
-        servidor.starttls()
-        servidor.login(remitente, password_app)
-        servidor.send_message(msg)
-        servidor.quit()
-
-        messagebox.showinfo("Éxito", f"Reporte enviado a {destinatario}")
+        nucleo.enviar_mail(destinatario, asunto, cuerpo, ruta_adjunto)
+        messagebox.showinfo("Éxito", f"Reporte en cola de envío para {destinatario}")
         return True
     except Exception as e:
         messagebox.showerror("Error", f"No se pudo enviar el correo: {e}")
@@ -774,71 +622,212 @@ def pestaña_reportes(notebook):
     frame = ttk.Frame(notebook)
     notebook.add(frame, text="Reportes")
 
+    sub = ttk.Notebook(frame)
+    sub.pack(expand=True, fill="both")
+    envio = ttk.Frame(sub)
+    sub.add(envio, text="Envío por cliente")
+
     ttk.Label(
-        frame,
+        envio,
         text="Enviar reportes de ventas por cliente",
         font=("Segoe UI", 14, "bold")
     ).grid(row=0, column=0, columnspan=3, pady=10)
 
-    # Cargar lista de clientes
-    try:
-        df_cli = leer_clientes()
-        clientes_nombres = sorted(df_cli["nombre"].dropna().astype(str).unique().tolist())
-    except Exception as e:
-        messagebox.showerror("Error", f"No se pudieron leer clientes: {e}")
-        clientes_nombres = []
-
-    ttk.Label(frame, text="Cliente:").grid(row=1, column=0, sticky="e", padx=4, pady=4)
-    cb_cliente = ttk.Combobox(frame, values=clientes_nombres, width=35, state="readonly")
+    ttk.Label(envio, text="Cliente:").grid(row=1, column=0, sticky="e", padx=4, pady=4)
+    cb_cliente = ttk.Combobox(envio, values=[], width=35, state="readonly")
     cb_cliente.grid(row=1, column=1, padx=4, pady=4)
 
-    ttk.Label(frame, text="Correo destino:").grid(row=2, column=0, sticky="e", padx=4, pady=4)
-    entry_destinatario = ttk.Entry(frame, width=35)
+    ttk.Label(envio, text="Correo destino:").grid(row=2, column=0, sticky="e", padx=4, pady=4)
+    entry_destinatario = ttk.Entry(envio, width=35)
     entry_destinatario.grid(row=2, column=1, padx=4, pady=4)
 
-    # Recargar lista cuando se muestra la pestañas
+    ttk.Label(envio, text="Formato:").grid(row=1, column=2, sticky="e", padx=4, pady=4)
+    cb_formato = ttk.Combobox(envio, values=list(reportes.FORMATOS), width=8, state="readonly")
+    cb_formato.set("txt")
+    cb_formato.grid(row=1, column=3, padx=4, pady=4)
+
+    ttk.Label(envio, text="Comprimir:").grid(row=2, column=2, sticky="e", padx=4, pady=4)
+    cb_compresion = ttk.Combobox(envio, values=["no"] + list(reportes.COMPRESIONES), width=8, state="readonly")
+    cb_compresion.set("no")
+    cb_compresion.grid(row=2, column=3, padx=4, pady=4)
+
+    def _salida():
+        compresion = cb_compresion.get()
+        return cb_formato.get() or "txt", (None if compresion in ("", "no") else compresion)
+
+    # Recargar lista cuando se muestra la pestañas (solo si cambiaron los clientes)
+    version_clientes = [None]
+
     def recargar_clientes(_evt=None):
-        try:
-            df_cli2 = leer_clientes()
-            cb_cliente["values"] = sorted(df_cli2["nombre"].dropna().astype(str).unique().tolist())
-        except Exception as e:
-            print("Error al recargar lista de clientes:", e)
+        def trabajo():
+            version = nucleo.version(HOJA_CLIENTES)
+            if version is not None and version == version_clientes[0]:
+                return None
+            df_cli2 = nucleo.leer_clientes()
+            return version, sorted(df_cli2["nombre"].dropna().astype(str).unique().tolist())
+
+        def aplicar(resultado):
+            if resultado is not None:
+                version_clientes[0], cb_cliente["values"] = resultado
+        _en_segundo_plano(trabajo, aplicar)
 
-    frame.bind("<Visibility>", recargar_clientes)
+    envio.bind("<Visibility>", recargar_clientes)
+    recargar_clientes()
 
     # Enviar reporte
     def enviar_reporte_cliente():
-        try:
-            cliente = cb_cliente.get().strip()
-            destinatario = entry_destinatario.get().strip()
-            if not cliente:
-                raise ValueError("Selecciona un cliente.")
-            if not destinatario:
-                raise ValueError("Escribe el correo destinatario.")
-
-            df_rep = generar_reporte("Cliente", cliente)
-            if df_rep is None:
-                return
-
-            nombre_archivo = f"reporte_cliente_{cliente}.txt".replace(" ", "_")
-            ruta_archivo = Path(nombre_archivo)
-            ruta_final = generar_txt_reporte(df_rep, ruta_archivo)
-            if ruta_final is None:
-                return
-
-            asunto = f"Reporte de ventas del cliente: {cliente}"
-            cuerpo = f"Adjunto encontrarás el reporte de ventas del cliente {cliente}."
-            enviar_mail_con_adjunto(destinatario, asunto, cuerpo, ruta_final)
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        cliente = cb_cliente.get().strip()
+        destinatario = entry_destinatario.get().strip()
+        if not cliente:
+            messagebox.showerror("Error", "Selecciona un cliente.")
+            return
+        if not destinatario:
+            messagebox.showerror("Error", "Escribe el correo destinatario.")
+            return
+
+        def listo(enviado):
+            if enviado is None:
+                messagebox.showinfo("Sin resultados", f"No se encontraron ventas de '{cliente}' en Cliente.")
+            else:
+                messagebox.showinfo("Éxito", f"Reporte en cola de envío para {destinatario}")
+        formato, compresion = _salida()
+        _en_segundo_plano(lambda: nucleo.enviar_reporte_cliente(cliente, destinatario, formato, compresion), listo)
 
     tb.Button(
-        frame,
+        envio,
         text="Enviar reporte de cliente por correo",
         bootstyle="info",
         command=enviar_reporte_cliente
     ).grid(row=3, column=0, columnspan=2, pady=12)
 
+    def generar_todos():
+        carpeta = filedialog.askdirectory(title="Carpeta para los reportes")
+        if not carpeta:
+            return
+
+        def listo(manifiesto):
+            messagebox.showinfo("Reportes", f"Reportes generados: {len(manifiesto)}\n"
+                                            f"Manifiesto: {Path(carpeta) / 'manifiesto.json'}")
+        formato, compresion = _salida()
+        _en_segundo_plano(lambda: nucleo.generar_reportes_clientes(carpeta, formato, compresion), listo)
+
+    tb.Button(
+        envio,
+        text="Generar reportes de todos los clientes",
+        bootstyle="secondary",
+        command=generar_todos
+    ).grid(row=4, column=0, columnspan=2, pady=4)
+
+    pestaña_analisis(sub)
+    return frame
+
+def pestaña_analisis(notebook):
+    """Ingresos y unidades por día/semana/mes y los productos y clientes con más ventas."""
+    frame = ttk.Frame(notebook)
+    notebook.add(frame, text="Análisis")
+
+    controles = ttk.Frame(frame)
+    controles.pack(fill="x", padx=10, pady=8)
+    ttk.Label(controles, text="Periodo:").pack(side="left", padx=4)
+    cb_periodo = ttk.Combobox(controles, values=list(reportes.AnaliticaVentas.PERIODOS), width=10, state="readonly")
+    cb_periodo.set("mes")
+    cb_periodo.pack(side="left", padx=4)
+    ttk.Label(controles, text="Top:").pack(side="left", padx=4)
+    ent_n = tb.Entry(controles, width=5)
+    ent_n.insert(0, "5")
+    ent_n.pack(side="left", padx=4)
+
+    cuerpo = ttk.Frame(frame)
+    cuerpo.pack(expand=True, fill="both", padx=10, pady=4)
+    cont_serie = ttk.Frame(cuerpo)
+    cont_serie.pack(side="left", expand=True, fill="both", padx=4)
+    derecha = ttk.Frame(cuerpo)
+    derecha.pack(side="left", expand=True, fill="both", padx=4)
+    cont_prod = ttk.Frame(derecha)
+    cont_prod.pack(expand=True, fill="both", pady=2)
+    cont_cli = ttk.Frame(derecha)
+    cont_cli.pack(expand=True, fill="both", pady=2)
+
+    tabla_serie = crear_tabla(cont_serie, ("periodo", "ingresos", "unidades", "ventas"),
+                              ["Periodo", "Ingresos", "Unidades", "Ventas"])
+    tabla_prod = crear_tabla(cont_prod, ("producto", "ingresos", "unidades"), ["Producto", "Ingresos", "Unidades"])
+    tabla_cli = crear_tabla(cont_cli, ("cliente", "ingresos", "unidades"), ["Cliente", "Ingresos", "Unidades"])
+
+    def actualizar(_evt=None):
+        periodo = cb_periodo.get() or "mes"
+        n = int(ent_n.get()) if ent_n.get().strip().isdigit() else 5
+
+        def mostrar(resultado):
+            serie, top_prod, top_cli, version = resultado
+            _mostrar_en_tabla(tabla_serie, serie, clave="periodo", version=(version, periodo))
+            _mostrar_en_tabla(tabla_prod, top_prod, clave="producto_codigo", version=(version, n))
+            _mostrar_en_tabla(tabla_cli, top_cli, clave="cliente_codigo", version=(version, n))
+        _en_segundo_plano(lambda: nucleo.analisis(periodo, n), mostrar)
+
+    cb_periodo.bind("<<ComboboxSelected>>", actualizar)
+    tb.Button(controles, text="Actualizar", bootstyle="info", command=actualizar).pack(side="left", padx=8)
+    frame.bind("<Visibility>", actualizar)
+    return frame
+
+
+# DEPURACIÓN
+
+def pestaña_depuracion(notebook):
+    """Acciones recientes con sus lecturas, escrituras y tiempos (solo con VENTAS_TRAZA)."""
+    frame = ttk.Frame(notebook)
+    notebook.add(frame, text="Depuración")
+
+    controles = ttk.Frame(frame)
+    controles.pack(fill="x", padx=10, pady=8)
+    lbl_totales = ttk.Label(controles, text="")
+    lbl_totales.pack(side="left", padx=4)
+
+    cont_tabla = ttk.Frame(frame)
+    cont_tabla.pack(expand=True, fill="both", padx=10, pady=4)
+    columnas = ("n", "accion", "duracion_ms", "lecturas", "escrituras", "filas_leidas", "filas_escritas", "error")
+    tabla = crear_tabla(cont_tabla, columnas,
+                        ["#", "Acción", "ms", "Lecturas", "Escrituras", "Filas leídas", "Filas escritas", "Error"])
+    detalle = tk.Text(frame, height=8)
+    detalle.pack(fill="x", padx=10, pady=4)
+
+    tramos = {}
+
+    def refrescar():
+        if not frame.winfo_exists():
+            return
+        ultimo = max(tramos, default=0)
+        nuevos = instrumentacion.recientes(ultimo)
+        if nuevos:
+            tramos.update((t["n"], t) for t in nuevos)
+            for n in sorted(tramos)[:-instrumentacion.MAX_RECIENTES]:
+                del tramos[n]
+            df = pd.DataFrame([tramos[n] for n in sorted(tramos, reverse=True)], columns=columnas)
+            _mostrar_en_tabla(tabla, df.fillna(""), clave="n", version=max(tramos))
+        t = instrumentacion.totales()
+        lbl_totales.config(text=f"Total: {t['lecturas']} lecturas ({t['filas_leidas']} filas), "
+                                f"{t['escrituras']} escrituras ({t['filas_escritas']} filas)")
+        frame.after(1000, refrescar)
+
+    def mostrar_detalle(_evt=None):
+        sel = tabla.selection()
+        tramo = tramos.get(int(sel[0])) if sel else None
+        detalle.delete("1.0", "end")
+        if tramo is None:
+            return
+        lineas = [f"{k}: {v}" for k, v in sorted(tramo["detalle"].items())]
+        lineas += [f"{nombre}: {llamadas} llamadas, {ms:.1f} ms"
+                   for nombre, (llamadas, ms) in sorted(tramo["funciones"].items(), key=lambda x: -x[1][1])]
+        detalle.insert("end", "\n".join(lineas))
+
+    def limpiar():
+        instrumentacion.reiniciar()
+        tramos.clear()
+        _mostrar_en_tabla(tabla, pd.DataFrame(columns=columnas), clave="n")
+        detalle.delete("1.0", "end")
+
+    tabla.bind("<<TreeviewSelect>>", mostrar_detalle)
+    tb.Button(controles, text="Limpiar", bootstyle="secondary", command=limpiar).pack(side="right", padx=4)
+    refrescar()
     return frame
 
 
@@ -846,7 +835,7 @@ def pestaña_reportes(notebook):
 
 def abrir_algoritmos(padre=None):
     """Abre la ventana del módulo de Inventario, Clientes y Ventas."""
-    crear_archivo_excel_si_no_existe()
+    nucleo.inicializar_excel()
     is_root = padre is None
     ventana = tb.Window(themename="superhero") if is_root else tb.Toplevel(padre)
     ventana.title("Sistema de Ventas - Grupo #5")
@@ -858,17 +847,52 @@ def abrir_algoritmos(padre=None):
         font=("Arial", 20, "bold")
     ).pack(pady=10)
 
+    # Indicador de actividad mientras hay lecturas/escrituras en curso
+    progreso = tb.Progressbar(ventana, mode="indeterminate", bootstyle="info")
+
+    def _estado_io(ocupado):
+        if ocupado:
+            progreso.pack(fill="x", padx=10, side="bottom")
+            progreso.start(10)
+            ventana.configure(cursor="watch")
+        else:
+            progreso.stop()
+            progreso.pack_forget()
+            ventana.configure(cursor="")
+
+    global _EJECUTOR
+    ejecutor_ventana = ejecutor.EjecutorIO(ventana, al_cambiar_estado=_estado_io)
+    _EJECUTOR = ejecutor_ventana
+
+    nucleo.bandeja()  # retoma los correos que quedaron pendientes
+
     cuaderno = tb.Notebook(ventana)
     cuaderno.pack(expand=True, fill="both", padx=10, pady=10)
 
     pestaña_inventario(cuaderno)
     pestaña_clientes(cuaderno)
-    _asegurar_hoja_ventas()
+    try:
+        nucleo.preparar_datos()
+    except Exception as e:
+        messagebox.showerror("Error", str(e))
     pestaña_ventas(cuaderno)
     try:
         pestaña_reportes(cuaderno)
     except Exception:
         pass
+    if instrumentacion.ACTIVA:
+        pestaña_depuracion(cuaderno)
+
+    def _al_cerrar():
+        global _EJECUTOR
+        ejecutor_ventana.cerrar()
+        if _EJECUTOR is ejecutor_ventana:
+            _EJECUTOR = None
+        nucleo.detener_bandeja()
+        nucleo.compactar_diario()
+        ventana.destroy()
+
+    ventana.protocol("WM_DELETE_WINDOW", _al_cerrar)
 
     if is_root:
         ventana.mainloop()
@@ -0,0 +1,1298 @@
+import io
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+import instrumentacion
+
+try:
+    import fcntl
+except ImportError:          # Windows
+    fcntl = None
+    import msvcrt
+
+# Caché en memoria de las hojas del libro de datos.
+# Cada archivo se identifica por su firma (mtime + tamaño); si cambia desde
+# fuera, se descarta todo lo guardado. Las escrituras propias avisan con
+# registrar_escritura() para conservar las hojas que no se tocaron.
+
+_cache = {}
+_estadisticas = {"aciertos": 0, "fallos": 0, "cargas_libro": 0, "invalidaciones": 0}
+_candado = threading.RLock()
+_local = threading.local()
+
+HOJA_META = "_meta"
+UMBRAL_COMPACTACION = 500
+BLOQUEO_ESPERA = 30.0        # segundos esperando a que otra instancia suelte el archivo
+
+
+def _clave_ruta(ruta) -> str:
+    return str(Path(ruta).resolve())
+
+
+def _firma(ruta):
+    st = os.stat(ruta)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _clave_hoja(hoja: str, dtype) -> tuple:
+    return (hoja, tuple(sorted(dtype.items())) if dtype else None)
+
+
+def _entrada(ruta) -> dict:
+    """Devuelve la entrada de caché del archivo, descartándola si el archivo cambió."""
+    clave = _clave_ruta(ruta)
+    firma = _firma(ruta)
+    entrada = _cache.get(clave)
+    if entrada is None or entrada["firma"] != firma:
+        if entrada is not None:
+            _estadisticas["invalidaciones"] += 1
+        entrada = {"firma": firma, "libro": None, "hojas": {}, "nombres": None}
+        _cache[clave] = entrada
+    return entrada
+
+
+def _libro(ruta, entrada) -> pd.ExcelFile:
+    """Carga el libro una sola vez por versión del archivo (sin dejarlo abierto)."""
+    if entrada["libro"] is None:
+        entrada["libro"] = pd.ExcelFile(io.BytesIO(Path(ruta).read_bytes()), engine="openpyxl")
+        _estadisticas["cargas_libro"] += 1
+        if instrumentacion.ACTIVA:
+            instrumentacion.contar("lectura", "xlsx_libro")
+    return entrada["libro"]
+
+
+def leer_hoja(ruta, hoja: str, dtype=None) -> pd.DataFrame:
+    """Devuelve una copia de la hoja; solo se parsea si no está en caché."""
+    tx = _transaccion_activa(ruta)
+    if tx is not None and hoja in tx["hojas"]:
+        return tx["hojas"][hoja].copy()
+    with _candado:
+        entrada = _entrada(ruta)
+        clave = _clave_hoja(hoja, dtype)
+        df = entrada["hojas"].get(clave)
+        if df is None:
+            _estadisticas["fallos"] += 1
+            df = _libro(ruta, entrada).parse(sheet_name=hoja, dtype=dtype)
+            entrada["hojas"][clave] = df
+            if instrumentacion.ACTIVA:
+                instrumentacion.contar("lectura", "xlsx_hoja", len(df))
+        else:
+            _estadisticas["aciertos"] += 1
+        return df.copy()
+
+
+def hojas_del_libro(ruta) -> list:
+    """Nombres de las hojas del libro, usando la misma caché."""
+    with _candado:
+        entrada = _entrada(ruta)
+        if entrada["nombres"] is None:
+            entrada["nombres"] = list(_libro(ruta, entrada).sheet_names)
+        return list(entrada["nombres"])
+
+
+def leer_columnas(ruta, hoja: str, columnas, dtype=None) -> pd.DataFrame:
+    """Solo algunas columnas de la hoja.
+
+    Si la hoja entera ya está en caché se toman de ahí; si no, se leen solo
+    esas columnas (usecols) y quedan en caché aparte.
+    """
+    columnas = list(columnas)
+    tx = _transaccion_activa(ruta)
+    if tx is not None and hoja in tx["hojas"]:
+        return tx["hojas"][hoja][columnas].copy()
+    with _candado:
+        entrada = _entrada(ruta)
+        completa = entrada["hojas"].get(_clave_hoja(hoja, dtype))
+        if completa is not None:
+            _estadisticas["aciertos"] += 1
+            return completa[columnas].copy()
+        clave = _clave_hoja(hoja, dtype) + (tuple(columnas),)
+        df = entrada["hojas"].get(clave)
+        if df is None:
+            _estadisticas["fallos"] += 1
+            df = _libro(ruta, entrada).parse(sheet_name=hoja, usecols=columnas, dtype=dtype)
+            entrada["hojas"][clave] = df
+            if instrumentacion.ACTIVA:
+                instrumentacion.contar("lectura", "xlsx_columnas", len(df))
+        else:
+            _estadisticas["aciertos"] += 1
+        return df.copy()
+
+
+def registrar_escritura(ruta, hojas) -> None:
+    """Avisa de una escritura propia: se descartan solo las hojas modificadas."""
+    with _candado:
+        clave = _clave_ruta(ruta)
+        entrada = _cache.get(clave)
+        if entrada is None:
+            return
+        try:
+            entrada["firma"] = _firma(ruta)
+        except FileNotFoundError:
+            _cache.pop(clave, None)
+            return
+        entrada["libro"] = None
+        if entrada["nombres"] is not None:
+            entrada["nombres"] += [h for h in hojas if h not in entrada["nombres"]]
+        for k in [k for k in entrada["hojas"] if k[0] in set(hojas)]:
+            del entrada["hojas"][k]
+
+
+def invalidar_cache(ruta=None) -> None:
+    """Vacía la caché de un archivo (o de todos)."""
+    with _candado:
+        if ruta is None:
+            _cache.clear()
+        else:
+            _cache.pop(_clave_ruta(ruta), None)
+
+
+def estadisticas_cache() -> dict:
+    """Contadores de la caché y tasa de aciertos."""
+    with _candado:
+        datos = dict(_estadisticas)
+    consultas = datos["aciertos"] + datos["fallos"]
+    datos["tasa_aciertos"] = datos["aciertos"] / consultas if consultas else 0.0
+    return datos
+
+
+def reiniciar_estadisticas() -> None:
+    with _candado:
+        for k in _estadisticas:
+            _estadisticas[k] = 0
+
+
+# BLOQUEO ENTRE INSTANCIAS
+# Varias ventanas (o procesos) pueden usar el mismo libro. Cada escritura se
+# hace con un bloqueo exclusivo sobre <libro>.lock; dentro del proceso el
+# bloqueo es reentrante y también excluye a los otros hilos.
+
+class ArchivoBloqueado(TimeoutError):
+    pass
+
+
+class Conflicto(RuntimeError):
+    """Otra instancia cambió las mismas filas desde la última lectura; hay que reintentar."""
+
+
+_bloqueos = {}
+_candado_bloqueos = threading.Lock()
+
+
+def _tomar_archivo(ruta_bloqueo: Path, espera: float):
+    f = open(ruta_bloqueo, "a+b")
+    limite = time.monotonic() + espera
+    while True:
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            return f
+        except OSError:
+            if time.monotonic() >= limite:
+                f.close()
+                raise ArchivoBloqueado(f"{ruta_bloqueo} sigue bloqueado por otra instancia.") from None
+            time.sleep(0.05)
+
+
+def _soltar_archivo(f) -> None:
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    finally:
+        f.close()
+
+
+@contextmanager
+def bloqueo(ruta, espera: float = BLOQUEO_ESPERA):
+    """Bloqueo exclusivo del libro entre procesos; reentrante para el mismo hilo."""
+    ruta = Path(ruta)
+    with _candado_bloqueos:
+        estado = _bloqueos.setdefault(_clave_ruta(ruta), {"candado": threading.RLock(), "archivo": None, "nivel": 0})
+    if not estado["candado"].acquire(timeout=espera):
+        raise ArchivoBloqueado(f"{ruta} está ocupado por otro hilo.")
+    try:
+        if estado["nivel"] == 0:
+            estado["archivo"] = _tomar_archivo(ruta.with_name(ruta.name + ".lock"), espera)
+        estado["nivel"] += 1
+        try:
+            yield
+        finally:
+            estado["nivel"] -= 1
+            if estado["nivel"] == 0:
+                _soltar_archivo(estado["archivo"])
+                estado["archivo"] = None
+    finally:
+        estado["candado"].release()
+
+
+# TRANSACCIONES
+# Una transacción junta los cambios de varias hojas y los guarda con una
+# sola escritura del libro: se trabaja sobre una copia temporal y al final
+# se reemplaza el original con os.replace (atómico en el mismo directorio).
+
+def _transaccion_activa(ruta):
+    activas = getattr(_local, "transacciones", None)
+    if not activas:
+        return None
+    return activas.get(_clave_ruta(ruta))
+
+
+def guardar_hojas(ruta, hojas: dict, cambios_meta: dict = None) -> int:
+    """Reemplaza las hojas indicadas en una única escritura atómica.
+
+    Se escribe con el libro bloqueado y cada escritura sube version_libro en
+    _meta (junto con cambios_meta). Devuelve la versión nueva.
+    """
+    ruta = Path(ruta)
+    with bloqueo(ruta), _candado:
+        meta = leer_meta(ruta) if ruta.exists() else {}
+        meta.update(cambios_meta or {})
+        meta["version_libro"] = int(meta.get("version_libro", 0) or 0) + 1
+        hojas = {**hojas, HOJA_META: _meta_a_dataframe(meta)}
+        temporal, nombres = _escribir_temporal(ruta, hojas)
+        _reemplazar_libro(ruta, temporal, hojas, nombres)
+    return meta["version_libro"]
+
+
+def _escribir_temporal(ruta: Path, hojas: dict) -> tuple:
+    """Copia el libro a un temporal junto a él y reemplaza ahí las hojas. Devuelve (temporal, nombres).
+
+    No toma ningún bloqueo: quien llama decide si el temporal sigue valiendo
+    antes de ponerlo en lugar del libro con _reemplazar_libro.
+    """
+    temporal = ruta.with_name(f".{ruta.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        if ruta.exists():
+            shutil.copy2(ruta, temporal)
+            modo = {"mode": "a", "if_sheet_exists": "replace"}
+        else:
+            modo = {"mode": "w"}
+        with pd.ExcelWriter(temporal, engine="openpyxl", **modo) as libro:
+            for hoja, df in hojas.items():
+                df.to_excel(libro, sheet_name=hoja, index=False)
+            nombres = list(libro.book.sheetnames)
+    except BaseException:
+        if temporal.exists():
+            temporal.unlink()
+        raise
+    if instrumentacion.ACTIVA:
+        instrumentacion.contar("escritura", "xlsx", sum(len(df) for df in hojas.values()))
+    return temporal, nombres
+
+
+def _reemplazar_libro(ruta: Path, temporal: Path, hojas: dict, nombres: list) -> None:
+    """Pone el temporal en lugar del libro (os.replace, atómico); con el libro bloqueado."""
+    os.replace(temporal, ruta)
+    registrar_escritura(ruta, list(hojas))
+    # lo recién escrito ya se conoce: la próxima leer_meta no recarga el libro
+    with _candado:
+        entrada = _cache.get(_clave_ruta(ruta))
+        if entrada is not None:
+            entrada["nombres"] = nombres
+            entrada["hojas"][_clave_hoja(HOJA_META, None)] = hojas[HOJA_META]
+
+
+def leer_meta(ruta) -> dict:
+    """Pares clave/valor de la hoja _meta (vacío si no existe)."""
+    if HOJA_META not in hojas_del_libro(ruta):
+        return {}
+    df = leer_hoja(ruta, HOJA_META)
+    return {str(k): v for k, v in zip(df["clave"], df["valor"])}
+
+
+def _meta_a_dataframe(meta: dict) -> pd.DataFrame:
+    return pd.DataFrame({"clave": list(meta), "valor": list(meta.values())})
+
+
+def guardar_con_meta(ruta, hojas: dict, cambios_meta: dict) -> int:
+    """Guarda las hojas y actualiza claves de _meta en la misma escritura."""
+    return guardar_hojas(ruta, hojas, cambios_meta)
+
+
+def _leer_diario(ruta_diario) -> list:
+    """Operaciones del diario como [(secuencia, op)]; ignora una última línea incompleta."""
+    ops = []
+    if not Path(ruta_diario).exists():
+        return ops
+    with open(ruta_diario, encoding="utf-8") as f:
+        for linea in f:
+            try:
+                registro = json.loads(linea)
+            except ValueError:
+                break
+            ops.extend((registro["seq"], op) for op in registro["ops"])
+    return ops
+
+
+def escribir_hoja(ruta, hoja: str, df: pd.DataFrame) -> None:
+    """Escribe una hoja; dentro de una transacción solo queda pendiente."""
+    tx = _transaccion_activa(ruta)
+    if tx is not None:
+        tx["hojas"][hoja] = df.copy()
+    else:
+        guardar_hojas(ruta, {hoja: df})
+
+
+@contextmanager
+def transaccion(ruta):
+    """Agrupa las escrituras del bloque y las guarda juntas al salir.
+
+    Si el bloque lanza una excepción no se escribe nada. Las transacciones
+    anidadas se unen a la externa.
+    """
+    actual = _transaccion_activa(ruta)
+    if actual is not None:
+        yield actual
+        return
+    if getattr(_local, "transacciones", None) is None:
+        _local.transacciones = {}
+    tx = {"ruta": Path(ruta), "hojas": {}}
+    _local.transacciones[_clave_ruta(ruta)] = tx
+    try:
+        yield tx
+        # se quita antes de guardar para que guardar_hojas lea el archivo real
+        del _local.transacciones[_clave_ruta(ruta)]
+        if tx["hojas"]:
+            guardar_hojas(ruta, tx["hojas"])
+    finally:
+        _local.transacciones.pop(_clave_ruta(ruta), None)
+
+
+# MOTORES DE ALMACENAMIENTO
+# Las funciones leer_*/escribir_* de algoritmos.py trabajan contra un motor.
+# Cada motor recibe la descripción de las tablas:
+#   {hoja: {"tabla": nombre_sql, "clave": columna, "columnas": {col: tipo_sql},
+#           "dtype": {...}, "alias": {col_alias: col_origen}, "indices": [...]}}
+
+class ClaveDuplicada(ValueError):
+    pass
+
+
+class MotorDatos:
+    """Interfaz común de los motores (Excel, SQLite)."""
+
+    def __init__(self, tablas: dict):
+        self.tablas = tablas
+
+    def leer(self, hoja: str) -> pd.DataFrame:
+        raise NotImplementedError
+
+    def escribir(self, hoja: str, df: pd.DataFrame) -> None:
+        raise NotImplementedError
+
+    def transaccion(self):
+        raise NotImplementedError
+
+    def buscar(self, hoja: str, valor, columna=None):
+        """Primera fila (como dict) cuya columna coincide con valor, o None."""
+        raise NotImplementedError
+
+    def buscar_varios(self, hoja: str, claves) -> pd.DataFrame:
+        """Filas cuyas claves están en la lista, en ese mismo orden."""
+        df = self.leer(hoja)
+        por_clave = {_clave_indice(v): i for i, v in zip(df.index, df[self.tablas[hoja]["clave"]])}
+        posiciones = [por_clave[k] for k in map(_clave_indice, claves) if k in por_clave]
+        return df.loc[posiciones].reset_index(drop=True)
+
+    def buscar_todos(self, hoja: str, valor, columna: str) -> pd.DataFrame:
+        """Todas las filas cuya columna coincide con valor, en el orden de la hoja."""
+        df = self.leer(hoja)
+        if columna not in df.columns:
+            return df.iloc[0:0]
+        return df[_coincide(df[columna], valor)].reset_index(drop=True)
+
+    def insertar(self, hoja: str, fila: dict) -> None:
+        raise NotImplementedError
+
+    def insertar_lote(self, hoja: str, filas: pd.DataFrame) -> None:
+        """Inserta varias filas como un solo cambio."""
+        with self.transaccion():
+            for fila in filas.to_dict("records"):
+                self.insertar(hoja, fila)
+
+    def actualizar(self, hoja: str, valor_clave, cambios: dict, evento: str = "actualizar") -> None:
+        """evento nombra el cambio en el diario (por ejemplo "anular")."""
+        raise NotImplementedError
+
+    def eliminar(self, hoja: str, valor_clave) -> None:
+        raise NotImplementedError
+
+    def maximo(self, hoja: str, columna: str):
+        raise NotImplementedError
+
+    def reservar_claves(self, hoja: str, cantidad: int = 1) -> int:
+        """Reserva cantidad claves enteras seguidas y devuelve la primera.
+
+        Salen de una secuencia guardada junto con los datos: nunca se repiten,
+        aunque se borren las filas que las usaron. Dentro de una transacción,
+        si esta se deshace la reserva también.
+        """
+        raise NotImplementedError
+
+    def secuencias(self) -> dict:
+        """Última clave entregada por cada hoja que usa reservar_claves."""
+        return {}
+
+    def compactar(self) -> None:
+        """Consolida cambios pendientes en el almacenamiento principal (si aplica)."""
+
+    def version(self, hoja: str):
+        """Marca que cambia cada vez que cambian los datos de la hoja (None si no se sabe).
+
+        Los motores devuelven (cambios de otras instancias, cambios propios).
+        """
+        return None
+
+
+def _admite(serie: pd.Series, valor) -> bool:
+    """Indica si la columna puede guardar el valor sin cambiar de tipo."""
+    tipo = serie.dtype.kind
+    if tipo == "O":
+        return True
+    if tipo == "b":
+        return isinstance(valor, bool)
+    if tipo in "iu":
+        return isinstance(valor, (int, float)) and not isinstance(valor, bool) and float(valor).is_integer()
+    if tipo == "f":
+        return isinstance(valor, (int, float)) and not isinstance(valor, bool)
+    return False
+
+
+def _coincide(serie: pd.Series, valor) -> pd.Series:
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        try:
+            return serie == float(valor)
+        except (TypeError, ValueError):
+            return pd.Series(False, index=serie.index)
+    return serie.astype(str) == str(valor)
+
+
+def _valor_json(valor):
+    if valor is None or (not isinstance(valor, (str, bytes)) and pd.isna(valor)):
+        return None
+    if isinstance(valor, pd.Timestamp):
+        return valor.strftime("%Y-%m-%d %H:%M:%S")
+    if hasattr(valor, "item"):  # escalares de numpy
+        return valor.item()
+    return valor
+
+
+def _clave_indice(valor) -> str:
+    """Normaliza claves para los índices (41, 41.0 y "41" son la misma)."""
+    valor = _valor_json(valor)
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor)
+
+
+def _maximo_entero(df: pd.DataFrame, columna: str) -> int:
+    if df.empty or columna not in df.columns:
+        return 0
+    valor = pd.to_numeric(df[columna], errors="coerce").max()
+    return 0 if pd.isna(valor) else int(valor)
+
+
+def _construir_indice(df: pd.DataFrame, tabla: dict) -> dict:
+    """Índices hash de la hoja: clave -> posición y columna -> [claves]."""
+    claves = [_clave_indice(v) for v in df[tabla["clave"]]] if tabla["clave"] in df.columns else []
+    posiciones = {}
+    for pos, k in zip(df.index, claves):
+        posiciones.setdefault(k, pos)
+    secundarios = {}
+    for col in tabla.get("indices", []):
+        mapa = {}
+        if col in df.columns:
+            for valor, k in zip(df[col], claves):
+                mapa.setdefault(_clave_indice(valor), []).append(k)
+        secundarios[col] = mapa
+    return {"clave": posiciones, "secundarios": secundarios}
+
+
+def _aplicar_op(df: pd.DataFrame, op: dict, tabla: dict, posicion=None) -> pd.DataFrame:
+    """Aplica una operación del diario (crear/crear_lote/actualizar/anular/eliminar) a la hoja."""
+    if op["op"] == "reservar":
+        return df  # solo mueve la secuencia de claves
+    clave = tabla["clave"]
+    if op["op"] in ("crear", "crear_lote"):
+        nueva = pd.DataFrame(op["datos"] if op["op"] == "crear_lote" else [op["datos"]])
+        df = nueva if df.empty else pd.concat([df, nueva], ignore_index=True)
+        posiciones = list(range(len(df) - len(nueva), len(df)))
+    elif op["op"] == "eliminar":
+        return df[~_coincide(df[clave], op["clave"])].reset_index(drop=True)
+    else:
+        posiciones = [posicion] if posicion is not None else list(df.index[_coincide(df[clave], op["clave"])])
+        for col, valor in op["datos"].items():
+            if col not in df.columns:
+                df[col] = None
+            elif not _admite(df[col], valor):
+                df[col] = df[col].astype(float if df[col].dtype.kind in "iu" and isinstance(valor, float) else object)
+            df.loc[posiciones, col] = valor
+    for alias, origen in tabla.get("alias", {}).items():
+        if origen in df.columns:
+            if alias not in df.columns:
+                df[alias] = df[origen].astype(str)
+            else:
+                df.loc[posiciones, alias] = df.loc[posiciones, origen].astype(str)
+    return df
+
+
+class MotorExcel(MotorDatos):
+    """Motor sobre el libro .xlsx, con caché, diario y transacciones atómicas.
+
+    Los cambios fila a fila no reescriben el libro: se agregan al diario
+    (Ventas.diario.jsonl, una línea por transacción) y las lecturas los
+    aplican sobre la última versión compactada. compactar() vuelca el diario
+    al libro en una sola escritura y guarda en la hoja _meta la última
+    secuencia aplicada, para no repetirla si se corta a la mitad.
+
+    Las claves que entrega reservar_claves también van al diario (una
+    operación "reservar" en la misma línea que las filas que las usan) y al
+    compactar quedan en _meta como secuencia_<hoja>.
+
+    Con varias instancias sobre el mismo libro, cada confirmación toma el
+    bloqueo del archivo y comprueba que nadie haya escrito desde la última
+    lectura. Si alguien lo hizo, se recargan sus cambios y los propios se
+    vuelven a aplicar encima cuando no tocan las mismas filas; si las tocan
+    (o el libro fue reescrito) se lanza Conflicto sin guardar nada.
+    """
+
+    def __init__(self, ruta, tablas: dict, umbral_compactacion: int = UMBRAL_COMPACTACION):
+        super().__init__(tablas)
+        self.ruta = Path(ruta)
+        self.ruta_diario = self.ruta.with_name(self.ruta.stem + ".diario.jsonl")
+        self.umbral_compactacion = umbral_compactacion
+        self._candado = threading.RLock()
+        self._tx = None
+        self._vistas = {}
+        self._indices = {}
+        self._ficha = None
+        self._diario = []          # [(secuencia, op)] pendientes de compactar
+        self._secuencia = 0
+        self._version_libro = 0    # version_libro de _meta en la última lectura
+        self._compactando = False
+        self._epoca = 0            # sube cuando se recarga todo desde disco
+        self._versiones = {}
+        self._secuencias_libro = {}  # secuencia_<hoja> de _meta en la última lectura
+        self._contadores = {}        # hoja -> última clave entregada
+
+    # --- estado en memoria ---
+
+    def _ficha_actual(self):
+        try:
+            firma = _firma(self.ruta)
+        except FileNotFoundError:
+            firma = None
+        tam = self.ruta_diario.stat().st_size if self.ruta_diario.exists() else 0
+        return (firma, tam)
+
+    def _sincronizar(self) -> None:
+        """Recarga el diario si el libro o el diario cambiaron desde fuera."""
+        if self._tx is not None:
+            return  # la transacción trabaja sobre lo leído al empezar; se concilia al confirmar
+        if self._ficha_actual() != self._ficha:
+            self._recargar()
+
+    def _recargar(self) -> None:
+        # con el archivo bloqueado, para no leer el libro y el diario a mitad de una compactación
+        with bloqueo(self.ruta):
+            ficha = self._ficha_actual()
+            meta = leer_meta(self.ruta) if ficha[0] else {}
+            aplicada = int(meta.get("diario_secuencia", 0) or 0)
+            self._version_libro = int(meta.get("version_libro", 0) or 0)
+            self._secuencias_libro = {k[len("secuencia_"):]: int(v) for k, v in meta.items()
+                                      if k.startswith("secuencia_") and pd.notna(v)}
+            self._diario = [(s, op) for s, op in _leer_diario(self.ruta_diario) if s > aplicada]
+        if instrumentacion.ACTIVA:
+            instrumentacion.contar("lectura", "diario", len(self._diario))
+        self._secuencia = max([aplicada] + [s for s, _ in self._diario])
+        self._vistas.clear()
+        self._indices.clear()
+        self._contadores.clear()
+        self._epoca += 1
+        self._ficha = ficha
+
+    def _vista(self, hoja: str) -> pd.DataFrame:
+        self._sincronizar()
+        df = self._vistas.get(hoja)
+        if df is None:
+            df = leer_hoja(self.ruta, hoja, dtype=self.tablas.get(hoja, {}).get("dtype"))
+            for _, op in self._diario:
+                if op["hoja"] == hoja:
+                    df = _aplicar_op(df, op, self.tablas[hoja])
+            self._vistas[hoja] = df
+        return df
+
+    def _contador(self, hoja: str) -> int:
+        """Última clave entregada de la hoja: _meta más las reservas del diario."""
+        self._sincronizar()
+        valor = self._contadores.get(hoja)
+        if valor is None:
+            valor = self._secuencias_libro.get(hoja)
+            if valor is None:
+                # libro anterior a las secuencias: se parte de la clave más alta, una sola vez
+                valor = _maximo_entero(self._vista(hoja), self.tablas[hoja]["clave"])
+            for _, op in self._diario:
+                if op["hoja"] == hoja and op["op"] == "reservar":
+                    valor = max(valor, op["datos"]["hasta"])
+            self._contadores[hoja] = valor
+        return valor
+
+    def _indice(self, hoja: str) -> dict:
+        indice = self._indices.get(hoja)
+        if indice is None:
+            indice = _construir_indice(self._vista(hoja), self.tablas[hoja])
+            self._indices[hoja] = indice
+        return indice
+
+    def _registrar(self, op: dict) -> None:
+        """Aplica la operación a la vista y mantiene los índices sin recorrer la hoja."""
+        with self.transaccion():
+            hoja = op["hoja"]
+            tabla = self.tablas[hoja]
+            df = self._vista(hoja)
+            indice = self._indice(hoja)
+            self._versiones[hoja] = self._versiones.get(hoja, 0) + 1
+            if op["op"] == "crear_lote":
+                inicio = len(df)
+                self._vistas[hoja] = _aplicar_op(df, op, tabla)
+                for pos, fila in enumerate(op["datos"], start=inicio):
+                    k = _clave_indice(fila[tabla["clave"]])
+                    indice["clave"].setdefault(k, pos)
+                    for col, mapa in indice["secundarios"].items():
+                        mapa.setdefault(_clave_indice(fila.get(col)), []).append(k)
+                self._tx["ops"].append(op)
+                return
+            k = _clave_indice(op["clave"])
+            pos = indice["clave"].get(k)
+            anteriores = {}
+            if pos is not None:
+                anteriores = {c: _clave_indice(df.at[pos, c]) for c in indice["secundarios"] if c in df.columns}
+            df = _aplicar_op(df, op, tabla, posicion=pos if op["op"] not in ("crear", "eliminar") else None)
+            self._vistas[hoja] = df
+
+            if op["op"] == "eliminar":
+                self._indices.pop(hoja, None)  # las posiciones se corren: se reconstruye al pedirlo
+            else:
+                if op["op"] == "crear":
+                    pos = len(df) - 1
+                    indice["clave"].setdefault(k, pos)
+                for col, mapa in indice["secundarios"].items():
+                    if col not in op["datos"]:
+                        continue
+                    nuevo = _clave_indice(df.at[pos, col])
+                    if anteriores.get(col) == nuevo:
+                        continue
+                    if col in anteriores and k in mapa.get(anteriores[col], []):
+                        mapa[anteriores[col]].remove(k)
+                    mapa.setdefault(nuevo, []).append(k)
+            self._tx["ops"].append(op)
+
+    # --- interfaz del motor ---
+
+    def leer(self, hoja: str) -> pd.DataFrame:
+        with self._candado:
+            return self._vista(hoja).copy()
+
+    def escribir(self, hoja: str, df: pd.DataFrame) -> None:
+        for alias, origen in self.tablas.get(hoja, {}).get("alias", {}).items():
+            if origen in df.columns:
+                df[alias] = df[origen].astype(str)
+        with self.transaccion():
+            if hoja in self._contadores or hoja in self._secuencias_libro:
+                # la secuencia no baja aunque la hoja nueva tenga menos filas
+                self._contadores[hoja] = max(self._contador(hoja), _maximo_entero(df, self.tablas[hoja]["clave"]))
+            self._vistas[hoja] = df.copy()
+            self._indices.pop(hoja, None)
+            self._versiones[hoja] = self._versiones.get(hoja, 0) + 1
+            self._tx["reemplazadas"].add(hoja)
+
+    @contextmanager
+    def transaccion(self):
+        with self._candado:
+            if self._tx is not None:
+                yield self
+                return
+            self._sincronizar()
+            self._tx = {"ops": [], "reemplazadas": set()}
+            try:
+                yield self
+                self._confirmar(self._tx)
+            except BaseException:
+                self._vistas.clear()  # se descartan los cambios sin confirmar
+                self._indices.clear()
+                self._ficha = None
+                raise
+            finally:
+                self._tx = None
+        if len(self._diario) >= self.umbral_compactacion:
+            self.compactar_en_segundo_plano()
+
+    def _filas_tocadas(self, ops) -> set:
+        filas = set()
+        for op in ops:
+            if op["op"] == "crear_lote":
+                clave = self.tablas[op["hoja"]]["clave"]
+                filas.update((op["hoja"], _clave_indice(f[clave])) for f in op["datos"])
+            elif op["op"] == "reservar":
+                filas.add((op["hoja"], "#secuencia"))  # dos reservas a la vez entregarían las mismas claves
+            else:
+                filas.add((op["hoja"], _clave_indice(op["clave"])))
+        return filas
+
+    def _rebasar(self, tx: dict) -> None:
+        """Recarga lo que guardó otra instancia y reaplica encima los cambios de tx."""
+        base_libro, base_secuencia = self._version_libro, self._secuencia
+        propias = {h: self._vistas[h] for h in tx["reemplazadas"]}
+        self._recargar()
+        if self._version_libro != base_libro:
+            raise Conflicto("Otra instancia reescribió el libro de datos.")
+        ajenas = [op for s, op in self._diario if s > base_secuencia]
+        if ({op["hoja"] for op in ajenas} & set(propias)
+                or self._filas_tocadas(ajenas) & self._filas_tocadas(tx["ops"])):
+            raise Conflicto("Otra instancia modificó las mismas filas.")
+        self._vistas.update(propias)
+        for op in tx["ops"]:
+            if op["hoja"] not in propias:
+                self._vistas[op["hoja"]] = _aplicar_op(self._vista(op["hoja"]), op, self.tablas[op["hoja"]])
+        self._indices.clear()
+
+    def _confirmar(self, tx: dict) -> None:
+        with bloqueo(self.ruta):
+            if self._ficha_actual() != self._ficha:
+                self._rebasar(tx)
+            self._guardar_tx(tx)
+
+    def _guardar_tx(self, tx: dict) -> None:
+        if tx["reemplazadas"]:
+            # una hoja completa cambió: se compacta todo en una escritura
+            for op in tx["ops"]:
+                self._diario.append((None, op))
+            self._compactar(tx["reemplazadas"])
+        elif tx["ops"]:
+            self._secuencia += 1
+            linea = {"seq": self._secuencia, "fecha": pd.Timestamp.now().isoformat(), "ops": tx["ops"]}
+            with open(self.ruta_diario, "a", encoding="utf-8") as f:
+                f.write(json.dumps(linea, ensure_ascii=False, default=_valor_json) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._diario.extend((self._secuencia, op) for op in tx["ops"])
+            self._ficha = self._ficha_actual()
+            if instrumentacion.ACTIVA:
+                filas = sum(len(op["datos"]) if op["op"] == "crear_lote" else 1 for op in tx["ops"])
+                instrumentacion.contar("escritura", "diario", filas)
+
+    def _compactar(self, reemplazadas=()) -> None:
+        hojas = {h: self._vistas[h] if h in self._vistas else self._vista(h)
+                 for h in set(reemplazadas) | {op["hoja"] for _, op in self._diario}}
+        secuencias = {f"secuencia_{h}": v for h, v in self.secuencias().items()}
+        self._version_libro = guardar_con_meta(self.ruta, hojas, {"diario_secuencia": self._secuencia, **secuencias})
+        self._secuencias_libro.update({h: int(v) for h, v in self.secuencias().items()})
+        # el libro ya contiene todo hasta self._secuencia
+        if self.ruta_diario.exists():
+            temporal = self.ruta_diario.with_name(self.ruta_diario.name + ".tmp")
+            temporal.write_text("", encoding="utf-8")
+            os.replace(temporal, self.ruta_diario)
+        self._diario = []
+        self._ficha = self._ficha_actual()
+
+    def version(self, hoja: str):
+        with self._candado:
+            self._sincronizar()
+            return (self._epoca, self._versiones.get(hoja, 0))
+
+    def compactar(self) -> None:
+        """Vuelca el diario al libro y lo vacía.
+
+        La escritura del libro, que es lo lento, no frena a nadie: con el
+        bloqueo solo se toma la foto de las hojas y, al final, se pone el libro
+        nuevo en lugar del viejo y se recorta el diario. Las líneas que
+        entraron mientras tanto quedan en el diario. Si en el medio otra
+        instancia reescribió el libro, el temporal se descarta.
+        """
+        with self._candado, bloqueo(self.ruta):
+            self._sincronizar()
+            if not self._diario:
+                return
+            secuencia, version_libro = self._secuencia, self._version_libro
+            secuencias = self.secuencias()
+            hojas = {h: self._vista(h).copy() for h in {op["hoja"] for _, op in self._diario}}
+            meta = leer_meta(self.ruta) if self.ruta.exists() else {}
+        meta.update({"diario_secuencia": secuencia, **{f"secuencia_{h}": v for h, v in secuencias.items()},
+                     "version_libro": version_libro + 1})
+        hojas[HOJA_META] = _meta_a_dataframe(meta)
+        temporal, nombres = _escribir_temporal(self.ruta, hojas)
+        try:
+            with self._candado, bloqueo(self.ruta):
+                self._sincronizar()
+                if self._version_libro != version_libro:
+                    return
+                _reemplazar_libro(self.ruta, temporal, hojas, nombres)
+                self._version_libro = version_libro + 1
+                self._secuencias_libro.update(secuencias)
+                self._recortar_diario(secuencia)
+        finally:
+            if temporal.exists():
+                temporal.unlink()
+
+    def _recortar_diario(self, hasta: int) -> None:
+        """Quita del diario las líneas que el libro ya contiene (secuencia <= hasta)."""
+        quedan = []
+        if self.ruta_diario.exists():
+            with open(self.ruta_diario, encoding="utf-8") as f:
+                for linea in f:
+                    try:
+                        if json.loads(linea)["seq"] > hasta:
+                            quedan.append(linea)
+                    except ValueError:
+                        break  # última línea incompleta de un corte: ya no se va a completar
+            temporal = self.ruta_diario.with_name(self.ruta_diario.name + ".tmp")
+            temporal.write_text("".join(quedan), encoding="utf-8")
+            os.replace(temporal, self.ruta_diario)
+        self._diario = [(s, op) for s, op in self._diario if s > hasta]
+        self._ficha = self._ficha_actual()
+
+    def compactar_en_segundo_plano(self) -> None:
+        with self._candado:
+            if self._compactando:
+                return
+            self._compactando = True
+
+        def _tarea():
+            try:
+                self.compactar()
+            except Exception as e:
+                print("Error al compactar el diario:", e)
+            finally:
+                self._compactando = False
+
+        threading.Thread(target=_tarea, daemon=True).start()
+
+    def _posicion(self, hoja: str, valor, columna=None):
+        """Posición de la primera fila con ese valor, usando los índices si hay."""
+        indice = self._indice(hoja)
+        if columna is None or columna == self.tablas[hoja]["clave"]:
+            return indice["clave"].get(_clave_indice(valor))
+        if columna in indice["secundarios"]:
+            claves = indice["secundarios"][columna].get(_clave_indice(valor))
+            return indice["clave"].get(claves[0]) if claves else None
+        df = self._vista(hoja)
+        encontrados = df.index[_coincide(df[columna], valor)] if columna in df.columns else []
+        return encontrados[0] if len(encontrados) else None
+
+    def buscar(self, hoja: str, valor, columna=None):
+        with self._candado:
+            i = self._posicion(hoja, valor, columna)
+            return None if i is None else self._vista(hoja).loc[i].to_dict()
+
+    def buscar_varios(self, hoja: str, claves) -> pd.DataFrame:
+        with self._candado:
+            indice = self._indice(hoja)["clave"]
+            posiciones = [indice[k] for k in map(_clave_indice, claves) if k in indice]
+            return self._vista(hoja).loc[posiciones].reset_index(drop=True)
+
+    def buscar_todos(self, hoja: str, valor, columna: str) -> pd.DataFrame:
+        with self._candado:
+            secundarios = self._indice(hoja)["secundarios"]
+            if columna not in secundarios:
+                return super().buscar_todos(hoja, valor, columna)
+            claves = secundarios[columna].get(_clave_indice(valor), [])
+            posiciones = sorted(self._indice(hoja)["clave"][k] for k in claves)
+            return self._vista(hoja).loc[posiciones].reset_index(drop=True)
+
+    def insertar(self, hoja: str, fila: dict) -> None:
+        clave = self.tablas[hoja]["clave"]
+        with self._candado:
+            # el índice de claves garantiza la unicidad sin recorrer la hoja
+            if self._posicion(hoja, fila[clave]) is not None:
+                raise ClaveDuplicada(f"Ya existe {clave}={fila[clave]} en {hoja}.")
+            datos = {c: _valor_json(v) for c, v in fila.items()}
+            self._registrar({"hoja": hoja, "op": "crear", "clave": datos[clave], "datos": datos})
+
+    def insertar_lote(self, hoja: str, filas: pd.DataFrame) -> None:
+        clave = self.tablas[hoja]["clave"]
+        with self._candado:
+            claves = [_clave_indice(v) for v in filas[clave]]
+            if len(set(claves)) != len(claves) or any(self._posicion(hoja, k) is not None for k in claves):
+                raise ClaveDuplicada(f"El lote repite valores de {clave} en {hoja}.")
+            datos = [{c: _valor_json(v) for c, v in fila.items()} for fila in filas.to_dict("records")]
+            self._registrar({"hoja": hoja, "op": "crear_lote", "clave": None, "datos": datos})
+
+    def actualizar(self, hoja: str, valor_clave, cambios: dict, evento: str = "actualizar") -> None:
+        with self._candado:
+            if self._posicion(hoja, valor_clave) is None:
+                raise KeyError(f"No existe {valor_clave} en {hoja}.")
+            datos = {c: _valor_json(v) for c, v in cambios.items()}
+            self._registrar({"hoja": hoja, "op": evento, "clave": _valor_json(valor_clave), "datos": datos})
+
+    def eliminar(self, hoja: str, valor_clave) -> None:
+        with self._candado:
+            self._registrar({"hoja": hoja, "op": "eliminar", "clave": _valor_json(valor_clave), "datos": {}})
+
+    def maximo(self, hoja: str, columna: str):
+        with self._candado:
+            df = self._vista(hoja)
+            if df.empty or columna not in df.columns:
+                return None
+            valor = pd.to_numeric(df[columna], errors="coerce").max()
+            return None if pd.isna(valor) else valor
+
+    def reservar_claves(self, hoja: str, cantidad: int = 1) -> int:
+        with self._candado, self.transaccion():
+            inicio = self._contador(hoja) + 1
+            hasta = inicio + int(cantidad) - 1
+            self._tx["ops"].append({"hoja": hoja, "op": "reservar", "clave": None, "datos": {"hasta": hasta}})
+            self._contadores[hoja] = hasta
+            return inicio
+
+    def secuencias(self) -> dict:
+        with self._candado:
+            hojas = set(self._contadores) | set(self._secuencias_libro) | {
+                op["hoja"] for _, op in self._diario if op["op"] == "reservar"}
+            return {h: self._contador(h) for h in hojas}
+
+
+def _valor_sql(valor):
+    if valor is None or (not isinstance(valor, (str, bytes)) and pd.isna(valor)):
+        return None
+    if isinstance(valor, pd.Timestamp):
+        return valor.strftime("%Y-%m-%d %H:%M:%S")
+    if hasattr(valor, "item"):  # escalares de numpy
+        valor = valor.item()
+    if isinstance(valor, bool):
+        return int(valor)
+    return valor
+
+
+def _col(nombre: str) -> str:
+    return f'"{nombre}"'
+
+
+class MotorSQLite(MotorDatos):
+    """Motor sobre SQLite: claves indexadas y cambios fila a fila.
+
+    Cada escritura sube, en la misma transacción, el contador de la hoja en
+    la tabla versiones; así cualquier conexión (cada hilo tiene la suya) ve
+    la misma versión para los mismos datos.
+    """
+
+    def __init__(self, ruta, tablas: dict):
+        super().__init__(tablas)
+        self.ruta = Path(ruta)
+        self._hilos = threading.local()
+        self._propios = {}                    # hoja -> cambios confirmados por este motor
+        self._candado_versiones = threading.Lock()
+        self._meta = None
+        self._crear_esquema()
+
+    def _marcar(self, hoja: str) -> None:
+        """Sube la versión de la hoja; se llama dentro de la transacción de la escritura."""
+        self._conexion().execute(
+            "INSERT INTO versiones (hoja, valor) VALUES (?, 1) "
+            "ON CONFLICT(hoja) DO UPDATE SET valor = valor + 1", (hoja,)
+        )
+        self._hilos.pendientes[hoja] = self._hilos.pendientes.get(hoja, 0) + 1
+
+    def version(self, hoja: str):
+        # total de la base menos los cambios de este motor: (otras instancias, propios)
+        con = self._conexion()
+        with self._candado_versiones:
+            propios = self._propios.get(hoja, 0) + self._hilos.pendientes.get(hoja, 0)
+            fila = con.execute("SELECT valor FROM versiones WHERE hoja = ?", (hoja,)).fetchone()
+        total = fila[0] if fila else 0
+        return (total - propios, propios)
+
+    def _conexion(self) -> sqlite3.Connection:
+        con = getattr(self._hilos, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.ruta, isolation_level=None, timeout=BLOQUEO_ESPERA)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._hilos.con = con
+            self._hilos.nivel = 0
+            self._hilos.pendientes = {}   # versiones subidas en la transacción abierta de este hilo
+        return con
+
+    def _crear_esquema(self) -> None:
+        con = self._conexion()
+        for hoja, t in self.tablas.items():
+            columnas = ", ".join(
+                f'"{c}" {tipo}' + (" PRIMARY KEY" if c == t["clave"] else "")
+                for c, tipo in t["columnas"].items()
+            )
+            con.execute(f'CREATE TABLE IF NOT EXISTS {t["tabla"]} ({columnas})')
+            # bases creadas con un esquema anterior: se agregan las columnas nuevas (quedan en NULL)
+            existentes = {fila[1] for fila in con.execute(f'PRAGMA table_info({t["tabla"]})')}
+            for c, tipo in t["columnas"].items():
+                if c not in existentes:
+                    con.execute(f'ALTER TABLE {t["tabla"]} ADD COLUMN "{c}" {tipo}')
+            for col in t.get("indices", []):
+                con.execute(f'CREATE INDEX IF NOT EXISTS ix_{t["tabla"]}_{col} ON {t["tabla"]} ("{col}")')
+        con.execute('CREATE TABLE IF NOT EXISTS secuencias ("hoja" TEXT PRIMARY KEY, "valor" INTEGER)')
+        con.execute('CREATE TABLE IF NOT EXISTS meta ("clave" TEXT PRIMARY KEY, "valor" TEXT)')
+        con.execute('CREATE TABLE IF NOT EXISTS versiones ("hoja" TEXT PRIMARY KEY, "valor" INTEGER)')
+
+    def leer_meta(self) -> dict:
+        """Pares clave/valor de la tabla meta (lo mismo que la hoja _meta del libro)."""
+        if self._meta is None:
+            self._meta = dict(self._conexion().execute("SELECT clave, valor FROM meta").fetchall())
+        return dict(self._meta)
+
+    def guardar_meta(self, cambios: dict) -> None:
+        self._meta = None
+        self._conexion().executemany(
+            "INSERT INTO meta (clave, valor) VALUES (?, ?) ON CONFLICT(clave) DO UPDATE SET valor = excluded.valor",
+            [(str(k), str(v)) for k, v in cambios.items()],
+        )
+
+    @contextmanager
+    def transaccion(self):
+        con = self._conexion()
+        if self._hilos.nivel > 0:
+            self._hilos.nivel += 1
+            try:
+                yield self
+            finally:
+                self._hilos.nivel -= 1
+            return
+        con.execute("BEGIN IMMEDIATE")
+        self._hilos.nivel = 1
+        try:
+            yield self
+            # la versión propia sube junto con el COMMIT: version() nunca ve uno sin el otro
+            with self._candado_versiones:
+                con.execute("COMMIT")
+                for hoja, n in self._hilos.pendientes.items():
+                    self._propios[hoja] = self._propios.get(hoja, 0) + n
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        finally:
+            self._hilos.nivel = 0
+            self._hilos.pendientes = {}
+
+    def _a_dataframe(self, hoja, filas, nombres) -> pd.DataFrame:
+        t = self.tablas[hoja]
+        df = pd.DataFrame(filas, columns=nombres)
+        for col, tipo in t["columnas"].items():
+            if tipo == "BOOLEAN":
+                df[col] = df[col].fillna(0).astype(bool)
+        for alias, origen in t.get("alias", {}).items():
+            df[alias] = df[origen].astype(str)
+        return df
+
+    def leer(self, hoja: str) -> pd.DataFrame:
+        t = self.tablas[hoja]
+        cur = self._conexion().execute(f'SELECT * FROM {t["tabla"]} ORDER BY rowid')
+        filas = cur.fetchall()
+        if instrumentacion.ACTIVA:
+            instrumentacion.contar("lectura", "sqlite", len(filas))
+        return self._a_dataframe(hoja, filas, [d[0] for d in cur.description])
+
+    def escribir(self, hoja: str, df: pd.DataFrame) -> None:
+        t = self.tablas[hoja]
+        columnas = list(t["columnas"])
+        datos = df.reindex(columns=columnas)
+        filas = [[_valor_sql(v) for v in fila] for fila in datos.itertuples(index=False, name=None)]
+        marcas = ", ".join("?" for _ in columnas)
+        nombres = ", ".join(_col(c) for c in columnas)
+        with self.transaccion():
+            con = self._conexion()
+            con.execute(f'DELETE FROM {t["tabla"]}')
+            con.executemany(f'INSERT INTO {t["tabla"]} ({nombres}) VALUES ({marcas})', filas)
+            # la secuencia (si la hoja tiene) no baja aunque la tabla nueva tenga menos filas
+            con.execute(f'UPDATE secuencias SET valor = MAX(valor, COALESCE((SELECT MAX("{t["clave"]}") '
+                        f'FROM {t["tabla"]}), 0)) WHERE hoja = ?', (hoja,))
+            self._marcar(hoja)
+        if instrumentacion.ACTIVA:
+            instrumentacion.contar("escritura", "sqlite", len(filas))
+
+    def buscar(self, hoja: str, valor, columna=None):
+        t = self.tablas[hoja]
+        columna = columna or t["clave"]
+        cur = self._conexion().execute(
+            f'SELECT * FROM {t["tabla"]} WHERE "{columna}" = ? LIMIT 1', (_valor_sql(valor),)
+        )
+        fila = cur.fetchone()
+        if instrumentacion.ACTIVA:
+            instrumentacion.contar("lectura", "sqlite", int(fila is not None))
+        if fila is None:
+            return None
+        return self._a_dataframe(hoja, [fila], [d[0] for d in cur.description]).iloc[0].to_dict()
+
+    def buscar_varios(self, hoja: str, claves) -> pd.DataFrame:
+        t = self.tablas[hoja]
+        claves = [_valor_sql(c) for c in claves]
+        filas, nombres = [], [c for c in t["columnas"]]
+        for i in range(0, len(claves), 500):  # límite de parámetros por consulta
+            parte = claves[i:i + 500]
+            cur = self._conexion().execute(
+                f'SELECT * FROM {t["tabla"]} WHERE "{t["clave"]}" IN ({", ".join("?" for _ in parte)})', parte
+            )
+            filas.extend(cur.fetchall())
+            nombres = [d[0] for d in cur.description]
+        if instrumentacion.ACTIVA:
+            instrumentacion.contar("lectura", "sqlite", len(filas))
+        df = self._a_dataframe(hoja, filas, nombres)
+        orden = {_clave_indice(c): n for n, c in enumerate(claves)}
+        return df.iloc[sorted(range(len(df)), key=lambda i: orden[_clave_indice(df.at[i, t["clave"]])])]\
+            .reset_index(drop=True)
+
+    def buscar_todos(self, hoja: str, valor, columna: str) -> pd.DataFrame:
+        t = self.tablas[hoja]
+        cur = self._conexion().execute(
+            f'SELECT * FROM {t["tabla"]} WHERE "{columna}" = ? ORDER BY rowid', (_valor_sql(valor),)
+        )
+        filas = cur.fetchall()
+        if instrumentacion.ACTIVA:
+            instrumentacion.contar("lectura", "sqlite", len(filas))
+        return self._a_dataframe(hoja, filas, [d[0] for d in cur.description])
+
+    def insertar(self, hoja: str, fila: dict) -> None:
+        t = self.tablas[hoja]
+        columnas = [c for c in t["columnas"] if c in fila]
+        try:
+            with self.transaccion():
+                self._conexion().execute(
+                    f'INSERT INTO {t["tabla"]} ({", ".join(_col(c) for c in columnas)}) '
+                    f'VALUES ({", ".join("?" for _ in columnas)})',
+                    [_valor_sql(fila[c]) for c in columnas],
+                )
+                self._marcar(hoja)
+        except sqlite3.IntegrityError as e:
+            raise ClaveDuplicada(f"Ya existe {t['clave']}={fila.get(t['clave'])} en {hoja}.") from e
+        if instrumentacion.ACTIVA:
+            instrumentacion.contar("escritura", "sqlite", 1)
+
+    def insertar_lote(self, hoja: str, filas: pd.DataFrame) -> None:
+        t = self.tablas[hoja]
+        columnas = [c for c in t["columnas"] if c in filas.columns]
+        valores = [[_valor_sql(v) for v in fila] for fila in filas[columnas].itertuples(index=False, name=None)]
+        try:
+            with self.transaccion():
+                self._conexion().executemany(
+                    f'INSERT INTO {t["tabla"]} ({", ".join(_col(c) for c in columnas)}) '
+                    f'VALUES ({", ".join("?" for _ in columnas)})',
+                    valores,
+                )
+                self._marcar(hoja)
+        except sqlite3.IntegrityError as e:
+            raise ClaveDuplicada(f"El lote repite valores de {t['clave']} en {hoja}.") from e
+        if instrumentacion.ACTIVA:
+            instrumentacion.contar("escritura", "sqlite", len(valores))
+
+    def actualizar(self, hoja: str, valor_clave, cambios: dict, evento: str = "actualizar") -> None:
+        t = self.tablas[hoja]
+        columnas = [c for c in cambios if c in t["columnas"]]
+        if not columnas:
+            return
+        with self.transaccion():
+            cur = self._conexion().execute(
+                f'UPDATE {t["tabla"]} SET {", ".join(_col(c) + " = ?" for c in columnas)} '
+                f'WHERE "{t["clave"]}" = ?',
+                [_valor_sql(cambios[c]) for c in columnas] + [_valor_sql(valor_clave)],
+            )
+            if cur.rowcount == 0:
+                raise KeyError(f"No existe {valor_clave} en {hoja}.")
+            self._marcar(hoja)
+        if instrumentacion.ACTIVA:
+            instrumentacion.contar("escritura", "sqlite", cur.rowcount)
+
+    def eliminar(self, hoja: str, valor_clave) -> None:
+        t = self.tablas[hoja]
+        with self.transaccion():
+            cur = self._conexion().execute(
+                f'DELETE FROM {t["tabla"]} WHERE "{t["clave"]}" = ?', (_valor_sql(valor_clave),)
+            )
+            self._marcar(hoja)
+        if instrumentacion.ACTIVA:
+            instrumentacion.contar("escritura", "sqlite", cur.rowcount)
+
+    def maximo(self, hoja: str, columna: str):
+        t = self.tablas[hoja]
+        return self._conexion().execute(f'SELECT MAX("{columna}") FROM {t["tabla"]}').fetchone()[0]
+
+    def _subir_secuencia(self, hoja: str, valor: int) -> None:
+        self._conexion().execute(
+            'INSERT INTO secuencias (hoja, valor) VALUES (?, ?) '
+            'ON CONFLICT(hoja) DO UPDATE SET valor = MAX(valor, excluded.valor)', (hoja, int(valor))
+        )
+
+    def reservar_claves(self, hoja: str, cantidad: int = 1) -> int:
+        with self.transaccion():
+            con = self._conexion()
+            fila = con.execute("SELECT valor FROM secuencias WHERE hoja = ?", (hoja,)).fetchone()
+            if fila is None:
+                # base anterior a las secuencias: se parte de la clave más alta, una sola vez
+                ultima = self.maximo(hoja, self.tablas[hoja]["clave"])
+                fila = (0 if ultima is None else int(ultima),)
+            hasta = int(fila[0]) + int(cantidad)
+            self._subir_secuencia(hoja, hasta)
+        return hasta - int(cantidad) + 1
+
+    def secuencias(self) -> dict:
+        return dict(self._conexion().execute("SELECT hoja, valor FROM secuencias").fetchall())
+
+
+def migrar_excel_a_sqlite(ruta_excel, ruta_sqlite, tablas: dict) -> MotorSQLite:
+    """Copia de una sola vez las hojas del libro a la base SQLite."""
+    origen = MotorExcel(ruta_excel, tablas)
+    destino = MotorSQLite(ruta_sqlite, tablas)
+    nombres = hojas_del_libro(ruta_excel)
+    with destino.transaccion():
+        for hoja in tablas:
+            if hoja in nombres:
+                destino.escribir(hoja, origen.leer(hoja))
+        for hoja, valor in origen.secuencias().items():
+            destino._subir_secuencia(hoja, valor)
+        esquema = leer_meta(ruta_excel).get("version_esquema")
+        if esquema is not None and pd.notna(esquema):
+            destino.guardar_meta({"version_esquema": int(esquema)})
+    return destino
+
+
+def exportar_a_excel(motor: MotorDatos, ruta_excel) -> None:
+    """Vuelca todas las tablas del motor a un libro .xlsx."""
+    guardar_hojas(ruta_excel, {hoja: motor.leer(hoja) for hoja in motor.tablas},
+                  {f"secuencia_{hoja}": valor for hoja, valor in motor.secuencias().items()})
+
+
+_motores = {}
+
+
+def obtener_motor(tipo: str, ruta_excel, ruta_sqlite, tablas: dict) -> MotorDatos:
+    """Devuelve (y reutiliza) el motor configurado: "excel" o "sqlite".
+
+    La primera vez que se usa SQLite sin base creada se migran los datos
+    del libro existente.
+    """
+    tipo = (tipo or "excel").lower()
+    ruta = Path(ruta_sqlite if tipo == "sqlite" else ruta_excel)
+    clave = (tipo, _clave_ruta(ruta))
+    with _candado:
+        motor = _motores.get(clave)
+        if motor is None:
+            if tipo == "sqlite":
+                if not ruta.exists() and Path(ruta_excel).exists():
+                    motor = migrar_excel_a_sqlite(ruta_excel, ruta, tablas)
+                else:
+                    motor = MotorSQLite(ruta, tablas)
+            elif tipo == "excel":
+                motor = MotorExcel(ruta, tablas)
+            else:
+                raise ValueError(f"Motor de datos desconocido: {tipo}")
+            _motores[clave] = motor
+        return motor
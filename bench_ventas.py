@@ -0,0 +1,277 @@
+"""Pruebas de rendimiento del sistema de ventas con libros sintéticos.
+
+Genera libros Ventas.xlsx con N productos, M clientes y K ventas, mide las
+operaciones habituales de la pestaña de ventas y reportes en cada tamaño y
+deja los tiempos en un JSON para comparar entre versiones:
+
+    python bench_ventas.py --tamanos 100:50:1000,1000:200:10000 --motores excel,sqlite
+    python bench_ventas.py --comparar bench_anterior.json
+
+Nunca toca el Ventas.xlsx de trabajo: cada tamaño se genera en una carpeta
+temporal.
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tkinter as tk
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import algoritmos
+import almacenamiento
+import existencias
+import nucleo_ventas as nucleo
+import reportes
+
+TAMANOS = [(100, 50, 1_000), (1_000, 200, 10_000), (5_000, 1_000, 100_000)]
+MOTORES = ("excel", "sqlite")
+REPETICIONES = 5
+RUTA_RESULTADOS = Path("bench_ventas.json")
+UMBRAL_REGRESION = 0.20      # 20 % más lento que la referencia
+
+
+def generar_libro(ruta, productos: int, clientes: int, ventas: int, semilla: int = 0, dias: int = 365) -> Path:
+    """Escribe un libro con las hojas Inventario, Clientes, Ventas y _meta con datos aleatorios."""
+    rng = np.random.default_rng(semilla)
+    ruta = Path(ruta)
+
+    cod_prod = np.array([f"P{i:06d}" for i in range(1, productos + 1)])
+    nom_prod = np.array([f"Producto {i}" for i in range(1, productos + 1)])
+    precios = np.round(rng.uniform(1, 500, productos), 2)
+    inventario = pd.DataFrame({
+        "codigo": cod_prod,
+        "nombre": nom_prod,
+        "existencia": 10_000_000,          # que ninguna venta del benchmark falle por stock
+        "proveedor": [f"Proveedor {i % 20 + 1}" for i in range(productos)],
+        "precio": precios,
+    })
+    nom_cli = np.array([f"Cliente {i}" for i in range(1, clientes + 1)])
+    tabla_clientes = pd.DataFrame({
+        "codigo": [f"C{i:06d}" for i in range(1, clientes + 1)],
+        "nombre": nom_cli,
+        "direccion": [f"Calle {i}" for i in range(1, clientes + 1)],
+    })
+
+    p = rng.integers(0, productos, ventas)
+    c = rng.integers(0, clientes, ventas)
+    cantidad = rng.integers(1, 10, ventas).astype(float)
+    inicio = pd.Timestamp.now().normalize() - pd.Timedelta(days=dias)
+    segundos = np.sort(rng.integers(0, dias * 86_400, ventas))
+    fechas = (inicio + pd.to_timedelta(segundos, unit="s")).strftime("%Y-%m-%d %H:%M:%S")
+    tabla_ventas = pd.DataFrame({
+        "id": np.arange(1, ventas + 1),
+        "pedido": np.arange(1, ventas + 1),
+        "fecha": fechas,
+        "producto": nom_prod[p],
+        "cliente": nom_cli[c],
+        "producto_codigo": cod_prod[p],
+        "cliente_codigo": tabla_clientes["codigo"].to_numpy()[c],
+        "cantidad": cantidad,
+        "precio_unit": precios[p],
+        "total": np.round(cantidad * precios[p], 2),
+        "anulada": rng.random(ventas) < 0.02,
+    })
+    tabla_ventas["Producto"] = tabla_ventas["producto"]
+    tabla_ventas["Cliente"] = tabla_ventas["cliente"]
+
+    with pd.ExcelWriter(ruta, engine="openpyxl") as writer:
+        inventario.to_excel(writer, sheet_name=nucleo.HOJA_INVENTARIO, index=False)
+        tabla_clientes.to_excel(writer, sheet_name=nucleo.HOJA_CLIENTES, index=False)
+        tabla_ventas.to_excel(writer, sheet_name=nucleo.HOJA_VENTAS, index=False)
+        pd.DataFrame({"clave": ["version_esquema"], "valor": [nucleo.ESQUEMA_VERSION]})\
+            .to_excel(writer, sheet_name=almacenamiento.HOJA_META, index=False)
+    almacenamiento.invalidar_cache(ruta)
+    return ruta
+
+
+class TablaFalsa:
+    """Sustituto mínimo de ttk.Treeview para medir listar_ventas sin pantalla."""
+
+    def __init__(self):
+        self.filas = []
+        self.version = None
+
+    def get_children(self):
+        return range(len(self.filas))
+
+    def delete(self, *items):
+        self.filas = []
+
+    def insert(self, padre, posicion, values=()):
+        self.filas.append(values)
+
+
+def _crear_tabla():
+    """Tabla virtual sobre una raíz de Tk oculta; si no hay pantalla, una TablaFalsa."""
+    try:
+        raiz = tk.Tk()
+    except tk.TclError:
+        return TablaFalsa(), "falsa"
+    raiz.withdraw()
+    columnas = ("id", "pedido", "fecha", "producto", "cliente", "cantidad", "precio_unit", "total", "anulada")
+    return algoritmos.crear_tabla(raiz, columnas, columnas), "virtual"
+
+
+def _medir(funcion, repeticiones: int) -> dict:
+    tiempos = []
+    for i in range(repeticiones):
+        t0 = time.perf_counter()
+        funcion(i)
+        tiempos.append(time.perf_counter() - t0)
+    return {
+        "repeticiones": repeticiones,
+        "min_s": min(tiempos),
+        "mediana_s": statistics.median(tiempos),
+        "media_s": statistics.fmean(tiempos),
+        "max_s": max(tiempos),
+    }
+
+
+def _configurar(carpeta: Path, motor: str) -> None:
+    """Apunta el núcleo a los archivos de la carpeta y descarta los índices del tamaño anterior."""
+    nucleo.MOTOR_DATOS = motor
+    nucleo.RUTA_DATOS = carpeta / "Ventas.xlsx"
+    nucleo.RUTA_SQLITE = carpeta / "ventas.db"
+    nucleo._AGREGADOS = reportes.AgregadosVentas()
+    nucleo._ANALITICA = reportes.AnaliticaVentas()
+    nucleo._EXISTENCIAS = existencias.LibroExistencias()
+
+
+def medir_tamano(motor: str, productos: int, clientes: int, ventas: int,
+                 repeticiones: int = REPETICIONES, semilla: int = 0) -> list:
+    """Mide cada operación sobre un libro recién generado. Devuelve una fila por operación."""
+    filas = []
+
+    def anotar(operacion, medida, **extra):
+        filas.append({"motor": motor, "productos": productos, "clientes": clientes, "ventas": ventas,
+                      "operacion": operacion, **medida, **extra})
+        print(f"  {motor:6} {ventas:>8} {operacion:22} mediana {medida['mediana_s'] * 1000:10.1f} ms")
+
+    with tempfile.TemporaryDirectory(prefix="bench_ventas_") as tmp:
+        carpeta = Path(tmp)
+        anotar("generar_libro", _medir(
+            lambda _: generar_libro(carpeta / "Ventas.xlsx", productos, clientes, ventas, semilla), 1))
+        _configurar(carpeta, motor)
+        anotar("preparar_datos", _medir(lambda _: (nucleo.preparar_datos(), nucleo.vista_ventas()), 1))
+
+        rng = np.random.default_rng(semilla + 1)
+        codigos = [f"P{i:06d}" for i in rng.integers(1, productos + 1, repeticiones)]
+        clientes_venta = [f"C{i:06d}" for i in rng.integers(1, clientes + 1, repeticiones)]
+        creadas = []
+        anotar("crear_venta", _medir(
+            lambda i: creadas.append(nucleo.crear_venta(codigos[i], clientes_venta[i], 1, 10.0)["id"]),
+            repeticiones))
+        anotar("actualizar_venta", _medir(
+            lambda i: nucleo.actualizar_venta(creadas[i], cantidad=2), repeticiones))
+        anotar("anular_venta", _medir(lambda i: nucleo.anular_venta(creadas[i]), repeticiones))
+
+        tabla, tipo = _crear_tabla()
+
+        def listar(_):
+            tabla.version = None            # forzar la lectura completa
+            algoritmos.listar_ventas(tabla)
+        anotar("listar_ventas", _medir(listar, repeticiones), tabla=tipo)
+        anotar("listar_ventas_al_dia", _medir(lambda _: algoritmos.listar_ventas(tabla), repeticiones),
+               tabla=tipo)
+        if tipo == "virtual":
+            tabla.winfo_toplevel().destroy()
+
+        cliente = nucleo._ventas_leer_base()["cliente"].mode().iloc[0]
+        anotar("generar_reporte", _medir(lambda _: algoritmos.generar_reporte("Cliente", cliente), repeticiones))
+        df_rep = algoritmos.generar_reporte("Cliente", cliente)
+        anotar("generar_txt_reporte", _medir(
+            lambda i: algoritmos.generar_txt_reporte(df_rep, carpeta / f"reporte_{i}.txt"), repeticiones),
+            filas_reporte=len(df_rep))
+        anotar("compactar_diario", _medir(lambda _: nucleo.compactar_diario(), 1))
+    return filas
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def ejecutar(tamanos=TAMANOS, motores=MOTORES, repeticiones: int = REPETICIONES,
+             ruta=RUTA_RESULTADOS, semilla: int = 0) -> dict:
+    """Recorre motores y tamaños y guarda los resultados en ruta (JSON)."""
+    resultados = []
+    for motor in motores:
+        for productos, clientes, ventas in tamanos:
+            resultados.extend(medir_tamano(motor, productos, clientes, ventas, repeticiones, semilla))
+    informe = {
+        "fecha": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "plataforma": platform.platform(),
+        "semilla": semilla,
+        "resultados": resultados,
+    }
+    Path(ruta).write_text(json.dumps(informe, ensure_ascii=False, indent=1), encoding="utf-8")
+    return informe
+
+
+def comparar(referencia: dict, actual: dict, umbral: float = UMBRAL_REGRESION) -> list:
+    """Operaciones cuya mediana empeoró más que umbral respecto a la referencia."""
+    def clave(f):
+        return (f["motor"], f["productos"], f["clientes"], f["ventas"], f["operacion"])
+    antes = {clave(f): f["mediana_s"] for f in referencia["resultados"]}
+    regresiones = []
+    for f in actual["resultados"]:
+        base = antes.get(clave(f))
+        if base and f["mediana_s"] > base * (1 + umbral):
+            regresiones.append({**dict(zip(("motor", "productos", "clientes", "ventas", "operacion"), clave(f))),
+                                "antes_s": base, "ahora_s": f["mediana_s"],
+                                "cambio": f["mediana_s"] / base - 1})
+    return regresiones
+
+
+def _leer_tamanos(texto: str) -> list:
+    """"100:50:1000,1000:200:10000" -> [(100, 50, 1000), (1000, 200, 10000)]"""
+    tamanos = []
+    for parte in texto.split(","):
+        valores = tuple(int(v) for v in parte.split(":"))
+        if len(valores) != 3:
+            raise argparse.ArgumentTypeError(f"Tamaño inválido '{parte}': use productos:clientes:ventas")
+        tamanos.append(valores)
+    return tamanos
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tamanos", type=_leer_tamanos, default=TAMANOS,
+                        help="lista productos:clientes:ventas separada por comas")
+    parser.add_argument("--motores", default=",".join(MOTORES), help="excel, sqlite o ambos separados por comas")
+    parser.add_argument("--repeticiones", type=int, default=REPETICIONES)
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--salida", type=Path, default=RUTA_RESULTADOS)
+    parser.add_argument("--comparar", type=Path, help="JSON de una corrida anterior para buscar regresiones")
+    parser.add_argument("--umbral", type=float, default=UMBRAL_REGRESION)
+    args = parser.parse_args(argv)
+
+    informe = ejecutar(args.tamanos, [m.strip() for m in args.motores.split(",") if m.strip()],
+                       args.repeticiones, args.salida, args.semilla)
+    print(f"Resultados en {args.salida}")
+    if args.comparar:
+        referencia = json.loads(args.comparar.read_text(encoding="utf-8"))
+        regresiones = comparar(referencia, informe, args.umbral)
+        for r in regresiones:
+            print(f"REGRESIÓN {r['motor']} {r['ventas']} {r['operacion']}: "
+                  f"{r['antes_s'] * 1000:.1f} ms -> {r['ahora_s'] * 1000:.1f} ms ({r['cambio']:+.0%})")
+        if regresiones:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,25 @@
+"""Fixtures de las pruebas: el núcleo apuntando a una carpeta temporal, con cada motor."""
+import pytest
+
+import existencias
+import nucleo_ventas
+import reportes
+
+
+@pytest.fixture(params=["excel", "sqlite"])
+def nucleo(request, tmp_path, monkeypatch):
+    """nucleo_ventas sobre datos nuevos en tmp_path: dos productos y dos clientes."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(nucleo_ventas, "MOTOR_DATOS", request.param)
+    monkeypatch.setattr(nucleo_ventas, "RUTA_DATOS", tmp_path / "Ventas.xlsx")
+    monkeypatch.setattr(nucleo_ventas, "RUTA_SQLITE", tmp_path / "ventas.db")
+    monkeypatch.setattr(nucleo_ventas, "_AGREGADOS", reportes.AgregadosVentas())
+    monkeypatch.setattr(nucleo_ventas, "_ANALITICA", reportes.AnaliticaVentas())
+    monkeypatch.setattr(nucleo_ventas, "_EXISTENCIAS", existencias.LibroExistencias())
+    nucleo_ventas.preparar_datos()
+    nucleo_ventas.crear_producto("P1", "Producto 1", 10, "Proveedor", 2.5)
+    nucleo_ventas.crear_producto("P2", "Producto 2", 5, "Proveedor", 4.0)
+    nucleo_ventas.crear_cliente("C1", "Cliente 1", "Calle 1")
+    nucleo_ventas.crear_cliente("C2", "Cliente 2", "Calle 2")
+    yield nucleo_ventas
+    nucleo_ventas.detener_bandeja(0.1)
@@ -0,0 +1,250 @@
+import json
+import os
+import smtplib
+import threading
+import time
+import uuid
+from email import encoders
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from pathlib import Path
+
+# Servidor de salida; se puede apuntar a un SMTP local para pruebas.
+SMTP_HOST = os.getenv("VENTAS_SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("VENTAS_SMTP_PORT", "587"))
+SMTP_TLS = os.getenv("VENTAS_SMTP_TLS", "1") != "0"
+SMTP_REMITENTE = os.getenv("VENTAS_SMTP_REMITENTE")
+RUTA_BANDEJA = Path(os.getenv("VENTAS_BANDEJA", "bandeja_correo.json"))
+
+MAX_INTENTOS = 5
+ESPERA_BASE = 2.0        # segundos; se duplica en cada reintento
+ESPERA_MAXIMA = 300.0
+INACTIVIDAD = 30.0       # segundos sin mensajes antes de cerrar la conexión
+
+
+def construir_mensaje(remitente: str, destinatario: str, asunto: str, cuerpo: str, adjunto=None) -> MIMEMultipart:
+    msg = MIMEMultipart()
+    msg["From"] = remitente
+    msg["To"] = destinatario
+    msg["Subject"] = asunto
+    msg.attach(MIMEText(cuerpo, "plain"))
+
+    if adjunto:
+        adjunto = Path(adjunto)
+        with open(adjunto, "rb") as f:
+            parte = MIMEBase("application", "octet-stream")
+            parte.set_payload(f.read())
+        encoders.encode_base64(parte)
+        parte.add_header("Content-Disposition", f'attachment; filename="{adjunto.name}"')
+        msg.attach(parte)
+    return msg
+
+
+class BandejaSalida:
+    """Cola persistente de correos que un hilo envía reutilizando una conexión SMTP.
+
+    Cada mensaje encolado se guarda en un archivo JSON (escritura atómica),
+    así que los pendientes sobreviven a un reinicio. El hilo abre una sola
+    conexión autenticada para todos los mensajes listos y la cierra tras
+    INACTIVIDAD segundos sin trabajo. Un envío fallido se reintenta con
+    espera exponencial; después de max_intentos pasa a la lista de fallidos.
+    """
+
+    def __init__(self, ruta=RUTA_BANDEJA, host: str = None, port: int = None, usuario: str = None,
+                 clave: str = None, tls: bool = None, max_intentos: int = MAX_INTENTOS,
+                 espera_base: float = ESPERA_BASE, remitente: str = None):
+        self.ruta = Path(ruta)
+        self.host = host or SMTP_HOST
+        self.port = port or SMTP_PORT
+        self.usuario = usuario if usuario is not None else os.getenv("GOOGLE_APP_EMAIL")
+        self.clave = clave if clave is not None else os.getenv("GOOGLE_APP_PASS")
+        self.tls = SMTP_TLS if tls is None else tls
+        self.remitente = remitente or SMTP_REMITENTE or self.usuario or "ventas@localhost"
+        self.max_intentos = max_intentos
+        self.espera_base = espera_base
+        self.al_enviar = None      # callback(mensaje), llamado desde el hilo de envío
+        self.al_fallar = None      # callback(mensaje, error) al agotar los intentos
+        self._condicion = threading.Condition()
+        self._estado = self._cargar()
+        self._conexion = None
+        self._ultimo_uso = 0.0
+        self._hilo = None
+        self._detener = False
+
+    # --- persistencia ---
+
+    def _cargar(self) -> dict:
+        if self.ruta.exists():
+            try:
+                estado = json.loads(self.ruta.read_text(encoding="utf-8"))
+                return {"pendientes": estado.get("pendientes", []), "fallidos": estado.get("fallidos", [])}
+            except (OSError, ValueError) as e:
+                print("No se pudo leer la bandeja de correo:", e)
+        return {"pendientes": [], "fallidos": []}
+
+    def _guardar(self) -> None:
+        temporal = self.ruta.with_name(self.ruta.name + ".tmp")
+        temporal.write_text(json.dumps(self._estado, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(temporal, self.ruta)
+
+    # --- interfaz ---
+
+    def encolar(self, destinatario: str, asunto: str, cuerpo: str, adjunto=None) -> str:
+        """Guarda el mensaje en la bandeja y despierta al hilo de envío. Devuelve su id."""
+        mensaje = {
+            "id": uuid.uuid4().hex,
+            "destinatario": destinatario,
+            "asunto": asunto,
+            "cuerpo": cuerpo,
+            "adjunto": str(Path(adjunto).resolve()) if adjunto else None,
+            "intentos": 0,
+            "proximo_intento": 0.0,
+            "error": None,
+        }
+        with self._condicion:
+            self._estado["pendientes"].append(mensaje)
+            self._guardar()
+            self._condicion.notify()
+        self.iniciar()
+        return mensaje["id"]
+
+    def pendientes(self) -> list:
+        with self._condicion:
+            return [dict(m) for m in self._estado["pendientes"]]
+
+    def fallidos(self) -> list:
+        with self._condicion:
+            return [dict(m) for m in self._estado["fallidos"]]
+
+    def reintentar_fallidos(self) -> None:
+        """Devuelve los fallidos a la cola con los intentos en cero."""
+        with self._condicion:
+            for m in self._estado["fallidos"]:
+                m.update(intentos=0, proximo_intento=0.0)
+            self._estado["pendientes"].extend(self._estado["fallidos"])
+            self._estado["fallidos"] = []
+            self._guardar()
+            self._condicion.notify()
+        self.iniciar()
+
+    def iniciar(self) -> None:
+        with self._condicion:
+            if self._hilo is not None and self._hilo.is_alive():
+                return
+            self._detener = False
+            self._hilo = threading.Thread(target=self._trabajar, name="BandejaSalida", daemon=True)
+            self._hilo.start()
+
+    def detener(self, espera: float = 5.0) -> None:
+        """Detiene el hilo; lo que quede pendiente sigue guardado para la próxima vez."""
+        with self._condicion:
+            self._detener = True
+            self._condicion.notify()
+        if self._hilo is not None:
+            self._hilo.join(espera)
+
+    def vaciar(self, espera: float = 30.0) -> bool:
+        """Espera a que no queden pendientes; devuelve False si se agotó el tiempo."""
+        limite = time.monotonic() + espera
+        with self._condicion:
+            while self._estado["pendientes"]:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    return False
+                self._condicion.wait(min(restante, 0.1))
+        return True
+
+    # --- hilo de envío ---
+
+    def _siguiente(self):
+        """Primer mensaje listo para enviar, o los segundos que faltan para el próximo."""
+        ahora = time.time()
+        espera = None
+        for mensaje in self._estado["pendientes"]:
+            falta = mensaje["proximo_intento"] - ahora
+            if falta <= 0:
+                return mensaje, 0
+            espera = falta if espera is None else min(espera, falta)
+        return None, espera
+
+    def _trabajar(self):
+        while True:
+            with self._condicion:
+                while True:
+                    if self._detener:
+                        self._cerrar_conexion()
+                        return
+                    mensaje, espera = self._siguiente()
+                    if mensaje is not None:
+                        break
+                    if self._conexion is not None:
+                        inactivo = INACTIVIDAD - (time.monotonic() - self._ultimo_uso)
+                        if inactivo <= 0:
+                            self._cerrar_conexion()
+                        else:
+                            espera = inactivo if espera is None else min(espera, inactivo)
+                    self._condicion.wait(espera)
+            try:
+                self._enviar(mensaje)
+            except Exception as e:
+                self._registrar_fallo(mensaje, e)
+            else:
+                with self._condicion:
+                    self._estado["pendientes"].remove(mensaje)
+                    self._guardar()
+                    self._condicion.notify_all()
+                if self.al_enviar:
+                    self.al_enviar(dict(mensaje))
+
+    def _conectar(self) -> smtplib.SMTP:
+        if self._conexion is not None:
+            return self._conexion
+        servidor = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.tls:
+            servidor.starttls()
+        if self.usuario and self.clave:
+            servidor.login(self.usuario, self.clave)
+        self._conexion = servidor
+        return servidor
+
+    def _cerrar_conexion(self) -> None:
+        if self._conexion is None:
+            return
+        try:
+            self._conexion.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._conexion = None
+
+    def _enviar(self, mensaje: dict) -> None:
+        msg = construir_mensaje(self.remitente, mensaje["destinatario"], mensaje["asunto"],
+                                mensaje["cuerpo"], mensaje["adjunto"])
+        reutilizada = self._conexion is not None
+        try:
+            self._conectar().send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            if not reutilizada:
+                raise
+            # el servidor pudo cerrar la conexión mientras estaba inactiva: se abre otra
+            self._conexion = None
+            self._conectar().send_message(msg)
+        self._ultimo_uso = time.monotonic()
+
+    def _registrar_fallo(self, mensaje: dict, error: Exception) -> None:
+        self._cerrar_conexion()
+        agotado = False
+        with self._condicion:
+            mensaje["intentos"] += 1
+            mensaje["error"] = str(error)
+            if mensaje["intentos"] >= self.max_intentos:
+                self._estado["pendientes"].remove(mensaje)
+                self._estado["fallidos"].append(mensaje)
+                agotado = True
+            else:
+                espera = min(self.espera_base * 2 ** (mensaje["intentos"] - 1), ESPERA_MAXIMA)
+                mensaje["proximo_intento"] = time.time() + espera
+            self._guardar()
+            self._condicion.notify_all()
+        if agotado and self.al_fallar:
+            self.al_fallar(dict(mensaje), error)
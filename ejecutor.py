@@ -0,0 +1,88 @@
+import queue
+import threading
+
+
+class EjecutorIO:
+    """Ejecuta trabajos de E/S en un hilo aparte y entrega los resultados al hilo de Tk.
+
+    Hay un solo hilo trabajador: las operaciones corren de a una y en el
+    orden en que se pidieron, así que dos clics seguidos no se mezclan.
+    Los callbacks (al_terminar, al_fallar, al_cambiar_estado) se llaman
+    siempre desde el bucle de Tk mediante after().
+    """
+
+    INTERVALO_MS = 40
+
+    def __init__(self, widget, al_cambiar_estado=None):
+        self.widget = widget
+        self.al_cambiar_estado = al_cambiar_estado
+        self._pendientes = queue.Queue()
+        self._resultados = queue.Queue()
+        self._en_curso = 0          # solo se toca desde el hilo de Tk
+        self._sondeando = False
+        self._cerrado = False
+        self._hilo = threading.Thread(target=self._trabajar, name="EjecutorIO", daemon=True)
+        self._hilo.start()
+
+    def enviar(self, trabajo, al_terminar=None, al_fallar=None) -> None:
+        """Encola trabajo(); su resultado (o excepción) vuelve por los callbacks."""
+        if self._cerrado:
+            return
+        self._en_curso += 1
+        if self._en_curso == 1:
+            self._notificar(True)
+        self._pendientes.put((trabajo, al_terminar, al_fallar))
+        self._programar()
+
+    def ocupado(self) -> bool:
+        return self._en_curso > 0
+
+    def cerrar(self, espera: float = 10.0) -> None:
+        """Deja de aceptar trabajos y espera a que terminen los ya encolados."""
+        self._cerrado = True
+        self._pendientes.put(None)
+        self._hilo.join(espera)
+
+    def _trabajar(self):
+        while True:
+            tarea = self._pendientes.get()
+            if tarea is None:
+                return
+            trabajo, al_terminar, al_fallar = tarea
+            try:
+                self._resultados.put((al_terminar, al_fallar, trabajo(), None))
+            except Exception as e:
+                self._resultados.put((al_terminar, al_fallar, None, e))
+
+    def _programar(self):
+        if not self._sondeando and not self._cerrado:
+            self._sondeando = True
+            self.widget.after(self.INTERVALO_MS, self._revisar)
+
+    def _revisar(self):
+        self._sondeando = False
+        while True:
+            try:
+                al_terminar, al_fallar, resultado, error = self._resultados.get_nowait()
+            except queue.Empty:
+                break
+            self._en_curso -= 1
+            try:
+                if error is None:
+                    if al_terminar:
+                        al_terminar(resultado)
+                elif al_fallar:
+                    al_fallar(error)
+            except Exception as e:
+                print("Error en callback de E/S:", e)
+        if self._en_curso == 0:
+            self._notificar(False)
+        else:
+            self._programar()
+
+    def _notificar(self, ocupado: bool):
+        if self.al_cambiar_estado:
+            try:
+                self.al_cambiar_estado(ocupado)
+            except Exception as e:
+                print("Error al mostrar estado:", e)
@@ -0,0 +1,72 @@
+import threading
+
+import pandas as pd
+
+
+class SinExistencia(Exception):
+    """No alcanza la existencia del producto para descontar la cantidad pedida."""
+
+    def __init__(self, codigo: str, disponible: float):
+        super().__init__(f"Existencia insuficiente de {codigo}: quedan {disponible:g}.")
+        self.codigo = codigo
+        self.disponible = disponible
+
+
+class LibroExistencias:
+    """Existencia de cada producto en memoria, con un candado por código.
+
+    ajustar() comprueba, guarda (con la función que se le pasa) y recién
+    entonces cambia el valor en memoria, todo con el candado del producto:
+    dos ventas simultáneas del mismo producto no pueden vender las mismas
+    unidades, y las de productos distintos no se esperan entre sí. version
+    es la del inventario con el que coincide; si el almacenamiento cambia
+    por otra vía, quien lo usa lo reconstruye.
+    """
+
+    def __init__(self):
+        self._existencias = {}
+        self._candados = {}
+        self._candado = threading.Lock()
+        self.version = None
+
+    def construir(self, inventario: pd.DataFrame, version=None) -> None:
+        existencias = pd.to_numeric(inventario["existencia"], errors="coerce").fillna(0).astype(float)
+        with self._candado:
+            self._existencias = dict(zip(inventario["codigo"].astype(str), existencias))
+            self.version = version
+
+    def _candado_de(self, codigo: str) -> threading.Lock:
+        candado = self._candados.get(codigo)
+        if candado is None:
+            with self._candado:
+                candado = self._candados.setdefault(codigo, threading.Lock())
+        return candado
+
+    def disponible(self, codigo) -> float:
+        """Existencia actual, o None si el producto no está."""
+        return self._existencias.get(str(codigo))
+
+    def ajustar(self, codigo, cantidad: float, guardar=None) -> float:
+        """Suma cantidad (negativa al vender) a la existencia y devuelve el valor nuevo.
+
+        Lanza KeyError si el producto no existe y SinExistencia si quedaría
+        negativa. guardar(nuevo) persiste el valor y devuelve la versión del
+        inventario después de hacerlo; si falla, la memoria no cambia.
+        """
+        codigo = str(codigo)
+        version_antes = self.version
+        with self._candado_de(codigo):
+            actual = self._existencias.get(codigo)
+            if actual is None:
+                raise KeyError(codigo)
+            nuevo = actual + float(cantidad)
+            if nuevo < 0:
+                raise SinExistencia(codigo, actual)
+            version = guardar(nuevo) if guardar else None
+            self._existencias[codigo] = nuevo
+        if guardar:
+            with self._candado:
+                # si otro cambio se coló en el medio, la versión queda vieja y se reconstruye
+                if self.version == version_antes:
+                    self.version = version
+        return nuevo
@@ -0,0 +1,169 @@
+"""Trazas de rendimiento por acción del usuario.
+
+Cada acción (un clic que llega a _en_segundo_plano, o una llamada directa a
+una función marcada con @medido) abre un tramo que cuenta lecturas y
+escrituras físicas del almacenamiento, filas tocadas y tiempo por función.
+Al cerrarse, el tramo se guarda en memoria para el panel de depuración y se
+agrega como una línea JSON al archivo de traza.
+
+Desactivada (lo normal) cuesta una comprobación de ACTIVA por llamada:
+    VENTAS_TRAZA=1 python main.py            # traza en ventas_traza.jsonl
+    VENTAS_TRAZA=/tmp/t.jsonl python main.py
+"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+_valor = os.getenv("VENTAS_TRAZA", "")
+ACTIVA = _valor not in ("", "0")
+RUTA_TRAZA = Path(_valor if _valor not in ("", "0", "1") else "ventas_traza.jsonl")
+MAX_RECIENTES = 200
+
+_local = threading.local()
+_candado = threading.Lock()
+_recientes = deque(maxlen=MAX_RECIENTES)
+_totales = {"lecturas": 0, "escrituras": 0, "filas_leidas": 0, "filas_escritas": 0}
+_contador_tramos = 0
+
+
+def activar(ruta=None) -> None:
+    """Empieza a registrar; ruta=None mantiene el archivo actual, "" no escribe archivo."""
+    global ACTIVA, RUTA_TRAZA
+    if ruta is not None:
+        RUTA_TRAZA = Path(ruta) if ruta else None
+    ACTIVA = True
+
+
+def desactivar() -> None:
+    global ACTIVA
+    ACTIVA = False
+
+
+def _tramo_actual():
+    pila = getattr(_local, "pila", None)
+    return pila[-1] if pila else None
+
+
+def contar(tipo: str, detalle: str, filas: int = 0) -> None:
+    """Suma una operación física ("lectura" o "escritura") al tramo en curso.
+
+    Quien llama comprueba ACTIVA antes, para no pagar la llamada si está apagada.
+    """
+    if not ACTIVA:
+        return
+    clave_filas = "filas_leidas" if tipo == "lectura" else "filas_escritas"
+    with _candado:
+        _totales[tipo + "s"] += 1
+        _totales[clave_filas] += filas
+    tramo = _tramo_actual()
+    if tramo is None:
+        return
+    tramo[tipo + "s"] += 1
+    tramo[clave_filas] += filas
+    tramo["detalle"][f"{tipo}:{detalle}"] = tramo["detalle"].get(f"{tipo}:{detalle}", 0) + 1
+
+
+@contextmanager
+def accion(nombre: str):
+    """Tramo de una acción; dentro de otro tramo solo suma su tiempo a la función."""
+    if not ACTIVA:
+        yield None
+        return
+    padre = _tramo_actual()
+    if padre is not None:
+        t0 = time.perf_counter()
+        try:
+            yield padre
+        finally:
+            _sumar_funcion(padre, nombre, time.perf_counter() - t0)
+        return
+
+    global _contador_tramos
+    with _candado:
+        _contador_tramos += 1
+        numero = _contador_tramos
+    tramo = {
+        "n": numero, "accion": nombre, "inicio": time.time(), "hilo": threading.current_thread().name,
+        "duracion_ms": 0.0, "lecturas": 0, "escrituras": 0, "filas_leidas": 0, "filas_escritas": 0,
+        "detalle": {}, "funciones": {}, "error": None,
+    }
+    _local.pila = [tramo]
+    t0 = time.perf_counter()
+    try:
+        yield tramo
+    except BaseException as e:
+        tramo["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        tramo["duracion_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+        _local.pila = []
+        _cerrar(tramo)
+
+
+def _sumar_funcion(tramo: dict, nombre: str, segundos: float) -> None:
+    llamadas, total = tramo["funciones"].get(nombre, (0, 0.0))
+    tramo["funciones"][nombre] = (llamadas + 1, round(total + segundos * 1000, 3))
+
+
+def _cerrar(tramo: dict) -> None:
+    with _candado:
+        _recientes.append(tramo)
+        if RUTA_TRAZA is None:
+            return
+        try:
+            with open(RUTA_TRAZA, "a", encoding="utf-8") as f:
+                f.write(json.dumps(tramo, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print("No se pudo escribir la traza:", e)
+
+
+def medido(funcion):
+    """Decorador: mide la función dentro del tramo en curso (o abre uno con su nombre)."""
+    nombre = funcion.__name__
+
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        if not ACTIVA:
+            return funcion(*args, **kwargs)
+        with accion(nombre):
+            return funcion(*args, **kwargs)
+    return envoltura
+
+
+def en_accion(nombre: str, trabajo):
+    """Devuelve trabajo envuelto en un tramo (para pasarlo a otro hilo)."""
+    def envoltura():
+        with accion(nombre):
+            return trabajo()
+    return envoltura
+
+
+def nombre_accion(funcion) -> str:
+    """Nombre legible de un callable: la función que definió la lambda, si es una."""
+    partes = [p for p in getattr(funcion, "__qualname__", "trabajo").split(".")
+              if p not in ("<locals>", "<lambda>")]
+    return partes[-1] if partes else "trabajo"
+
+
+def recientes(desde: int = 0) -> list:
+    """Tramos cerrados con número mayor que desde (los más viejos primero)."""
+    with _candado:
+        return [t for t in _recientes if t["n"] > desde]
+
+
+def totales() -> dict:
+    """Contadores acumulados, incluidas las operaciones fuera de un tramo."""
+    with _candado:
+        return dict(_totales)
+
+
+def reiniciar() -> None:
+    with _candado:
+        _recientes.clear()
+        for k in _totales:
+            _totales[k] = 0
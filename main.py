@@ -13,22 +13,23 @@ def abrir_modulo(modulo):
     elif modulo == "Algoritmos":                
         abrir_algoritmos(root)
 
-root = tb.Window(themename="superhero")
-root.title("Menú Principal")
-root.geometry("400x300")
+if __name__ == "__main__":
+    root = tb.Window(themename="superhero")
+    root.title("Menú Principal")
+    root.geometry("400x300")
 
-tb.Label(root, text="Menú Principal", font=("Arial", 20, "bold")).pack(pady=20)
+    tb.Label(root, text="Menú Principal", font=("Arial", 20, "bold")).pack(pady=20)
 
-tb.Button(root, text="Matemáticas", bootstyle="primary", width=20,
-          command=lambda: abrir_modulo("Matemáticas")).pack(pady=10)
+    tb.Button(root, text="Matemáticas", bootstyle="primary", width=20,
+              command=lambda: abrir_modulo("Matemáticas")).pack(pady=10)
 
-tb.Button(root, text="Álgebra", bootstyle="secondary", width=20,
-          command=lambda: abrir_modulo("Álgebra")).pack(pady=10)
+    tb.Button(root, text="Álgebra", bootstyle="secondary", width=20,
+              command=lambda: abrir_modulo("Álgebra")).pack(pady=10)
 
-tb.Button(root, text="Algoritmos", bootstyle="success", width=20,
-          command=lambda: abrir_modulo("Algoritmos")).pack(pady=10)
+    tb.Button(root, text="Algoritmos", bootstyle="success", width=20,
+              command=lambda: abrir_modulo("Algoritmos")).pack(pady=10)
 
-tb.Button(root, text="Salir", bootstyle="danger", width=20,
-          command=root.destroy).pack(pady=20)
+    tb.Button(root, text="Salir", bootstyle="danger", width=20,
+              command=root.destroy).pack(pady=20)
 
-root.mainloop()
+    root.mainloop()
@@ -0,0 +1,942 @@
+"""Operaciones de inventario, clientes, ventas y reportes, sin interfaz gráfica.
+
+Las funciones devuelven datos o lanzan un ErrorVentas con un mensaje listo
+para mostrar; la ventana de Tk (algoritmos.py) es solo un adaptador, y los
+mismos llamados sirven para scripts, pruebas de carga y tareas nocturnas.
+"""
+import functools
+import os
+import random
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+import almacenamiento
+import correo
+import existencias
+import instrumentacion
+import reportes
+
+RUTA_DATOS = Path("Ventas.xlsx")
+HOJA_INVENTARIO = "Inventario"
+HOJA_CLIENTES   = "Clientes"
+HOJA_VENTAS     = "Ventas"
+
+# Motor de datos: "excel" (Ventas.xlsx) o "sqlite" (Ventas.xlsx queda solo para importar/exportar)
+MOTOR_DATOS = os.getenv("VENTAS_MOTOR", "excel")
+RUTA_SQLITE = Path(os.getenv("VENTAS_SQLITE", "ventas.db"))
+
+class ErrorVentas(Exception):
+    """Error de negocio; el mensaje se puede mostrar tal cual al usuario."""
+
+class DatosInvalidos(ErrorVentas, ValueError):
+    pass
+
+class Duplicado(DatosInvalidos):
+    pass
+
+class StockInsuficiente(DatosInvalidos):
+    pass
+
+class EstadoInvalido(DatosInvalidos):
+    """La operación no aplica al estado actual (por ejemplo, una venta anulada)."""
+
+class NoEncontrado(ErrorVentas, LookupError):
+    pass
+
+class ErrorAlmacenamiento(ErrorVentas):
+    pass
+
+# Veces que se repite una operación si otra instancia cambió las mismas filas al guardar.
+REINTENTOS_CONFLICTO = 5
+
+def _reintentando(funcion):
+    """Repite la operación completa (releyendo los datos) ante un conflicto con otra instancia."""
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        for intento in range(REINTENTOS_CONFLICTO):
+            try:
+                return funcion(*args, **kwargs)
+            except almacenamiento.Conflicto as e:
+                if intento == REINTENTOS_CONFLICTO - 1:
+                    raise ErrorAlmacenamiento(f"{e} Vuelva a intentarlo.") from e
+                time.sleep(random.uniform(0, 0.05 * (intento + 1)))  # que dos puestos no choquen otra vez
+            except almacenamiento.ArchivoBloqueado as e:
+                raise ErrorAlmacenamiento("El archivo de datos está ocupado por otro puesto; "
+                                          "vuelva a intentarlo.") from e
+    return envoltura
+
+def _numero(valor, campo: str) -> float:
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        raise DatosInvalidos(f"{campo} debe ser un número.") from None
+
+
+TABLAS = {
+    HOJA_INVENTARIO: {
+        "tabla": "inventario", "clave": "codigo", "dtype": {"codigo": str},
+        "columnas": {"codigo": "TEXT", "nombre": "TEXT", "existencia": "INTEGER",
+                     "proveedor": "TEXT", "precio": "REAL"},
+        "indices": ["nombre"],
+    },
+    HOJA_CLIENTES: {
+        "tabla": "clientes", "clave": "codigo", "dtype": {"codigo": str},
+        "columnas": {"codigo": "TEXT", "nombre": "TEXT", "direccion": "TEXT"},
+        "indices": ["nombre"],
+    },
+    HOJA_VENTAS: {
+        "tabla": "ventas", "clave": "id", "dtype": {"producto_codigo": str, "cliente_codigo": str},
+        "columnas": {"id": "INTEGER", "pedido": "INTEGER", "fecha": "TEXT", "producto": "TEXT", "cliente": "TEXT",
+                     "producto_codigo": "TEXT", "cliente_codigo": "TEXT",
+                     "cantidad": "REAL", "precio_unit": "REAL", "total": "REAL", "anulada": "BOOLEAN"},
+        "alias": {"Producto": "producto", "Cliente": "cliente"},
+        "indices": ["pedido", "producto", "cliente", "producto_codigo", "cliente_codigo"],
+    },
+}
+
+def _motor() -> almacenamiento.MotorDatos:
+    return almacenamiento.obtener_motor(MOTOR_DATOS, RUTA_DATOS, RUTA_SQLITE, TABLAS)
+
+def _usa_excel() -> bool:
+    return MOTOR_DATOS.lower() == "excel"
+
+def _version_datos(hoja: str):
+    """Versión de la hoja para los índices en memoria: (motor, archivo, *versión del motor).
+
+    La versión sola no alcanza: otro libro u otro motor pueden llegar a la
+    misma y los índices armados con uno no sirven para el otro.
+    """
+    version = _motor().version(hoja)
+    if version is None:
+        return None
+    return (MOTOR_DATOS.lower(), str(RUTA_DATOS if _usa_excel() else RUTA_SQLITE), *version)
+
+def crear_archivo_excel_si_no_existe():
+    """Crea Ventas.xlsx con las hojas necesarias si no existe."""
+    if RUTA_DATOS.exists():
+        return
+    with almacenamiento.bloqueo(RUTA_DATOS):
+        if RUTA_DATOS.exists():  # otra instancia lo creó mientras se esperaba
+            return
+        with pd.ExcelWriter(RUTA_DATOS, engine="openpyxl") as writer:
+            pd.DataFrame(columns=["codigo", "nombre", "existencia", "proveedor", "precio"])\
+                .to_excel(writer, sheet_name=HOJA_INVENTARIO, index=False)
+            pd.DataFrame(columns=["codigo", "nombre", "direccion"])\
+                .to_excel(writer, sheet_name=HOJA_CLIENTES, index=False)
+            # Hoja Ventas con columnas estándar + alias para reportes
+            pd.DataFrame(columns=[
+                "id","fecha","producto","cliente","cantidad","precio_unit","total","anulada",
+                "Producto","Cliente"
+            ]).to_excel(writer, sheet_name=HOJA_VENTAS, index=False)
+            pd.DataFrame({"clave": ["version_esquema"], "valor": [ESQUEMA_VERSION]})\
+                .to_excel(writer, sheet_name=almacenamiento.HOJA_META, index=False)
+        almacenamiento.invalidar_cache(RUTA_DATOS)
+        if instrumentacion.ACTIVA:
+            instrumentacion.contar("escritura", "xlsx")
+        print(f"Creado {RUTA_DATOS}")
+
+def inicializar_excel():
+    """Valida que exista el archivo y al menos la hoja Inventario; si no, lo crea."""
+    if not _usa_excel():
+        return
+    try:
+        if not RUTA_DATOS.exists():
+            crear_archivo_excel_si_no_existe()
+        else:
+            _motor().leer(HOJA_INVENTARIO)
+    except Exception:
+        crear_archivo_excel_si_no_existe()
+
+def exportar_datos_excel(ruta=None):
+    """Vuelca los datos del motor actual a un libro .xlsx (por defecto Ventas.xlsx)."""
+    almacenamiento.exportar_a_excel(_motor(), ruta or RUTA_DATOS)
+
+@instrumentacion.medido
+def preparar_datos():
+    """Deja listo el almacenamiento (archivo y hoja Ventas en el esquema actual)."""
+    if _usa_excel():
+        crear_archivo_excel_si_no_existe()
+    _asegurar_hoja_ventas()
+
+@instrumentacion.medido
+def version(hoja: str):
+    """Marca de versión de la hoja; cambia con cada escritura."""
+    inicializar_excel()
+    return _motor().version(hoja)
+
+@instrumentacion.medido
+def compactar_diario():
+    """Vuelca el diario de cambios pendientes a Ventas.xlsx."""
+    try:
+        _motor().compactar()
+    except Exception as e:
+        print("Error al compactar el diario:", e)
+
+
+# INVENTARIO
+
+@instrumentacion.medido
+def leer_inventario() -> pd.DataFrame:
+    inicializar_excel()
+    return _motor().leer(HOJA_INVENTARIO)
+
+@instrumentacion.medido
+@_reintentando
+def escribir_inventario(df: pd.DataFrame):
+    inicializar_excel()
+    _motor().escribir(HOJA_INVENTARIO, df)
+
+@instrumentacion.medido
+@_reintentando
+def crear_producto(codigo, nombre, existencia, proveedor, precio) -> dict:
+    """Agrega el producto y devuelve la fila guardada."""
+    codigo = str(codigo).strip()
+    nombre = str(nombre).strip()
+    proveedor = str(proveedor).strip()
+    existencia = int(_numero(existencia, "Existencia")) if str(existencia).strip() != "" else 0
+    precio = _numero(precio, "Precio") if str(precio).strip() != "" else 0.0
+
+    if not codigo or not nombre:
+        raise DatosInvalidos("Código y nombre son obligatorios.")
+
+    inicializar_excel()
+    fila = {
+        "codigo": codigo,
+        "nombre": nombre,
+        "existencia": existencia,
+        "proveedor": proveedor,
+        "precio": precio
+    }
+    try:
+        _motor().insertar(HOJA_INVENTARIO, fila)
+    except almacenamiento.ClaveDuplicada:
+        raise Duplicado(f"Ya existe un producto con código {codigo}.") from None
+    return fila
+
+@instrumentacion.medido
+@_reintentando
+def actualizar_producto(codigo_sel, nombre, existencia, proveedor, precio) -> dict:
+    """Cambia los datos del producto y devuelve la fila actualizada."""
+    inicializar_excel()
+    fila = _motor().buscar(HOJA_INVENTARIO, str(codigo_sel))
+    if fila is None:
+        raise NoEncontrado("No se encontró el producto en el archivo.")
+
+    cambios = {
+        "nombre": str(nombre).strip(),
+        "existencia": int(_numero(existencia, "Existencia")),
+        "proveedor": str(proveedor).strip(),
+        "precio": _numero(precio, "Precio")
+    }
+    _motor().actualizar(HOJA_INVENTARIO, str(codigo_sel), cambios)
+    return {**fila, **cambios}
+
+@instrumentacion.medido
+@_reintentando
+def eliminar_producto(codigo_sel) -> None:
+    inicializar_excel()
+    if _motor().buscar(HOJA_INVENTARIO, str(codigo_sel)) is None:
+        raise NoEncontrado("No se encontró el producto en el archivo.")
+    _motor().eliminar(HOJA_INVENTARIO, str(codigo_sel))
+
+
+# CLIENTES
+
+@instrumentacion.medido
+def leer_clientes() -> pd.DataFrame:
+    """Lee la hoja Clientes y normaliza columnas."""
+    inicializar_excel()
+    try:
+        df = _motor().leer(HOJA_CLIENTES)
+        df.columns = [c.lower().strip() for c in df.columns]
+        for col in ["codigo", "nombre", "direccion"]:
+            if col not in df.columns:
+                df[col] = ""
+        return df[["codigo", "nombre", "direccion"]]
+    except Exception as e:
+        print("Error al leer clientes:", e)
+        return pd.DataFrame(columns=["codigo", "nombre", "direccion"])
+
+@instrumentacion.medido
+@_reintentando
+def escribir_clientes(df: pd.DataFrame):
+    """Escribe la hoja Clientes en el archivo sin tocar otras hojas."""
+    inicializar_excel()
+    try:
+        _motor().escribir(HOJA_CLIENTES, df)
+    except Exception as e:
+        raise ErrorAlmacenamiento(f"No se pudo escribir Clientes: {e}") from e
+
+@instrumentacion.medido
+@_reintentando
+def crear_cliente(codigo, nombre, direccion) -> dict:
+    """Agrega el cliente y devuelve la fila guardada."""
+    codigo = str(codigo).strip()
+    nombre = str(nombre).strip()
+    direccion = str(direccion).strip()
+
+    if not codigo or not nombre or not direccion:
+        raise DatosInvalidos("Código, Nombre y Dirección son obligatorios.")
+
+    inicializar_excel()
+    fila = {"codigo": codigo, "nombre": nombre, "direccion": direccion}
+    try:
+        _motor().insertar(HOJA_CLIENTES, fila)
+    except almacenamiento.ClaveDuplicada:
+        raise Duplicado(f"Ya existe un cliente con código {codigo}.") from None
+    return fila
+
+@instrumentacion.medido
+@_reintentando
+def actualizar_cliente(codigo_sel, nombre, direccion) -> dict:
+    """Cambia nombre y dirección del cliente y devuelve la fila actualizada."""
+    inicializar_excel()
+    fila = _motor().buscar(HOJA_CLIENTES, str(codigo_sel))
+    if fila is None:
+        raise NoEncontrado("No se encontró el cliente en el archivo.")
+
+    if not str(nombre).strip() or not str(direccion).strip():
+        raise DatosInvalidos("Nombre y Dirección son obligatorios.")
+
+    cambios = {"nombre": str(nombre).strip(), "direccion": str(direccion).strip()}
+    _motor().actualizar(HOJA_CLIENTES, str(codigo_sel), cambios)
+    return {**fila, **cambios}
+
+@instrumentacion.medido
+@_reintentando
+def eliminar_cliente(codigo_sel) -> None:
+    inicializar_excel()
+    if _motor().buscar(HOJA_CLIENTES, str(codigo_sel)) is None:
+        raise NoEncontrado("No se encontró el cliente en el archivo.")
+    _motor().eliminar(HOJA_CLIENTES, str(codigo_sel))
+
+
+# VENTAS 
+
+VENTAS_COLUMNS = ["id","pedido","fecha","producto","cliente","producto_codigo","cliente_codigo",
+                  "cantidad","precio_unit","total","anulada"]
+
+# Versión del esquema del libro; se guarda en la hoja _meta.
+# Subirla cuando _asegurar_hoja_ventas deba volver a normalizar los datos.
+ESQUEMA_VERSION = 3
+
+def _codigos_por_nombre(tabla: pd.DataFrame) -> pd.Series:
+    """nombre -> código; con nombres repetidos gana el primero (como la búsqueda por nombre)."""
+    tabla = tabla.drop_duplicates("nombre")
+    return pd.Series(tabla["codigo"].astype(str).to_numpy(), index=tabla["nombre"].astype(str))
+
+def _normalizar_hoja_ventas(df: pd.DataFrame, inventario: pd.DataFrame = None,
+                            clientes: pd.DataFrame = None) -> pd.DataFrame:
+    # filas anteriores a los códigos: se completan por nombre, de una vez para toda la hoja
+    for col, origen, tabla in (("producto_codigo", "producto", inventario), ("cliente_codigo", "cliente", clientes)):
+        if col not in df.columns:
+            df[col] = None
+        faltan = df[col].isna() | (df[col].astype(str).str.strip() == "")
+        if tabla is not None and origen in df.columns and faltan.any():
+            df[col] = df[col].astype(object)
+            df.loc[faltan, col] = df.loc[faltan, origen].astype(str).map(_codigos_por_nombre(tabla))
+    if "pedido" in df.columns and "id" in df.columns:
+        df["pedido"] = pd.to_numeric(df["pedido"], errors="coerce").fillna(df["id"])
+    for col in VENTAS_COLUMNS:
+        if col not in df.columns:
+            if col == "pedido":
+                df[col] = df["id"] if "id" in df.columns else None  # ventas anteriores: una línea cada una
+            elif col in ("cantidad","precio_unit","total"):
+                df[col] = 0
+            elif col == "anulada":
+                df[col] = False
+            else:
+                df[col] = ""
+    if "Producto" not in df.columns:
+        df["Producto"] = df["producto"] if "producto" in df.columns else ""
+    if "Cliente" not in df.columns:
+        df["Cliente"] = df["cliente"] if "cliente" in df.columns else ""
+    base = [c for c in (VENTAS_COLUMNS + ["Producto","Cliente"]) if c in df.columns]
+    return df[base + [c for c in df.columns if c not in base]]
+
+@instrumentacion.medido
+def _asegurar_hoja_ventas():
+    """Crea/normaliza la hoja Ventas una sola vez por versión de esquema.
+
+    La versión aplicada queda en la hoja _meta; mientras coincida con
+    ESQUEMA_VERSION solo se consulta (desde caché), nunca se escribe.
+    Con SQLite la versión va en la tabla meta.
+    """
+    if not _usa_excel():
+        _asegurar_tabla_ventas()
+        return
+    crear_archivo_excel_si_no_existe()
+    try:
+        meta = almacenamiento.leer_meta(RUTA_DATOS)
+        if int(meta.get("version_esquema", 0) or 0) >= ESQUEMA_VERSION:
+            return
+
+        if HOJA_VENTAS in almacenamiento.hojas_del_libro(RUTA_DATOS):
+            df = _normalizar_hoja_ventas(
+                almacenamiento.leer_hoja(RUTA_DATOS, HOJA_VENTAS, dtype=TABLAS[HOJA_VENTAS]["dtype"]),
+                almacenamiento.leer_columnas(RUTA_DATOS, HOJA_INVENTARIO, ["codigo", "nombre"], dtype={"codigo": str}),
+                almacenamiento.leer_columnas(RUTA_DATOS, HOJA_CLIENTES, ["codigo", "nombre"], dtype={"codigo": str}))
+        else:
+            df = pd.DataFrame(columns=VENTAS_COLUMNS + ["Producto", "Cliente"])
+        almacenamiento.guardar_con_meta(RUTA_DATOS, {HOJA_VENTAS: df}, {"version_esquema": ESQUEMA_VERSION})
+    except Exception as e:
+        raise ErrorAlmacenamiento(f"No se pudo preparar la hoja Ventas: {e}") from e
+
+def _asegurar_tabla_ventas():
+    """Lo mismo que _asegurar_hoja_ventas, para el motor SQLite."""
+    motor = _motor()
+    if int(motor.leer_meta().get("version_esquema", 0) or 0) >= ESQUEMA_VERSION:
+        return
+    try:
+        with _transaccion():
+            df = _normalizar_hoja_ventas(motor.leer(HOJA_VENTAS), motor.leer(HOJA_INVENTARIO),
+                                         motor.leer(HOJA_CLIENTES))
+            motor.escribir(HOJA_VENTAS, df)
+            motor.guardar_meta({"version_esquema": ESQUEMA_VERSION})
+    except Exception as e:
+        raise ErrorAlmacenamiento(f"No se pudo preparar la tabla ventas: {e}") from e
+
+@instrumentacion.medido
+def _ventas_leer_base() -> pd.DataFrame:
+    """Lee y normaliza la hoja Ventas."""
+    _asegurar_hoja_ventas()
+    df = _motor().leer(HOJA_VENTAS)
+    for col in VENTAS_COLUMNS:
+        if col not in df.columns:
+            if col == "pedido":
+                df[col] = None
+            elif col in ("cantidad","precio_unit","total"):
+                df[col] = 0
+            elif col == "anulada":
+                df[col] = False
+            else:
+                df[col] = ""
+    df["pedido"] = pd.to_numeric(df["pedido"], errors="coerce").fillna(df["id"])  # filas de SQLite anteriores a los pedidos
+    df["anulada"] = df["anulada"].fillna(False).astype(bool)
+    df["Producto"] = df.get("producto", "").astype(str) if "producto" in df.columns else ""
+    df["Cliente"]  = df.get("cliente", "").astype(str)  if "cliente"  in df.columns else ""
+    return df
+
+@instrumentacion.medido
+@_reintentando
+def escribir_ventas(df: pd.DataFrame) -> None:
+    """Escribe el DataFrame completo en la hoja Ventas (compatibilidad con reportes)."""
+    _asegurar_hoja_ventas()
+    for col in VENTAS_COLUMNS:
+        if col not in df.columns:
+            if col == "pedido":
+                df[col] = df["id"]
+            elif col in ("cantidad","precio_unit","total"):
+                df[col] = 0
+            elif col == "anulada":
+                df[col] = False
+            else:
+                df[col] = ""
+    df["Producto"] = df["producto"].astype(str)
+    df["Cliente"]  = df["cliente"].astype(str)
+    base = [c for c in (VENTAS_COLUMNS + ["Producto","Cliente"]) if c in df.columns]
+    out = df[base + [c for c in df.columns if c not in base]]
+    _motor().escribir(HOJA_VENTAS, out)
+
+def calcular_total(cantidad, precio_unit) -> float:
+    return float(cantidad) * float(precio_unit)
+
+# Existencias en memoria: la comprobación y el descuento son un solo paso
+# atómico por producto, sin leer el inventario en cada venta.
+_EXISTENCIAS = existencias.LibroExistencias()
+
+def _existencias() -> existencias.LibroExistencias:
+    """Libro de existencias, reconstruido si el inventario cambió por otra vía."""
+    if _usa_excel():
+        crear_archivo_excel_si_no_existe()
+    version = _version_datos(HOJA_INVENTARIO)
+    if version is None or _EXISTENCIAS.version != version:
+        _EXISTENCIAS.construir(_motor().leer(HOJA_INVENTARIO), version)
+    return _EXISTENCIAS
+
+@contextmanager
+def _transaccion():
+    """Transacción del motor; si se deshace, las existencias en memoria se vuelven a leer."""
+    try:
+        with _motor().transaccion():
+            yield
+    except BaseException:
+        _EXISTENCIAS.version = None
+        raise
+
+def _ajustar_existencia(codigo, cantidad: float) -> float:
+    codigo = str(codigo)
+
+    def guardar(nuevo):
+        _motor().actualizar(HOJA_INVENTARIO, codigo, {"existencia": nuevo})
+        return _version_datos(HOJA_INVENTARIO)
+    try:
+        return _existencias().ajustar(codigo, cantidad, guardar)
+    except KeyError:
+        raise NoEncontrado(f"Producto {codigo} no existe en inventario.") from None
+
+def validar_existencia(codigo, cantidad) -> bool:
+    try:
+        cantidad = float(cantidad)
+    except Exception:
+        return False
+    disponible = _existencias().disponible(codigo)
+    return disponible is not None and disponible >= cantidad
+
+def actualizar_stock(codigo: str, cantidad_vendida: float) -> None:
+    """Descuenta la cantidad si alcanza (comprobar y descontar es un solo paso)."""
+    try:
+        _ajustar_existencia(codigo, -float(cantidad_vendida))
+    except existencias.SinExistencia:
+        raise StockInsuficiente("Stock insuficiente.") from None
+
+def restaurar_stock(codigo: str, cantidad: float) -> None:
+    _ajustar_existencia(codigo, float(cantidad))
+
+def _siguiente_id(cantidad: int = 1) -> int:
+    """Reserva cantidad números de venta seguidos (nunca reutilizados) y devuelve el primero."""
+    return _motor().reservar_claves(HOJA_VENTAS, cantidad)
+
+def _nombre_producto_por_codigo(codigo: str) -> str:
+    fila = _motor().buscar(HOJA_INVENTARIO, str(codigo))
+    if fila is None:
+        raise NoEncontrado(f"Código de producto {codigo} no existe.")
+    return str(fila["nombre"])
+
+def _nombre_cliente_por_codigo(codigo: str) -> str:
+    fila = _motor().buscar(HOJA_CLIENTES, str(codigo))
+    if fila is None:
+        raise NoEncontrado(f"Código de cliente {codigo} no existe.")
+    return str(fila["nombre"])
+
+def _codigo_producto_por_nombre(nombre: str) -> str:
+    fila = _motor().buscar(HOJA_INVENTARIO, str(nombre), columna="nombre")
+    if fila is None:
+        raise NoEncontrado("Producto no encontrado en inventario para ajuste.")
+    return str(fila["codigo"])
+
+def _codigo_producto_de(venta: dict) -> str:
+    """Código del producto vendido; por nombre solo si la fila no lo tiene."""
+    codigo = venta.get("producto_codigo")
+    if codigo is None or pd.isna(codigo) or not str(codigo).strip():
+        return _codigo_producto_por_nombre(str(venta["producto"]))
+    return str(codigo)
+
+def _venta_por_id(id_venta: int) -> dict:
+    """Fila de la venta como dict, con anulada normalizada a bool."""
+    _asegurar_hoja_ventas()
+    fila = _motor().buscar(HOJA_VENTAS, id_venta)
+    if fila is None:
+        raise NoEncontrado("ID de venta no existe.")
+    fila["anulada"] = bool(fila.get("anulada")) if pd.notna(fila.get("anulada")) else False
+    return fila
+
+def _lineas_del_pedido(venta: dict) -> list:
+    """Todas las líneas del pedido al que pertenece la venta (ella incluida)."""
+    if pd.isna(venta.get("pedido")):
+        return [venta]  # fila anterior a los pedidos: es un pedido de una línea
+    lineas = _motor().buscar_todos(HOJA_VENTAS, venta["pedido"], "pedido").to_dict("records")
+    for linea in lineas:
+        linea["anulada"] = bool(linea.get("anulada")) if pd.notna(linea.get("anulada")) else False
+    return lineas or [venta]
+
+def _reponer_lineas(lineas) -> None:
+    """Devuelve al inventario lo vendido en las líneas no anuladas (una vez por producto)."""
+    por_producto = {}
+    for linea in lineas:
+        if not linea["anulada"]:
+            codigo = _codigo_producto_de(linea)
+            por_producto[codigo] = por_producto.get(codigo, 0.0) + float(linea["cantidad"])
+    for codigo, cantidad in por_producto.items():
+        restaurar_stock(codigo, cantidad)
+
+# Índices derivados de Ventas: agrupados por cliente/producto y acumulados por
+# periodo. Se actualizan en cada alta, cambio o baja.
+_AGREGADOS = reportes.AgregadosVentas()
+_ANALITICA = reportes.AnaliticaVentas()
+
+@instrumentacion.medido
+def _al_dia(indice):
+    """Devuelve el índice reconstruido si la hoja Ventas cambió por otra vía."""
+    _asegurar_hoja_ventas()
+    version = _version_datos(HOJA_VENTAS)
+    if version is None or indice.version != version:
+        indice.construir(_ventas_leer_base(), version)
+    return indice
+
+def _agregados() -> reportes.AgregadosVentas:
+    return _al_dia(_AGREGADOS)
+
+def _analitica() -> reportes.AnaliticaVentas:
+    return _al_dia(_ANALITICA)
+
+def _agregados_tras_cambio(version_antes, anteriores=(), nuevas=()):
+    """Aplica a los índices un cambio ya guardado, si estaban al día antes de hacerlo."""
+    version = None
+    for indice in (_AGREGADOS, _ANALITICA):
+        if version_antes is None or indice.version != version_antes:
+            continue
+        if version is None:
+            version = _version_datos(HOJA_VENTAS)
+        if version[:3] != version_antes[:3]:
+            continue  # otro origen, o entraron cambios de otra instancia: se reconstruyen al pedirlos
+        for venta in anteriores:
+            indice.quitar(venta)
+        for venta in nuevas:
+            indice.agregar(venta)
+        indice.version = version
+
+@instrumentacion.medido
+def ventas_por(dimension: str, valor) -> pd.DataFrame:
+    """Ventas de un cliente o producto: por nombre exacto (sin distinguir mayúsculas)
+    con "cliente"/"producto", o por código con "cliente_codigo"/"producto_codigo"."""
+    if dimension in ("producto_codigo", "cliente_codigo"):
+        _asegurar_hoja_ventas()
+        return _motor().buscar_todos(HOJA_VENTAS, str(valor).strip(), dimension)
+    return _motor().buscar_varios(HOJA_VENTAS, _agregados().ids(dimension, valor))
+
+@instrumentacion.medido
+def vista_ventas() -> pd.DataFrame:
+    """Ventas con las columnas de la tabla y anulada como Sí/No."""
+    df = _ventas_leer_base()
+    vista = df[["id", "pedido", "fecha", "producto", "cliente", "cantidad", "precio_unit", "total"]].copy()
+    vista["anulada"] = df["anulada"].map({True: "Sí", False: "No"})
+    return vista
+
+def _linea_pedido(linea) -> tuple:
+    """(producto_codigo, cantidad, precio_unit) validados, desde una tupla o un dict."""
+    if isinstance(linea, dict):
+        linea = (linea.get("producto_codigo", linea.get("producto")), linea.get("cantidad"), linea.get("precio_unit"))
+    producto_codigo, cantidad, precio_unit = linea
+    cantidad = _numero(cantidad, "Cantidad")
+    precio_unit = _numero(precio_unit, "Precio unitario")
+    if cantidad <= 0 or precio_unit < 0:
+        raise DatosInvalidos("Cantidad > 0 y precio_unit ≥ 0.")
+    return str(producto_codigo).strip(), cantidad, precio_unit
+
+@instrumentacion.medido
+@_reintentando
+def crear_pedido(cliente_codigo, lineas) -> dict:
+    """Crea una venta de varias líneas (carrito) para un cliente.
+
+    lineas: lista de (producto_codigo, cantidad, precio_unit) o de dicts con
+    esas claves. Las cantidades del mismo producto se suman antes de validar
+    la existencia; stock y líneas se guardan en una sola escritura, así que
+    entra el pedido completo o nada. Cada línea es una fila de Ventas con su
+    id y el número de pedido (el id de la primera).
+    Devuelve {"pedido", "fecha", "cliente", "total", "lineas"}.
+    """
+    items = [_linea_pedido(linea) for linea in lineas]
+    if not items:
+        raise DatosInvalidos("El pedido no tiene líneas.")
+    vendido = {}
+    for codigo, cantidad, _ in items:
+        vendido[codigo] = vendido.get(codigo, 0.0) + cantidad
+    for codigo, cantidad in vendido.items():
+        if not validar_existencia(codigo, cantidad):
+            raise StockInsuficiente(f"No hay existencia suficiente de {codigo} para esta venta.")
+
+    _asegurar_hoja_ventas()
+    version_antes = _version_datos(HOJA_VENTAS)
+    nombres = {codigo: _nombre_producto_por_codigo(codigo) for codigo in vendido}
+    cliente_codigo = str(cliente_codigo).strip()
+    cli_nom  = _nombre_cliente_por_codigo(cliente_codigo)
+    fecha_txt = pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    # stock de todos los productos y todas las líneas se guardan juntos en una sola escritura
+    with _transaccion():
+        for codigo, cantidad in vendido.items():
+            try:
+                _ajustar_existencia(codigo, -cantidad)  # regla: restar stock
+            except existencias.SinExistencia:
+                raise StockInsuficiente(f"No hay existencia suficiente de {codigo} para esta venta.") from None
+        inicio = _siguiente_id(len(items))  # dentro de la transacción: se deshace con ella
+        nuevas = [{
+            "id": inicio + n,
+            "pedido": inicio,
+            "fecha": fecha_txt,
+            "producto": nombres[codigo],
+            "cliente": cli_nom,
+            "producto_codigo": codigo,
+            "cliente_codigo": cliente_codigo,
+            "cantidad": cantidad,
+            "precio_unit": precio_unit,
+            "total": calcular_total(cantidad, precio_unit),
+            "anulada": False
+        } for n, (codigo, cantidad, precio_unit) in enumerate(items)]
+        try:
+            _motor().insertar_lote(HOJA_VENTAS, pd.DataFrame(nuevas))
+        except almacenamiento.ClaveDuplicada:
+            raise almacenamiento.Conflicto("Otra instancia usó los mismos números de venta.") from None
+    _agregados_tras_cambio(version_antes, nuevas=nuevas)
+    return {"pedido": inicio, "fecha": fecha_txt, "cliente": cli_nom,
+            "total": sum(v["total"] for v in nuevas), "lineas": nuevas}
+
+@instrumentacion.medido
+def crear_venta(producto_codigo, cliente_codigo, cantidad, precio_unit) -> dict:
+    """Crea venta de un producto (un pedido de una sola línea). Devuelve la venta."""
+    return crear_pedido(cliente_codigo, [(producto_codigo, cantidad, precio_unit)])["lineas"][0]
+
+@instrumentacion.medido
+@_reintentando
+def actualizar_venta(id_venta: int, cantidad=None, precio_unit=None) -> dict:
+    """Actualiza cantidad/precio; ajusta stock por diferencia en cantidad. Devuelve la venta."""
+    venta = _venta_por_id(id_venta)
+    version_antes = _version_datos(HOJA_VENTAS)
+    if venta["anulada"]:
+        raise EstadoInvalido("No se puede actualizar una venta anulada.")
+
+    old_cant = float(venta["cantidad"])
+    old_prec = float(venta["precio_unit"])
+    new_cant = _numero(cantidad, "Cantidad") if cantidad not in (None, "") else old_cant
+    new_prec = _numero(precio_unit, "Precio unitario") if precio_unit not in (None, "") else old_prec
+    if new_cant <= 0 or new_prec < 0:
+        raise DatosInvalidos("Cantidad > 0 y precio_unit ≥ 0.")
+
+    diff = new_cant - old_cant
+    with _transaccion():
+        if diff != 0:
+            codigo = _codigo_producto_de(venta)
+            if diff > 0:
+                if not validar_existencia(codigo, diff):
+                    raise StockInsuficiente("Stock insuficiente para aumentar cantidad.")
+                actualizar_stock(codigo, diff)
+            else:
+                restaurar_stock(codigo, -diff)
+
+        cambios = {
+            "cantidad": new_cant,
+            "precio_unit": new_prec,
+            "total": calcular_total(new_cant, new_prec)
+        }
+        _motor().actualizar(HOJA_VENTAS, id_venta, cambios)
+    _agregados_tras_cambio(version_antes, anteriores=[venta], nuevas=[{**venta, **cambios}])
+    return {**venta, **cambios}
+
+@instrumentacion.medido
+@_reintentando
+def anular_venta(id_venta: int) -> dict:
+    """Anula todas las líneas del pedido de la venta y repone su stock. Devuelve la venta anulada."""
+    venta = _venta_por_id(id_venta)
+    version_antes = _version_datos(HOJA_VENTAS)
+    if venta["anulada"]:
+        raise EstadoInvalido("La venta ya estaba anulada.")
+
+    lineas = [linea for linea in _lineas_del_pedido(venta) if not linea["anulada"]]
+    with _transaccion():
+        _reponer_lineas(lineas)
+        for linea in lineas:
+            _motor().actualizar(HOJA_VENTAS, linea["id"], {"anulada": True}, evento="anular")
+    _agregados_tras_cambio(version_antes, anteriores=lineas,
+                           nuevas=[{**linea, "anulada": True} for linea in lineas])
+    return {**venta, "anulada": True}
+
+@instrumentacion.medido
+@_reintentando
+def eliminar_venta(id_venta: int) -> dict:
+    """Elimina todas las líneas del pedido de la venta, reponiendo el stock de las
+    que no estaban anuladas. Devuelve la venta eliminada."""
+    venta = _venta_por_id(id_venta)
+    version_antes = _version_datos(HOJA_VENTAS)
+    lineas = _lineas_del_pedido(venta)
+    with _transaccion():
+        _reponer_lineas(lineas)
+        for linea in lineas:
+            _motor().eliminar(HOJA_VENTAS, linea["id"])
+    _agregados_tras_cambio(version_antes, anteriores=lineas)
+    return venta
+
+COLUMNAS_LOTE = ["producto", "cliente", "cantidad", "precio_unit"]
+
+@instrumentacion.medido
+def leer_lote(origen) -> pd.DataFrame:
+    """El lote como DataFrame: una copia si ya lo es, o el CSV leído como texto."""
+    if isinstance(origen, pd.DataFrame):
+        return origen.copy()
+    try:
+        return pd.read_csv(origen, dtype=str, sep=None, engine="python")
+    except (OSError, pd.errors.ParserError) as e:
+        raise DatosInvalidos(f"No se pudo leer el lote: {e}") from e
+
+@_reintentando
+def importar_ventas_lote(origen):
+    """Importa un lote de ventas (CSV o DataFrame con códigos de producto y cliente,
+    cantidad y precio_unit).
+
+    Todas las líneas se validan juntas contra el libro de existencias: la
+    existencia se consume en el orden del lote y las líneas que no alcanzan
+    (o tienen datos inválidos) van al reporte de errores sin detener el resto.
+    Stock y ventas se guardan en una sola escritura. Devuelve (ventas_creadas, errores).
+    """
+    lote = leer_lote(origen)
+    lote.columns = [str(c).strip().lower() for c in lote.columns]
+    lote = lote.rename(columns={"producto_codigo": "producto", "cliente_codigo": "cliente"})
+    faltan = [c for c in COLUMNAS_LOTE if c not in lote.columns]
+    if faltan:
+        raise DatosInvalidos(f"Faltan columnas en el lote: {', '.join(faltan)}")
+
+    lote = lote[COLUMNAS_LOTE].reset_index(drop=True)
+    lote["linea"] = lote.index + 1
+    lote["producto"] = lote["producto"].astype(str).str.strip()
+    lote["cliente"] = lote["cliente"].astype(str).str.strip()
+    lote["cantidad"] = pd.to_numeric(lote["cantidad"], errors="coerce")
+    lote["precio_unit"] = pd.to_numeric(lote["precio_unit"], errors="coerce")
+
+    inv = leer_inventario()[["codigo", "nombre"]]
+    inv["codigo"] = inv["codigo"].astype(str)
+    inv = inv.drop_duplicates("codigo")
+    cli = leer_clientes()[["codigo", "nombre"]]
+    cli["codigo"] = cli["codigo"].astype(str)
+    cli = cli.drop_duplicates("codigo")
+    lote = lote.merge(inv.rename(columns={"codigo": "producto", "nombre": "producto_nombre"}),
+                      on="producto", how="left")
+    lote = lote.merge(cli.rename(columns={"codigo": "cliente", "nombre": "cliente_nombre"}),
+                      on="cliente", how="left")
+
+    error = pd.Series("", index=lote.index)
+    def marcar(filtro, texto):
+        error[filtro & (error == "")] = texto
+
+    marcar(lote["cantidad"].isna() | lote["precio_unit"].isna(), "Cantidad o precio no numérico.")
+    marcar((lote["cantidad"] <= 0) | (lote["precio_unit"] < 0), "Cantidad > 0 y precio_unit ≥ 0.")
+    marcar(lote["producto_nombre"].isna(), "Producto no existe en inventario.")
+    marcar(lote["cliente_nombre"].isna(), "Cliente no existe.")
+    validas = error == ""
+    libro = _existencias()
+    stock_actual = {codigo: libro.disponible(codigo) or 0 for codigo in lote.loc[validas, "producto"].unique()}
+    pedido = lote.loc[validas].groupby("producto")["cantidad"].sum()
+    # solo los productos que no alcanzan para todo el lote se recorren línea por línea;
+    # una línea rechazada no consume existencia y las siguientes pueden entrar
+    sin_stock = pd.Series(False, index=lote.index)
+    for codigo in pedido.index[pedido > pedido.index.map(stock_actual)]:
+        restante = stock_actual[codigo]
+        for i, cantidad in lote.loc[validas & (lote["producto"] == codigo), "cantidad"].items():
+            if cantidad <= restante:
+                restante -= cantidad
+            else:
+                sin_stock[i] = True
+    marcar(sin_stock, "No hay existencia suficiente.")
+
+    errores = lote.loc[error != "", ["linea"] + COLUMNAS_LOTE].assign(error=error[error != ""])
+    ok = lote[error == ""]
+    if ok.empty:
+        return pd.DataFrame(columns=VENTAS_COLUMNS), errores
+
+    _asegurar_hoja_ventas()
+    version_antes = _version_datos(HOJA_VENTAS)
+    ventas = pd.DataFrame({
+        "fecha": pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "producto": ok["producto_nombre"].to_numpy(),
+        "cliente": ok["cliente_nombre"].to_numpy(),
+        "producto_codigo": ok["producto"].to_numpy(),
+        "cliente_codigo": ok["cliente"].to_numpy(),
+        "cantidad": ok["cantidad"].to_numpy(),
+        "precio_unit": ok["precio_unit"].to_numpy(),
+        "total": (ok["cantidad"] * ok["precio_unit"]).to_numpy(),
+        "anulada": False,
+    })
+    vendido = ok.groupby("producto")["cantidad"].sum()
+    with _transaccion():
+        for codigo, cantidad in vendido.items():
+            try:
+                _ajustar_existencia(codigo, -float(cantidad))
+            except (existencias.SinExistencia, NoEncontrado):
+                # se validó fuera de la transacción: si otra venta la consumió, se reintenta todo el lote
+                raise almacenamiento.Conflicto("Otra venta cambió la existencia de los productos del lote.") from None
+        inicio = _siguiente_id(len(ok))
+        ventas.insert(0, "id", range(inicio, inicio + len(ok)))
+        ventas.insert(1, "pedido", ventas["id"])  # cada línea importada es una venta aparte
+        try:
+            _motor().insertar_lote(HOJA_VENTAS, ventas)
+        except almacenamiento.ClaveDuplicada:
+            raise almacenamiento.Conflicto("Otra instancia usó los mismos números de venta.") from None
+    _agregados_tras_cambio(version_antes, nuevas=ventas.to_dict("records"))
+    return ventas, errores
+
+
+# REPORTES
+
+@instrumentacion.medido
+def leer_ventas() -> pd.DataFrame:
+    """Hoja Ventas tal como está guardada (para reportes)."""
+    if _usa_excel() and not RUTA_DATOS.exists():
+        raise ErrorAlmacenamiento("No se encontró el archivo Ventas.xlsx")
+    try:
+        return _motor().leer(HOJA_VENTAS)
+    except Exception as e:
+        raise ErrorAlmacenamiento(f"No se pudo leer el archivo: {e}") from e
+
+def filtrar_ventas(df: pd.DataFrame, columna, valor) -> pd.DataFrame:
+    """Ventas cuya columna es igual a valor (sin distinguir mayúsculas ni espacios de borde)."""
+    if columna not in df.columns:
+        raise DatosInvalidos(f"No hay columna '{columna}' en la hoja Ventas.")
+    buscado = str(valor).strip().casefold()
+    return df[df[columna].astype(str).str.strip().str.casefold() == buscado]
+
+@instrumentacion.medido
+def generar_reporte(columna, valor) -> pd.DataFrame:
+    """Ventas cuya columna es igual a valor; cliente y producto salen de los agregados."""
+    if str(columna).lower() in (*reportes.AgregadosVentas.DIMENSIONES, "producto_codigo", "cliente_codigo"):
+        return ventas_por(str(columna).lower(), valor)
+    return filtrar_ventas(leer_ventas(), columna, valor)
+
+# Bandeja de salida compartida; los correos pendientes de la sesión anterior
+# se retoman al crearla.
+_BANDEJA = None
+
+def bandeja() -> correo.BandejaSalida:
+    global _BANDEJA
+    if _BANDEJA is None:
+        _BANDEJA = correo.BandejaSalida()
+        _BANDEJA.al_fallar = lambda m, e: print(f"No se pudo enviar el correo a {m['destinatario']}: {e}")
+        _BANDEJA.iniciar()
+    return _BANDEJA
+
+def detener_bandeja(espera: float = 1.0) -> None:
+    """Detiene el envío; lo pendiente queda guardado para la próxima vez."""
+    if _BANDEJA is not None:
+        _BANDEJA.detener(espera=espera)
+
+def enviar_mail(destinatario: str, asunto: str, cuerpo: str, ruta_adjunto: Path) -> str:
+    """Deja el correo en la bandeja de salida; el envío sigue en segundo plano."""
+    return bandeja().encolar(destinatario, asunto, cuerpo, ruta_adjunto)
+
+@instrumentacion.medido
+def enviar_reporte_cliente(cliente: str, destinatario: str, formato: str = "txt", compresion: str = None):
+    """Genera el reporte del cliente (comprimido si se pide) y lo envía. Devuelve None si no hay ventas."""
+    if _usa_excel() and not RUTA_DATOS.exists():
+        raise ErrorAlmacenamiento("No se encontró el archivo Ventas.xlsx")
+    return enviar_reporte(ventas_por("cliente", cliente), cliente, destinatario, formato, compresion)
+
+def enviar_reporte(df_rep: pd.DataFrame, cliente: str, destinatario: str, formato: str = "txt", compresion: str = None):
+    """Escribe el reporte ya filtrado del cliente y lo deja en la bandeja. Devuelve None si está vacío."""
+    if df_rep.empty:
+        return None
+
+    ruta_final = reportes.escribir_reporte(
+        df_rep, Path(reportes.nombre_archivo_reporte(cliente, formato=formato)), formato, compresion
+    )
+
+    asunto = f"Reporte de ventas del cliente: {cliente}"
+    cuerpo = f"Adjunto encontrarás el reporte de ventas del cliente {cliente}."
+    enviar_mail(destinatario, asunto, cuerpo, ruta_final)
+    return destinatario
+
+@instrumentacion.medido
+def generar_reportes_clientes(carpeta, formato: str = "txt", compresion: str = None) -> list:
+    """Escribe en carpeta el reporte de cada cliente leyendo Ventas una sola vez."""
+    _asegurar_hoja_ventas()
+    return reportes.generar_reportes_lote(_motor().leer(HOJA_VENTAS), carpeta, columna="Cliente",
+                                          formato=formato, compresion=compresion)
+
+@instrumentacion.medido
+def analisis(periodo: str, n: int):
+    """(serie por periodo, top productos, top clientes, versión de los datos)."""
+    analitica = _analitica()
+    serie = analitica.serie(periodo)
+    serie["periodo"] = serie["periodo"].dt.strftime("%Y-%m-%d")
+    return (serie, analitica.top("producto", n), analitica.top("cliente", n), analitica.version)
+
@@ -0,0 +1,472 @@
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+from openpyxl import Workbook
+
+
+def _normalizar(valor) -> str:
+    """Clave de agrupación: sin espacios de borde y sin distinguir mayúsculas."""
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return ""
+    return str(valor).strip().casefold()
+
+
+def _clave_grupo(codigo, nombre) -> str:
+    """Código del cliente o producto; las ventas sin código (libros viejos) se agrupan por nombre."""
+    if codigo is None or (not isinstance(codigo, str) and pd.isna(codigo)) or not str(codigo).strip():
+        return _normalizar(nombre)
+    return str(codigo).strip()
+
+
+def _claves_grupo(df: pd.DataFrame, dimension: str) -> pd.Series:
+    """_clave_grupo de cada fila de la hoja Ventas, sin recorrerla."""
+    nombres = df[dimension].map(_normalizar)
+    columna = f"{dimension}_codigo"
+    if columna not in df.columns:
+        return nombres
+    codigos = df[columna].astype("string").str.strip()
+    return codigos.where(codigos.notna() & (codigos != ""), nombres).astype(object)
+
+
+class AgregadosVentas:
+    """Ventas agrupadas por cliente y por producto, mantenidas en memoria.
+
+    Los grupos son por código (dos clientes con el mismo nombre no se
+    mezclan); por nombre se consulta sumando los grupos que lo tienen.
+    Por cada grupo se guardan los id de sus ventas y, de las no anuladas,
+    el total vendido, la cantidad de ventas y la fecha de la última. Se
+    construye una vez a partir de la hoja Ventas y después se actualiza
+    venta a venta con agregar()/quitar(); version indica a qué versión de
+    la hoja corresponde (None = hay que reconstruir).
+    """
+
+    DIMENSIONES = ("cliente", "producto")
+
+    def __init__(self):
+        self.version = None
+        self._candado = threading.RLock()
+        self._grupos = {d: {} for d in self.DIMENSIONES}
+        self._por_nombre = {d: {} for d in self.DIMENSIONES}   # nombre normalizado -> {códigos}
+
+    def construir(self, df: pd.DataFrame, version=None) -> None:
+        grupos = {d: {} for d in self.DIMENSIONES}
+        if not df.empty:
+            activas = ~df["anulada"].fillna(False).astype(bool)
+            fechas = pd.to_datetime(df["fecha"], errors="coerce")
+            totales = pd.to_numeric(df["total"], errors="coerce").fillna(0.0)
+            for dimension in self.DIMENSIONES:
+                for clave, filas in df.groupby(_claves_grupo(df, dimension), sort=False).groups.items():
+                    grupos[dimension][clave] = {
+                        "nombre": str(df.at[filas[0], dimension]),
+                        "ventas": {
+                            int(df.at[i, "id"]): (fechas[i], float(totales[i]), bool(activas[i]))
+                            for i in filas
+                        },
+                    }
+        por_nombre = {d: {} for d in self.DIMENSIONES}
+        for dimension, mapa in grupos.items():
+            for clave, grupo in mapa.items():
+                por_nombre[dimension].setdefault(_normalizar(grupo["nombre"]), set()).add(clave)
+        with self._candado:
+            self._grupos = {d: {k: self._resumir(g) for k, g in grupos[d].items()} for d in grupos}
+            self._por_nombre = por_nombre
+            self.version = version
+
+    @staticmethod
+    def _resumir(grupo: dict) -> dict:
+        activas = [(f, t) for f, t, activa in grupo["ventas"].values() if activa]
+        fechas = [f for f, _ in activas if not pd.isna(f)]
+        grupo["total"] = sum(t for _, t in activas)
+        grupo["cantidad"] = len(activas)
+        grupo["ultima_fecha"] = max(fechas) if fechas else None
+        return grupo
+
+    def agregar(self, venta: dict) -> None:
+        """Suma una venta (nueva o en su estado nuevo) a sus grupos."""
+        fecha = pd.to_datetime(venta.get("fecha"), errors="coerce")
+        total = float(venta.get("total") or 0)
+        activa = not bool(venta.get("anulada"))
+        with self._candado:
+            for dimension in self.DIMENSIONES:
+                clave = _clave_grupo(venta.get(f"{dimension}_codigo"), venta.get(dimension))
+                grupo = self._grupos[dimension].get(clave)
+                if grupo is None:
+                    grupo = self._grupos[dimension][clave] = {
+                        "nombre": str(venta.get(dimension, "")), "ventas": {},
+                        "total": 0.0, "cantidad": 0, "ultima_fecha": None}
+                    self._por_nombre[dimension].setdefault(_normalizar(grupo["nombre"]), set()).add(clave)
+                grupo["ventas"][int(venta["id"])] = (fecha, total, activa)
+                if activa:
+                    grupo["total"] += total
+                    grupo["cantidad"] += 1
+                    if not pd.isna(fecha) and (grupo["ultima_fecha"] is None or fecha > grupo["ultima_fecha"]):
+                        grupo["ultima_fecha"] = fecha
+
+    def quitar(self, venta: dict) -> None:
+        """Resta una venta (en su estado anterior) de sus grupos."""
+        with self._candado:
+            for dimension in self.DIMENSIONES:
+                clave = _clave_grupo(venta.get(f"{dimension}_codigo"), venta.get(dimension))
+                grupo = self._grupos[dimension].get(clave)
+                if grupo is None or grupo["ventas"].pop(int(venta["id"]), None) is None:
+                    continue
+                if grupo["ventas"]:
+                    self._resumir(grupo)
+                else:
+                    del self._grupos[dimension][clave]
+                    claves = self._por_nombre[dimension].get(_normalizar(grupo["nombre"]), set())
+                    claves.discard(clave)
+                    if not claves:
+                        self._por_nombre[dimension].pop(_normalizar(grupo["nombre"]), None)
+
+    def resumen(self, dimension: str, valor) -> dict:
+        """ids, total, cantidad y ultima_fecha del grupo (vacío si no existe).
+
+        dimension "cliente"/"producto" busca por nombre (suma los códigos con
+        ese nombre); "cliente_codigo"/"producto_codigo", por código.
+        """
+        with self._candado:
+            if dimension.endswith("_codigo"):
+                grupo = self._grupos[dimension[:-len("_codigo")]].get(str(valor).strip())
+                grupos = [grupo] if grupo is not None else []
+            else:
+                grupos = [self._grupos[dimension][k]
+                          for k in sorted(self._por_nombre[dimension].get(_normalizar(valor), ()))]
+            if not grupos:
+                return {"nombre": str(valor), "ids": [], "total": 0.0, "cantidad": 0, "ultima_fecha": None}
+            fechas = [g["ultima_fecha"] for g in grupos if g["ultima_fecha"] is not None]
+            return {"nombre": grupos[0]["nombre"], "ids": sorted(i for g in grupos for i in g["ventas"]),
+                    "total": sum(g["total"] for g in grupos), "cantidad": sum(g["cantidad"] for g in grupos),
+                    "ultima_fecha": max(fechas) if fechas else None}
+
+    def ids(self, dimension: str, valor) -> list:
+        return self.resumen(dimension, valor)["ids"]
+
+    def grupos(self, dimension: str) -> list:
+        """Nombres de todos los grupos (uno por código) de la dimensión."""
+        with self._candado:
+            return [g["nombre"] for g in self._grupos[dimension].values()]
+
+
+class AnaliticaVentas:
+    """Ingresos y unidades por día, semana y mes, con top de productos y clientes.
+
+    La base son acumulados por día (solo ventas no anuladas) calculados con
+    groupby al construir; productos y clientes se acumulan por código y el
+    nombre se agrega al armar el top. Los de semana y mes se arman sumando
+    días y quedan en caché; un alta, cambio o baja toca solo el día de esa venta y descarta
+    la caché de su semana y su mes, así que los periodos cerrados no se
+    vuelven a calcular. Mismo protocolo que AgregadosVentas: construir(),
+    agregar(), quitar() y version.
+    """
+
+    PERIODOS = {"dia": "D", "semana": "W", "mes": "M"}
+    DIMENSIONES = ("producto", "cliente")
+
+    def __init__(self):
+        self.version = None
+        self._candado = threading.RLock()
+        self._dias = {}
+        self._cache = {}
+        self._nombres = {d: {} for d in self.DIMENSIONES}   # código -> último nombre visto
+
+    @staticmethod
+    def _dia_vacio() -> dict:
+        return {"ingresos": 0.0, "unidades": 0.0, "ventas": 0, "producto": {}, "cliente": {}}
+
+    def _inicio(self, dia: pd.Timestamp, periodo: str) -> pd.Timestamp:
+        if periodo == "dia":
+            return dia
+        return dia.to_period(self.PERIODOS[periodo]).start_time
+
+    def construir(self, df: pd.DataFrame, version=None) -> None:
+        dias = {}
+        nombres = {d: {} for d in self.DIMENSIONES}
+        if not df.empty:
+            datos = pd.DataFrame({
+                "dia": pd.to_datetime(df["fecha"], errors="coerce").dt.normalize(),
+                "ingresos": pd.to_numeric(df["total"], errors="coerce").fillna(0.0),
+                "unidades": pd.to_numeric(df["cantidad"], errors="coerce").fillna(0.0),
+                **{d: _claves_grupo(df, d) for d in self.DIMENSIONES},
+            })
+            for dimension in self.DIMENSIONES:
+                nombres[dimension] = dict(zip(datos[dimension], df[dimension].astype(str)))
+            datos = datos[~df["anulada"].fillna(False).astype(bool) & datos["dia"].notna()]
+            por_dia = datos.groupby("dia").agg(ingresos=("ingresos", "sum"), unidades=("unidades", "sum"),
+                                               ventas=("ingresos", "size"))
+            for dia, fila in por_dia.iterrows():
+                dias[dia] = {"ingresos": float(fila["ingresos"]), "unidades": float(fila["unidades"]),
+                             "ventas": int(fila["ventas"]), "producto": {}, "cliente": {}}
+            for dimension in self.DIMENSIONES:
+                grupo = datos.groupby(["dia", dimension])[["ingresos", "unidades"]].sum()
+                for (dia, clave), ingresos, unidades in zip(grupo.index, grupo["ingresos"], grupo["unidades"]):
+                    dias[dia][dimension][clave] = [float(ingresos), float(unidades)]
+        with self._candado:
+            self._dias = dias
+            self._cache = {}
+            self._nombres = nombres
+            self.version = version
+
+    def _aplicar(self, venta: dict, signo: int) -> None:
+        if venta is None or bool(venta.get("anulada")):
+            return
+        dia = pd.to_datetime(venta.get("fecha"), errors="coerce")
+        if pd.isna(dia):
+            return
+        dia = dia.normalize()
+        ingresos = signo * float(venta.get("total") or 0)
+        unidades = signo * float(venta.get("cantidad") or 0)
+        with self._candado:
+            acumulado = self._dias.setdefault(dia, self._dia_vacio())
+            acumulado["ingresos"] += ingresos
+            acumulado["unidades"] += unidades
+            acumulado["ventas"] += signo
+            for dimension in self.DIMENSIONES:
+                clave = _clave_grupo(venta.get(f"{dimension}_codigo"), venta.get(dimension))
+                if signo > 0:
+                    self._nombres[dimension][clave] = str(venta.get(dimension, ""))
+                par = acumulado[dimension].setdefault(clave, [0.0, 0.0])
+                par[0] += ingresos
+                par[1] += unidades
+                if par == [0.0, 0.0]:
+                    del acumulado[dimension][clave]
+            if acumulado["ventas"] <= 0:
+                del self._dias[dia]
+            for periodo in ("semana", "mes"):
+                self._cache.pop((periodo, self._inicio(dia, periodo)), None)
+
+    def agregar(self, venta: dict) -> None:
+        self._aplicar(venta, 1)
+
+    def quitar(self, venta: dict) -> None:
+        self._aplicar(venta, -1)
+
+    def _acumulados(self, periodo: str, inicios) -> list:
+        """Acumulados de esos periodos; los que faltan en caché se arman en una pasada."""
+        if periodo == "dia":
+            return [self._dias.get(i) or self._dia_vacio() for i in inicios]
+        faltan = {i for i in inicios if (periodo, i) not in self._cache}
+        if faltan:
+            nuevos = {i: self._dia_vacio() for i in faltan}
+            for dia, acumulado in self._dias.items():
+                total = nuevos.get(self._inicio(dia, periodo))
+                if total is None:
+                    continue
+                for campo in ("ingresos", "unidades", "ventas"):
+                    total[campo] += acumulado[campo]
+                for dimension in self.DIMENSIONES:
+                    for clave, (ingresos, unidades) in acumulado[dimension].items():
+                        par = total[dimension].setdefault(clave, [0.0, 0.0])
+                        par[0] += ingresos
+                        par[1] += unidades
+            self._cache.update({(periodo, i): t for i, t in nuevos.items()})
+        return [self._cache[(periodo, i)] for i in inicios]
+
+    def serie(self, periodo: str = "dia") -> pd.DataFrame:
+        """Ingresos, unidades y cantidad de ventas por periodo (dia, semana o mes)."""
+        if periodo not in self.PERIODOS:
+            raise ValueError(f"Periodo no soportado: {periodo}")
+        with self._candado:
+            inicios = sorted({self._inicio(d, periodo) for d in self._dias})
+            filas = [(i, t["ingresos"], t["unidades"], t["ventas"])
+                     for i, t in zip(inicios, self._acumulados(periodo, inicios))]
+        return pd.DataFrame(filas, columns=["periodo", "ingresos", "unidades", "ventas"]).round(
+            {"ingresos": 2, "unidades": 2})
+
+    def top(self, dimension: str = "producto", n: int = 10, periodo: str = None, inicio=None,
+            por: str = "ingresos") -> pd.DataFrame:
+        """Los n productos o clientes con más ingresos (o unidades), en un periodo o en total.
+
+        Columnas: nombre (producto o cliente), ingresos, unidades y el código
+        (producto_codigo o cliente_codigo), que es por lo que se agrupa.
+        """
+        if dimension not in self.DIMENSIONES:
+            raise ValueError(f"Dimensión no soportada: {dimension}")
+        if periodo is not None and periodo not in self.PERIODOS:
+            raise ValueError(f"Periodo no soportado: {periodo}")
+        with self._candado:
+            if periodo is None:
+                inicios = sorted({self._inicio(d, "mes") for d in self._dias})
+                partes = [t[dimension] for t in self._acumulados("mes", inicios)]
+            else:
+                inicio = self._inicio(pd.Timestamp(inicio).normalize(), periodo)
+                partes = [self._acumulados(periodo, [inicio])[0][dimension]]
+            filas = [(clave, ingresos, unidades) for parte in partes
+                     for clave, (ingresos, unidades) in parte.items()]
+            nombres = dict(self._nombres[dimension])
+        codigo = f"{dimension}_codigo"
+        df = pd.DataFrame(filas, columns=[codigo, "ingresos", "unidades"])
+        df = df.groupby(codigo, as_index=False)[["ingresos", "unidades"]].sum()
+        df = df.nlargest(n, por).reset_index(drop=True).round({"ingresos": 2, "unidades": 2})
+        df.insert(0, dimension, df[codigo].map(nombres))
+        return df[[dimension, "ingresos", "unidades", codigo]]
+
+
+# REPORTES EN ARCHIVO
+
+# Con menos grupos que esto no compensa levantar el pool.
+MINIMO_PARALELO = 20
+
+FORMATOS = ("txt", "csv", "tsv", "xlsx")
+COMPRESIONES = ("gzip", "zip")
+FILAS_POR_BLOQUE = 5000
+
+
+def nombre_archivo_reporte(valor, prefijo: str = "reporte_cliente", formato: str = "txt") -> str:
+    nombre = f"{prefijo}_{valor}.{formato}".replace(" ", "_")
+    return "".join("_" if c in '\\/:*?"<>|' else c for c in nombre)
+
+
+def ruta_comprimida(ruta, compresion=None) -> Path:
+    """Ruta final del archivo según la compresión (agrega .gz o .zip)."""
+    ruta = Path(ruta)
+    if compresion is None:
+        return ruta
+    if compresion not in COMPRESIONES:
+        raise ValueError(f"Compresión no soportada: {compresion}")
+    return ruta.with_name(ruta.name + (".gz" if compresion == "gzip" else ".zip"))
+
+
+@contextmanager
+def _destino(ruta: Path, compresion=None):
+    """Archivo binario de salida, comprimido al vuelo si se pide."""
+    final = ruta_comprimida(ruta, compresion)
+    if compresion == "gzip":
+        with gzip.open(final, "wb") as f:
+            yield f
+    elif compresion == "zip":
+        with zipfile.ZipFile(final, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            with zf.open(ruta.name, "w") as f:
+                yield f
+    else:
+        with open(final, "wb") as f:
+            yield f
+
+
+def _bloques(df: pd.DataFrame):
+    for inicio in range(0, len(df), FILAS_POR_BLOQUE):
+        yield df.iloc[inicio:inicio + FILAS_POR_BLOQUE]
+
+
+def _lineas_txt(bloque: pd.DataFrame) -> str:
+    texto = bloque.astype(str)
+    filas = texto.iloc[:, 0]
+    for col in texto.columns[1:]:
+        filas = filas + " | " + texto[col]
+    return "\n".join(filas.tolist())
+
+
+def _escribir_texto(df: pd.DataFrame, f, formato: str) -> None:
+    salida = io.TextIOWrapper(f, encoding="utf-8", newline="")
+    if formato == "txt":
+        # encabezado, guiones y una fila por línea, separados por " | "
+        encabezado = " | ".join(df.columns.astype(str))
+        salida.write(encabezado + "\n" + "-" * len(encabezado))
+        for bloque in _bloques(df):
+            salida.write("\n" + _lineas_txt(bloque))
+    else:
+        separador = "\t" if formato == "tsv" else ","
+        df.iloc[:0].to_csv(salida, sep=separador, index=False)
+        for bloque in _bloques(df):
+            bloque.to_csv(salida, sep=separador, index=False, header=False)
+    salida.flush()
+    salida.detach()
+
+
+def _escribir_xlsx(df: pd.DataFrame, f, directo: bool = True) -> None:
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet("Reporte")
+    hoja.append([str(c) for c in df.columns])
+    for bloque in _bloques(df):
+        valores = bloque.astype(object).where(bloque.notna(), None)
+        for fila in valores.itertuples(index=False, name=None):
+            hoja.append([v.item() if hasattr(v, "item") else v for v in fila])
+    if directo:
+        libro.save(f)
+        return
+    # el zip del .xlsx necesita volver atrás al cerrar; gzip/zip de salida no lo permiten
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as temporal:
+        libro.save(temporal)
+        temporal.seek(0)
+        shutil.copyfileobj(temporal, f)
+
+
+def escribir_reporte(df: pd.DataFrame, ruta, formato: str = None, compresion: str = None) -> Path:
+    """Escribe el reporte por bloques de FILAS_POR_BLOQUE filas, sin armarlo entero en memoria.
+
+    formato: txt, csv, tsv o xlsx (por defecto, la extensión de ruta).
+    compresion: None, "gzip" o "zip". Devuelve la ruta del archivo final.
+    """
+    ruta = Path(ruta)
+    formato = (formato or ruta.suffix.lstrip(".") or "txt").lower()
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {formato}")
+    with _destino(ruta, compresion) as f:
+        if formato == "xlsx":
+            _escribir_xlsx(df, f, directo=compresion is None)
+        else:
+            _escribir_texto(df, f, formato)
+    return ruta_comprimida(ruta, compresion)
+
+
+def escribir_txt(df: pd.DataFrame, ruta_archivo: Path) -> Path:
+    return escribir_reporte(df, ruta_archivo, "txt")
+
+
+def _escribir_bloque(tareas: list) -> list:
+    # nivel de módulo para poder enviarse a otro proceso
+    return [str(escribir_reporte(df, ruta, formato, compresion)) for ruta, df, formato, compresion in tareas]
+
+
+def generar_reportes_lote(df: pd.DataFrame, carpeta, columna: str = "Cliente",
+                          trabajadores: int = None, procesos: bool = False,
+                          formato: str = "txt", compresion: str = None) -> list:
+    """Genera un reporte por cada valor de la columna a partir de una sola lectura.
+
+    La hoja se divide con un único groupby y los archivos se escriben en
+    paralelo con hilos. procesos=True usa procesos en su lugar: solo desde
+    un script con guarda if __name__ == "__main__", porque cada proceso
+    vuelve a importar el programa principal (y abriría otra ventana Tk).
+    Devuelve el manifiesto (valor, archivo, ventas, total) y lo guarda
+    también en <carpeta>/manifiesto.json.
+    """
+    carpeta = Path(carpeta)
+    carpeta.mkdir(parents=True, exist_ok=True)
+    if columna not in df.columns:
+        raise ValueError(f"No hay columna '{columna}' en la hoja Ventas.")
+
+    prefijo = f"reporte_{columna.lower()}"
+    activas = ~df["anulada"].fillna(False).astype(bool) if "anulada" in df.columns else True
+    totales = pd.to_numeric(df["total"], errors="coerce").fillna(0.0).where(activas, 0.0) \
+        if "total" in df.columns else pd.Series(0.0, index=df.index)
+
+    tareas, manifiesto = [], []
+    for _, grupo in df.groupby(df[columna].map(_normalizar), sort=True):
+        nombre = str(grupo[columna].iloc[0])
+        ruta = carpeta / nombre_archivo_reporte(nombre, prefijo, formato)
+        tareas.append((ruta, grupo, formato, compresion))
+        manifiesto.append({columna.lower(): nombre, "archivo": str(ruta_comprimida(ruta, compresion)),
+                           "ventas": len(grupo), "total": float(totales[grupo.index].sum())})
+
+    trabajadores = trabajadores or os.cpu_count() or 1
+    bloques = [tareas[i::trabajadores] for i in range(trabajadores) if tareas[i::trabajadores]]
+    if len(bloques) > 1 and len(tareas) >= MINIMO_PARALELO:
+        Pool = ProcessPoolExecutor if procesos else ThreadPoolExecutor
+        with Pool(max_workers=len(bloques)) as pool:
+            list(pool.map(_escribir_bloque, bloques))
+    else:
+        _escribir_bloque(tareas)
+
+    with open(carpeta / "manifiesto.json", "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+    return manifiesto
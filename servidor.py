@@ -0,0 +1,452 @@
+"""Servidor HTTP/JSON local con las operaciones de inventario, clientes y ventas.
+
+Un solo proceso tiene los datos en memoria (el motor de nucleo_ventas) y las
+terminales le hablan por HTTP en lugar de abrir cada una Ventas.xlsx:
+
+    python servidor.py                       # 127.0.0.1:8765
+    VENTAS_SERVIDOR=http://127.0.0.1:8765 python main.py
+
+Rutas (cuerpos y respuestas en JSON):
+    GET    /productos                POST /productos        PUT/DELETE /productos/<codigo>
+    GET    /clientes                 POST /clientes         PUT/DELETE /clientes/<codigo>
+    GET    /ventas                   POST /ventas           PUT/DELETE /ventas/<id>
+    POST   /ventas/<id>/anular       POST /pedidos          (cliente_codigo + lista de lineas)
+    GET    /ventas/hoja              POST /ventas/lote      (lineas del lote; responde creadas y errores)
+    GET    /reportes/<columna>/<valor>                      GET /analisis/<periodo>/<n>
+    GET    /version/<hoja>           GET  /metricas         GET /salud
+
+Las tablas de /ventas/hoja, /ventas/lote, /reportes y /analisis van como
+{"columnas": [...], "filas": [...]} para que una tabla vacía conserve sus columnas.
+
+Cada cambio queda en el diario al responder; el libro se actualiza en segundo
+plano cada COMPACTAR_CADA segundos y al detener el servidor.
+"""
+import argparse
+import json
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pandas as pd
+
+import nucleo_ventas as nucleo
+import reportes
+
+HOST = os.getenv("VENTAS_SERVIDOR_HOST", "127.0.0.1")   # solo local salvo que se pida otra cosa
+PUERTO = int(os.getenv("VENTAS_SERVIDOR_PUERTO", "8765"))
+TRABAJADORES = 8
+COMPACTAR_CADA = 60.0        # segundos entre volcados del diario al libro
+MUESTRAS_LATENCIA = 1000     # últimas peticiones por ruta usadas para los percentiles
+
+# URL del servidor para la ventana de Tk; vacía = trabajar con el libro local.
+URL_SERVIDOR = os.getenv("VENTAS_SERVIDOR", "")
+
+
+def _a_json(valor):
+    if isinstance(valor, pd.DataFrame):
+        return valor.astype(object).where(valor.notna(), None).to_dict("records")
+    if isinstance(valor, dict):
+        return {k: _a_json(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [_a_json(v) for v in valor]
+    if hasattr(valor, "item"):       # escalares de numpy
+        return valor.item()
+    if isinstance(valor, float) and valor != valor:
+        return None
+    return valor
+
+
+def _tabla(df: pd.DataFrame) -> dict:
+    return {"columnas": [str(c) for c in df.columns], "filas": df}
+
+
+def _importar_lote(cuerpo: dict) -> dict:
+    creadas, errores = nucleo.importar_ventas_lote(pd.DataFrame(cuerpo.get("lineas") or [],
+                                                                columns=cuerpo.get("columnas")))
+    return {"creadas": _tabla(creadas), "errores": _tabla(errores)}
+
+
+def _analisis(periodo: str, n: int) -> dict:
+    serie, productos, clientes, version = nucleo.analisis(periodo, n)
+    return {"serie": _tabla(serie), "productos": _tabla(productos), "clientes": _tabla(clientes),
+            "version": version}
+
+
+def _estado_http(error: Exception) -> int:
+    if isinstance(error, nucleo.NoEncontrado):
+        return 404
+    if isinstance(error, (nucleo.Duplicado, nucleo.EstadoInvalido, nucleo.StockInsuficiente)):
+        return 409
+    if isinstance(error, nucleo.DatosInvalidos):
+        return 400
+    if isinstance(error, nucleo.ErrorAlmacenamiento):
+        return 503
+    return 500
+
+
+class Metricas:
+    """Peticiones, errores y percentiles de latencia por ruta."""
+
+    def __init__(self, muestras: int = MUESTRAS_LATENCIA):
+        self._candado = threading.Lock()
+        self._muestras = muestras
+        self._rutas = {}
+        self.inicio = time.time()
+
+    def registrar(self, ruta: str, ms: float, error: bool) -> None:
+        with self._candado:
+            r = self._rutas.get(ruta)
+            if r is None:
+                r = self._rutas[ruta] = {"peticiones": 0, "errores": 0, "latencias": deque(maxlen=self._muestras)}
+            r["peticiones"] += 1
+            r["errores"] += int(error)
+            r["latencias"].append(ms)
+
+    def resumen(self) -> dict:
+        with self._candado:
+            rutas = {k: (v["peticiones"], v["errores"], sorted(v["latencias"])) for k, v in self._rutas.items()}
+        salida = {}
+        for ruta, (peticiones, errores, lat) in rutas.items():
+            def p(q):
+                return round(lat[min(len(lat) - 1, int(q * len(lat)))], 3)
+            salida[ruta] = {"peticiones": peticiones, "errores": errores,
+                            "p50_ms": p(0.50), "p95_ms": p(0.95), "p99_ms": p(0.99), "max_ms": round(lat[-1], 3)}
+        return {"segundos_activo": round(time.time() - self.inicio, 1), "rutas": salida}
+
+
+# (método, patrón, función(coincidencias, cuerpo), escribe)
+RUTAS = [
+    ("GET", r"/productos", lambda m, c: nucleo.leer_inventario(), False),
+    ("POST", r"/productos", lambda m, c: nucleo.crear_producto(**c), True),
+    ("PUT", r"/productos/(?P<codigo>[^/]+)", lambda m, c: nucleo.actualizar_producto(m["codigo"], **c), True),
+    ("DELETE", r"/productos/(?P<codigo>[^/]+)", lambda m, c: nucleo.eliminar_producto(m["codigo"]), True),
+    ("GET", r"/clientes", lambda m, c: nucleo.leer_clientes(), False),
+    ("POST", r"/clientes", lambda m, c: nucleo.crear_cliente(**c), True),
+    ("PUT", r"/clientes/(?P<codigo>[^/]+)", lambda m, c: nucleo.actualizar_cliente(m["codigo"], **c), True),
+    ("DELETE", r"/clientes/(?P<codigo>[^/]+)", lambda m, c: nucleo.eliminar_cliente(m["codigo"]), True),
+    ("GET", r"/ventas", lambda m, c: nucleo.vista_ventas(), False),
+    ("POST", r"/ventas", lambda m, c: nucleo.crear_venta(**c), True),
+    ("GET", r"/ventas/hoja", lambda m, c: _tabla(nucleo.leer_ventas()), False),
+    ("POST", r"/ventas/lote", lambda m, c: _importar_lote(c), True),
+    ("POST", r"/pedidos", lambda m, c: nucleo.crear_pedido(**c), True),
+    ("PUT", r"/ventas/(?P<id>\d+)", lambda m, c: nucleo.actualizar_venta(int(m["id"]), **c), True),
+    ("POST", r"/ventas/(?P<id>\d+)/anular", lambda m, c: nucleo.anular_venta(int(m["id"])), True),
+    ("DELETE", r"/ventas/(?P<id>\d+)", lambda m, c: nucleo.eliminar_venta(int(m["id"])), True),
+    ("GET", r"/reportes/(?P<columna>[^/]+)/(?P<valor>[^/]+)",
+     lambda m, c: _tabla(nucleo.generar_reporte(m["columna"], m["valor"])), False),
+    ("GET", r"/analisis/(?P<periodo>[^/]+)/(?P<n>\d+)", lambda m, c: _analisis(m["periodo"], int(m["n"])), False),
+    ("GET", r"/version/(?P<hoja>[^/]+)", lambda m, c: {"version": nucleo.version(m["hoja"])}, False),
+]
+_RUTAS = [(metodo, re.compile(patron + r"/?"), re.sub(r"\(\?P<(\w+)>[^)]*\)", r"<\1>", patron), funcion, escribe)
+          for metodo, patron, funcion, escribe in RUTAS]
+
+
+class Manejador(BaseHTTPRequestHandler):
+    server_version = "VentasHTTP/1.0"
+
+    def do_GET(self):
+        self._atender("GET")
+
+    def do_POST(self):
+        self._atender("POST")
+
+    def do_PUT(self):
+        self._atender("PUT")
+
+    def do_DELETE(self):
+        self._atender("DELETE")
+
+    def _responder(self, estado: int, datos) -> None:
+        # default=str: fechas de libros viejos (Timestamp) como "AAAA-MM-DD hh:mm:ss"
+        cuerpo = json.dumps(_a_json(datos), ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(estado)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def _atender(self, metodo: str) -> None:
+        t0 = time.perf_counter()
+        ruta = urllib.parse.urlsplit(self.path).path
+        nombre_ruta, estado = f"{metodo} ?", 500
+        try:
+            if metodo == "GET" and ruta.rstrip("/") == "/metricas":
+                nombre_ruta, estado = "GET /metricas", 200
+                self._responder(estado, self.server.metricas.resumen())
+                return
+            if metodo == "GET" and ruta.rstrip("/") == "/salud":
+                nombre_ruta, estado = "GET /salud", 200
+                self._responder(estado, {"ok": True, "motor": nucleo.MOTOR_DATOS})
+                return
+            for m, patron, nombre, funcion, escribe in _RUTAS:
+                coincide = patron.fullmatch(ruta) if m == metodo else None
+                if coincide:
+                    nombre_ruta = f"{metodo} {nombre}"
+                    break
+            else:
+                estado = 404
+                self._responder(estado, {"error": f"Ruta no encontrada: {metodo} {ruta}"})
+                return
+            largo = int(self.headers.get("Content-Length") or 0)
+            cuerpo = json.loads(self.rfile.read(largo) or b"{}") if largo else {}
+            if not isinstance(cuerpo, dict):
+                raise nucleo.DatosInvalidos("El cuerpo debe ser un objeto JSON.")
+            parametros = {k: urllib.parse.unquote(v) for k, v in coincide.groupdict().items()}
+            if escribe:
+                # un cambio a la vez: los índices de reportes no admiten escrituras paralelas
+                with self.server.escritura:
+                    resultado = funcion(parametros, cuerpo)
+            else:
+                resultado = funcion(parametros, cuerpo)
+            estado = 201 if metodo == "POST" and not ruta.endswith("/anular") else 200
+            self._responder(estado, resultado if resultado is not None else {"ok": True})
+        except (ValueError, TypeError) as e:
+            # JSON mal formado o campos que la operación no acepta
+            estado = _estado_http(e) if isinstance(e, nucleo.ErrorVentas) else 400
+            self._responder(estado, {"error": str(e)})
+        except Exception as e:
+            estado = _estado_http(e)
+            self._responder(estado, {"error": str(e) if isinstance(e, nucleo.ErrorVentas)
+                                     else f"Error inesperado: {e}"})
+        finally:
+            self.server.metricas.registrar(nombre_ruta, (time.perf_counter() - t0) * 1000, estado >= 400)
+
+    def log_message(self, formato, *args):
+        pass  # las métricas ya registran cada petición
+
+
+class ServidorVentas(HTTPServer):
+    """HTTPServer que atiende las conexiones con un grupo fijo de hilos.
+
+    Las lecturas corren en paralelo; los cambios se hacen de a uno. Un hilo
+    aparte vuelca el diario al libro cada compactar_cada segundos.
+    """
+
+    def __init__(self, direccion=(HOST, PUERTO), trabajadores: int = TRABAJADORES,
+                 compactar_cada: float = COMPACTAR_CADA):
+        super().__init__(direccion, Manejador)
+        self.metricas = Metricas()
+        self.escritura = threading.Lock()
+        self.compactar_cada = compactar_cada
+        self._grupo = ThreadPoolExecutor(trabajadores, thread_name_prefix="ServidorVentas")
+        self._detener = threading.Event()
+        self._volcador = threading.Thread(target=self._volcar, name="VolcadoLibro", daemon=True)
+
+    def preparar(self) -> None:
+        """Carga los datos en memoria antes de aceptar peticiones."""
+        nucleo.inicializar_excel()
+        nucleo.preparar_datos()
+        nucleo.leer_inventario()
+        nucleo.leer_clientes()
+        nucleo.vista_ventas()
+        self._volcador.start()
+
+    def process_request(self, request, client_address):
+        self._grupo.submit(self._atender, request, client_address)
+
+    def _atender(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def _volcar(self):
+        # sin self.escritura: el motor escribe el libro sin frenar a los cambios que siguen entrando
+        while not self._detener.wait(self.compactar_cada):
+            nucleo.compactar_diario()
+
+    def server_close(self):
+        super().server_close()
+        self._detener.set()
+        self._grupo.shutdown(wait=True)
+        with self.escritura:
+            nucleo.compactar_diario()
+
+
+def iniciar(host: str = HOST, puerto: int = PUERTO, trabajadores: int = TRABAJADORES,
+            compactar_cada: float = COMPACTAR_CADA) -> ServidorVentas:
+    """Crea el servidor, carga los datos y lo deja atendiendo en un hilo. Devuelve el servidor."""
+    servidor = ServidorVentas((host, puerto), trabajadores, compactar_cada)
+    servidor.preparar()
+    threading.Thread(target=servidor.serve_forever, name="ServidorVentasHTTP", daemon=True).start()
+    return servidor
+
+
+def detener(servidor: ServidorVentas) -> None:
+    servidor.shutdown()
+    servidor.server_close()
+
+
+# CLIENTE
+
+_ERRORES_HTTP = {400: nucleo.DatosInvalidos, 404: nucleo.NoEncontrado, 409: nucleo.DatosInvalidos,
+                 503: nucleo.ErrorAlmacenamiento}
+
+
+def _segmento(valor) -> str:
+    return urllib.parse.quote(str(valor), safe="")
+
+
+def _desde_tabla(datos: dict) -> pd.DataFrame:
+    return pd.DataFrame(datos["filas"], columns=datos["columnas"])
+
+
+class ClienteRemoto:
+    """Mismas funciones que nucleo_ventas, pero los datos se leen y cambian en el servidor.
+
+    De nucleo_ventas solo se toman las excepciones y la bandeja de correo,
+    que es de cada terminal (LOCALES); pedir cualquier otra cosa que no esté
+    aquí es un AttributeError, nunca una lectura o escritura del libro local.
+    """
+
+    LOCALES = {"bandeja", "detener_bandeja", "enviar_mail"}
+
+    def __init__(self, url: str, espera: float = 10.0):
+        self.url = url.rstrip("/")
+        self.espera = espera
+
+    def __getattr__(self, nombre):
+        valor = getattr(nucleo, nombre, None)
+        if nombre in self.LOCALES or isinstance(valor, type) and issubclass(valor, Exception):
+            return valor
+        raise AttributeError(f"nucleo_ventas.{nombre} no está disponible contra el servidor {self.url}")
+
+    def _pedir(self, metodo: str, ruta: str, datos: dict = None):
+        cuerpo = json.dumps(datos).encode("utf-8") if datos is not None else None
+        pedido = urllib.request.Request(self.url + ruta, data=cuerpo, method=metodo,
+                                        headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(pedido, timeout=self.espera) as r:
+                return json.loads(r.read() or b"null")
+        except urllib.error.HTTPError as e:
+            try:
+                mensaje = json.loads(e.read()).get("error", str(e))
+            except ValueError:
+                mensaje = str(e)
+            raise _ERRORES_HTTP.get(e.code, nucleo.ErrorVentas)(mensaje) from None
+        except (urllib.error.URLError, OSError) as e:
+            raise nucleo.ErrorAlmacenamiento(f"No se pudo conectar con el servidor {self.url}: {e}") from None
+
+    # el libro vive en el servidor: nada que preparar ni compactar aquí
+    def inicializar_excel(self):
+        pass
+
+    def preparar_datos(self):
+        pass
+
+    def compactar_diario(self):
+        pass
+
+    def version(self, hoja: str):
+        return tuple(self._pedir("GET", f"/version/{_segmento(hoja)}")["version"] or ()) or None
+
+    def leer_inventario(self) -> pd.DataFrame:
+        return pd.DataFrame(self._pedir("GET", "/productos"))
+
+    def leer_clientes(self) -> pd.DataFrame:
+        return pd.DataFrame(self._pedir("GET", "/clientes"))
+
+    def vista_ventas(self) -> pd.DataFrame:
+        return pd.DataFrame(self._pedir("GET", "/ventas"), columns=["id", "pedido", "fecha", "producto", "cliente",
+                                                                     "cantidad", "precio_unit", "total", "anulada"])
+
+    def crear_producto(self, codigo, nombre, existencia, proveedor, precio) -> dict:
+        return self._pedir("POST", "/productos", {"codigo": codigo, "nombre": nombre, "existencia": existencia,
+                                                  "proveedor": proveedor, "precio": precio})
+
+    def actualizar_producto(self, codigo_sel, nombre, existencia, proveedor, precio) -> dict:
+        return self._pedir("PUT", f"/productos/{_segmento(codigo_sel)}",
+                           {"nombre": nombre, "existencia": existencia, "proveedor": proveedor, "precio": precio})
+
+    def eliminar_producto(self, codigo_sel) -> None:
+        self._pedir("DELETE", f"/productos/{_segmento(codigo_sel)}")
+
+    def crear_cliente(self, codigo, nombre, direccion) -> dict:
+        return self._pedir("POST", "/clientes", {"codigo": codigo, "nombre": nombre, "direccion": direccion})
+
+    def actualizar_cliente(self, codigo_sel, nombre, direccion) -> dict:
+        return self._pedir("PUT", f"/clientes/{_segmento(codigo_sel)}",
+                           {"nombre": nombre, "direccion": direccion})
+
+    def eliminar_cliente(self, codigo_sel) -> None:
+        self._pedir("DELETE", f"/clientes/{_segmento(codigo_sel)}")
+
+    def crear_venta(self, producto_codigo, cliente_codigo, cantidad, precio_unit) -> dict:
+        return self._pedir("POST", "/ventas", {"producto_codigo": producto_codigo, "cliente_codigo": cliente_codigo,
+                                               "cantidad": cantidad, "precio_unit": precio_unit})
+
+    def crear_pedido(self, cliente_codigo, lineas) -> dict:
+        lineas = [linea if isinstance(linea, dict) else dict(zip(("producto_codigo", "cantidad", "precio_unit"), linea))
+                  for linea in lineas]
+        return self._pedir("POST", "/pedidos", {"cliente_codigo": cliente_codigo, "lineas": lineas})
+
+    def actualizar_venta(self, id_venta: int, cantidad=None, precio_unit=None) -> dict:
+        return self._pedir("PUT", f"/ventas/{int(id_venta)}", {"cantidad": cantidad, "precio_unit": precio_unit})
+
+    def anular_venta(self, id_venta: int) -> dict:
+        return self._pedir("POST", f"/ventas/{int(id_venta)}/anular")
+
+    def eliminar_venta(self, id_venta: int) -> dict:
+        return self._pedir("DELETE", f"/ventas/{int(id_venta)}")
+
+    def importar_ventas_lote(self, origen):
+        """El CSV se lee aquí; la validación y la escritura las hace el servidor."""
+        lote = nucleo.leer_lote(origen)
+        lote = lote.astype(object).where(lote.notna(), None)
+        respuesta = self._pedir("POST", "/ventas/lote", {"columnas": [str(c) for c in lote.columns],
+                                                          "lineas": lote.values.tolist()})
+        return _desde_tabla(respuesta["creadas"]), _desde_tabla(respuesta["errores"])
+
+    # reportes: los datos vienen del servidor, los archivos se escriben en esta terminal
+
+    def leer_ventas(self) -> pd.DataFrame:
+        return _desde_tabla(self._pedir("GET", "/ventas/hoja"))
+
+    def generar_reporte(self, columna, valor) -> pd.DataFrame:
+        return _desde_tabla(self._pedir("GET", f"/reportes/{_segmento(columna)}/{_segmento(valor)}"))
+
+    def enviar_reporte_cliente(self, cliente: str, destinatario: str, formato: str = "txt", compresion: str = None):
+        return nucleo.enviar_reporte(self.generar_reporte("cliente", cliente), cliente, destinatario,
+                                     formato, compresion)
+
+    def generar_reportes_clientes(self, carpeta, formato: str = "txt", compresion: str = None) -> list:
+        return reportes.generar_reportes_lote(self.leer_ventas(), carpeta, columna="Cliente",
+                                              formato=formato, compresion=compresion)
+
+    def analisis(self, periodo: str, n: int):
+        datos = self._pedir("GET", f"/analisis/{_segmento(periodo)}/{int(n)}")
+        version = datos["version"]
+        return (_desde_tabla(datos["serie"]), _desde_tabla(datos["productos"]), _desde_tabla(datos["clientes"]),
+                tuple(version) if isinstance(version, list) else version)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--puerto", type=int, default=PUERTO)
+    parser.add_argument("--trabajadores", type=int, default=TRABAJADORES)
+    parser.add_argument("--compactar-cada", type=float, default=COMPACTAR_CADA)
+    args = parser.parse_args(argv)
+
+    servidor = ServidorVentas((args.host, args.puerto), args.trabajadores, args.compactar_cada)
+    servidor.preparar()
+    print(f"Servidor de ventas en http://{args.host}:{args.puerto} (Ctrl+C para salir)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
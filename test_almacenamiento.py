@@ -0,0 +1,215 @@
+"""MotorExcel: diario, compactación, conciliación entre instancias y secuencias de claves."""
+import json
+import threading
+
+import pandas as pd
+import pytest
+
+import almacenamiento
+
+TABLAS = {
+    "Productos": {"tabla": "productos", "clave": "codigo", "dtype": {"codigo": str},
+                  "columnas": {"codigo": "TEXT", "nombre": "TEXT", "existencia": "INTEGER"},
+                  "indices": ["nombre"]},
+    "Ventas": {"tabla": "ventas", "clave": "id",
+               "columnas": {"id": "INTEGER", "producto": "TEXT", "cantidad": "REAL"},
+               "indices": ["producto"]},
+}
+
+
+@pytest.fixture
+def ruta(tmp_path):
+    ruta = tmp_path / "datos.xlsx"
+    almacenamiento.guardar_hojas(ruta, {
+        "Productos": pd.DataFrame({"codigo": ["A", "B", "C"], "nombre": ["Uno", "Dos", "Tres"],
+                                   "existencia": [10, 20, 30]}),
+        "Ventas": pd.DataFrame({"id": [1, 2], "producto": ["A", "B"], "cantidad": [1.0, 2.0]}),
+    })
+    yield ruta
+    almacenamiento.invalidar_cache(ruta)
+
+
+def _motor(ruta, umbral=almacenamiento.UMBRAL_COMPACTACION):
+    return almacenamiento.MotorExcel(ruta, TABLAS, umbral_compactacion=umbral)
+
+
+def _lineas_diario(motor) -> list:
+    if not motor.ruta_diario.exists():
+        return []
+    return [json.loads(linea) for linea in motor.ruta_diario.read_text(encoding="utf-8").splitlines()]
+
+
+def _existencias(motor) -> dict:
+    df = motor.leer("Productos")
+    return dict(zip(df["codigo"], df["existencia"]))
+
+
+def test_leer_columnas_lee_solo_esas_y_usa_la_hoja_en_cache(ruta):
+    parcial = almacenamiento.leer_columnas(ruta, "Productos", ["codigo", "existencia"], dtype={"codigo": str})
+    assert parcial.columns.tolist() == ["codigo", "existencia"]
+    assert dict(zip(parcial["codigo"], parcial["existencia"])) == {"A": 10, "B": 20, "C": 30}
+    completa = almacenamiento.leer_hoja(ruta, "Productos", dtype={"codigo": str})
+    pd.testing.assert_frame_equal(almacenamiento.leer_columnas(ruta, "Productos", ["nombre"], dtype={"codigo": str}),
+                                  completa[["nombre"]])
+
+
+def test_los_cambios_van_al_diario_sin_reescribir_el_libro(ruta):
+    motor = _motor(ruta)
+    firma = almacenamiento._firma(ruta)
+    with motor.transaccion():
+        motor.actualizar("Productos", "A", {"existencia": 9})
+        motor.insertar("Ventas", {"id": 3, "producto": "A", "cantidad": 1.0})
+    assert almacenamiento._firma(ruta) == firma
+    lineas = _lineas_diario(motor)
+    assert len(lineas) == 1 and [op["op"] for op in lineas[0]["ops"]] == ["actualizar", "crear"]
+    # otra instancia ve los cambios aplicando el diario sobre el libro
+    otra = _motor(ruta)
+    assert _existencias(otra)["A"] == 9
+    assert otra.buscar("Ventas", 3)["producto"] == "A"
+
+
+def test_compactar_vuelca_el_diario_y_lo_vacia(ruta):
+    motor = _motor(ruta)
+    motor.actualizar("Productos", "B", {"existencia": 19})
+    motor.eliminar("Productos", "C")
+    motor.compactar()
+    assert _lineas_diario(motor) == []
+    meta = almacenamiento.leer_meta(ruta)
+    assert int(meta["diario_secuencia"]) == 2
+    almacenamiento.invalidar_cache(ruta)
+    libro = almacenamiento.leer_hoja(ruta, "Productos", dtype={"codigo": str})
+    assert dict(zip(libro["codigo"], libro["existencia"])) == {"A": 10, "B": 19}
+
+
+def test_diario_ya_compactado_no_se_aplica_dos_veces(ruta):
+    motor = _motor(ruta)
+    motor.insertar("Ventas", {"id": 3, "producto": "C", "cantidad": 1.0})
+    copia = motor.ruta_diario.read_text(encoding="utf-8")
+    motor.compactar()
+    # un corte entre escribir el libro y vaciar el diario deja las líneas ya aplicadas
+    motor.ruta_diario.write_text(copia + '{"seq": 2, "ops": [', encoding="utf-8")
+    otra = _motor(ruta)
+    assert otra.leer("Ventas")["id"].tolist() == [1, 2, 3]
+
+
+def _compactar_frenado(motor, monkeypatch):
+    """Empieza a compactar en otro hilo y lo deja parado mientras escribe el libro."""
+    escribiendo, seguir = threading.Event(), threading.Event()
+    original = almacenamiento._escribir_temporal
+
+    def lento(*args):
+        if not escribiendo.is_set():  # solo la escritura de la compactación; las demás pasan
+            escribiendo.set()
+            assert seguir.wait(10)
+        return original(*args)
+    monkeypatch.setattr(almacenamiento, "_escribir_temporal", lento)
+    hilo = threading.Thread(target=motor.compactar)
+    hilo.start()
+    assert escribiendo.wait(10)
+
+    def terminar():
+        seguir.set()
+        hilo.join()
+    return terminar
+
+
+def test_compactar_no_frena_a_los_que_escriben(ruta, monkeypatch):
+    motor = _motor(ruta)
+    motor.actualizar("Productos", "A", {"existencia": 1})
+    terminar = _compactar_frenado(motor, monkeypatch)
+    # mientras se escribe el libro entran cambios propios y de otra instancia
+    motor.actualizar("Productos", "B", {"existencia": 2})
+    _motor(ruta).actualizar("Productos", "C", {"existencia": 3})
+    terminar()
+    assert int(almacenamiento.leer_meta(ruta)["diario_secuencia"]) == 1
+    assert [linea["seq"] for linea in _lineas_diario(motor)] == [2, 3]
+    assert _existencias(motor) == _existencias(_motor(ruta)) == {"A": 1, "B": 2, "C": 3}
+    assert not list(ruta.parent.glob("*.tmp"))
+
+
+def test_compactar_descarta_si_otro_reescribio_el_libro(ruta, monkeypatch):
+    motor = _motor(ruta)
+    motor.actualizar("Productos", "A", {"existencia": 1})
+    terminar = _compactar_frenado(motor, monkeypatch)
+    _motor(ruta).escribir("Ventas", pd.DataFrame({"id": [9], "producto": ["C"], "cantidad": [1.0]}))
+    terminar()
+    otra = _motor(ruta)
+    assert otra.leer("Ventas")["id"].tolist() == [9]
+    assert _existencias(otra)["A"] == 1
+    assert not list(ruta.parent.glob("*.tmp"))
+
+
+def test_el_umbral_compacta_en_segundo_plano(ruta, monkeypatch):
+    motor = _motor(ruta, umbral=2)
+    llamadas = []
+    monkeypatch.setattr(motor, "compactar_en_segundo_plano", lambda: llamadas.append(len(motor._diario)))
+    motor.actualizar("Productos", "A", {"existencia": 1})
+    assert llamadas == []
+    motor.actualizar("Productos", "B", {"existencia": 2})
+    assert llamadas == [2]
+
+
+def test_transaccion_deshecha_no_deja_rastro(ruta):
+    motor = _motor(ruta)
+    with pytest.raises(RuntimeError):
+        with motor.transaccion():
+            motor.actualizar("Productos", "A", {"existencia": 0})
+            raise RuntimeError("corte")
+    assert _lineas_diario(motor) == []
+    assert _existencias(motor)["A"] == 10
+
+
+def test_rebase_con_cambios_ajenos_en_otras_filas(ruta):
+    una, otra = _motor(ruta), _motor(ruta)
+    with otra.transaccion():
+        otra.actualizar("Productos", "B", {"existencia": 2})
+        otra.insertar("Ventas", {"id": 3, "producto": "B", "cantidad": 18.0})
+        una.actualizar("Productos", "A", {"existencia": 1})   # confirma antes que otra
+    assert _existencias(otra) == {"A": 1, "B": 2, "C": 30}
+    assert [linea["seq"] for linea in _lineas_diario(una)] == [1, 2]
+    assert _existencias(una) == _existencias(otra)
+    # los índices se rearman después de conciliar
+    assert otra.buscar_todos("Ventas", "B", "producto")["id"].tolist() == [2, 3]
+
+
+def test_rebase_con_las_mismas_filas_es_conflicto(ruta):
+    una, otra = _motor(ruta), _motor(ruta)
+    with pytest.raises(almacenamiento.Conflicto):
+        with otra.transaccion():
+            otra.actualizar("Productos", "A", {"existencia": 2})
+            una.actualizar("Productos", "A", {"existencia": 1})
+    assert len(_lineas_diario(una)) == 1 and _existencias(otra)["A"] == 1
+    # tras el conflicto la otra instancia relee y puede reintentar
+    otra.actualizar("Productos", "A", {"existencia": 2})
+    assert _existencias(una)["A"] == 2
+
+
+def test_rebase_tras_reescribir_el_libro_es_conflicto(ruta):
+    una, otra = _motor(ruta), _motor(ruta)
+    with pytest.raises(almacenamiento.Conflicto):
+        with otra.transaccion():
+            otra.actualizar("Ventas", 1, {"cantidad": 5.0})
+            una.escribir("Productos", pd.DataFrame({"codigo": ["Z"], "nombre": ["Otro"], "existencia": [1]}))
+    assert list(_existencias(otra)) == ["Z"]
+
+
+def test_reservar_claves_no_repite_tras_borrar_deshacer_ni_compactar(ruta):
+    motor = _motor(ruta)
+    assert motor.reservar_claves("Ventas", 2) == 3       # parte de la clave más alta
+    with pytest.raises(RuntimeError):
+        with motor.transaccion():
+            assert motor.reservar_claves("Ventas") == 5
+            raise RuntimeError("corte")
+    assert motor.reservar_claves("Ventas") == 5          # la reserva deshecha no cuenta
+    motor.eliminar("Ventas", 2)
+    motor.compactar()
+    assert motor.secuencias() == {"Ventas": 5}
+    assert int(almacenamiento.leer_meta(ruta)["secuencia_Ventas"]) == 5
+    assert _motor(ruta).reservar_claves("Ventas") == 6
+
+
+def test_reservas_de_dos_instancias_no_se_pisan(ruta):
+    una, otra = _motor(ruta), _motor(ruta)
+    assert una.reservar_claves("Ventas") == 3
+    assert otra.reservar_claves("Ventas", 3) == 4
+    assert una.reservar_claves("Ventas") == 7
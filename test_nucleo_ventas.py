@@ -0,0 +1,122 @@
+"""Números de venta, existencias y versiones de nucleo_ventas, con cada motor de datos."""
+import threading
+
+import pandas as pd
+import pytest
+
+
+def _ids(nucleo) -> list:
+    return nucleo.leer_ventas()["id"].astype(int).tolist()
+
+
+def test_pedido_numera_lineas_seguidas(nucleo):
+    uno = nucleo.crear_venta("P1", "C1", 1, 2.5)
+    pedido = nucleo.crear_pedido("C2", [("P1", 1, 2.5), {"producto_codigo": "P2", "cantidad": 2, "precio_unit": 4}])
+    assert uno["id"] == uno["pedido"] == 1
+    assert [l["id"] for l in pedido["lineas"]] == [2, 3] and pedido["pedido"] == 2
+    assert pedido["total"] == 10.5
+    assert _ids(nucleo) == [1, 2, 3]
+
+
+def test_id_no_se_reutiliza_tras_eliminar(nucleo):
+    nucleo.crear_venta("P1", "C1", 1, 2.5)
+    ultima = nucleo.crear_venta("P1", "C1", 1, 2.5)
+    nucleo.eliminar_venta(ultima["id"])
+    assert nucleo.crear_venta("P1", "C1", 1, 2.5)["id"] == ultima["id"] + 1
+
+
+def test_pedido_rechazado_no_consume_ids_ni_stock(nucleo):
+    nucleo.crear_venta("P1", "C1", 1, 2.5)
+    with pytest.raises(nucleo.StockInsuficiente):
+        nucleo.crear_pedido("C1", [("P1", 1, 2.5), ("P2", 50, 4)])
+    with pytest.raises(nucleo.NoEncontrado):
+        nucleo.crear_pedido("NO", [("P1", 1, 2.5)])
+    assert nucleo.crear_venta("P1", "C1", 1, 2.5)["id"] == 2
+    inventario = nucleo.leer_inventario().set_index("codigo")["existencia"]
+    assert inventario["P1"] == 8 and inventario["P2"] == 5
+
+
+def test_transaccion_deshecha_devuelve_los_ids(nucleo):
+    nucleo.crear_venta("P1", "C1", 1, 2.5)
+    with pytest.raises(RuntimeError):
+        with nucleo._transaccion():
+            assert nucleo._siguiente_id(3) == 2
+            raise RuntimeError("corte")
+    assert nucleo._siguiente_id() == 2
+
+
+def test_secuencia_sobrevive_a_compactar_y_reabrir(nucleo):
+    for _ in range(3):
+        nucleo.crear_venta("P1", "C1", 1, 2.5)
+    nucleo.eliminar_venta(3)
+    nucleo.compactar_diario()
+    # otro proceso abre los mismos datos sin los motores de este
+    nucleo.almacenamiento._motores.clear()
+    nucleo.almacenamiento.invalidar_cache()
+    assert nucleo.crear_venta("P2", "C2", 1, 4)["id"] == 4
+    assert _ids(nucleo) == [1, 2, 4]
+
+
+def test_lote_descuenta_del_libro_de_existencias(nucleo):
+    lote = pd.DataFrame({"producto": ["P1", "P1", "P2", "NO"], "cliente": ["C1", "C2", "C1", "C1"],
+                         "cantidad": [4, 4, 6, 1], "precio_unit": [2.5, 2.5, 4, 1]})
+    creadas, errores = nucleo.importar_ventas_lote(lote)
+    assert creadas["id"].tolist() == [1, 2]
+    assert len(errores) == 2
+    assert nucleo._existencias().disponible("P1") == 2
+    assert nucleo.leer_inventario().set_index("codigo")["existencia"]["P1"] == 2
+    assert not nucleo.validar_existencia("P1", 3)
+
+
+def test_lote_rechazado_por_stock_no_consume_existencia(nucleo):
+    # P1 tiene 10: entran 8 y 2, el 5 no alcanza pero no le quita lugar al 2
+    lote = pd.DataFrame({"producto": ["P1", "P1", "P2", "P1"], "cliente": ["C1", "C1", "C2", "C2"],
+                         "cantidad": [8, 5, 5, 2], "precio_unit": [2.5, 2.5, 4, 2.5]})
+    creadas, errores = nucleo.importar_ventas_lote(lote)
+    assert creadas["producto_codigo"].tolist() == ["P1", "P2", "P1"]
+    assert creadas["cantidad"].tolist() == [8, 5, 2]
+    assert errores["linea"].tolist() == [2]
+    assert errores["error"].tolist() == ["No hay existencia suficiente."]
+    assert nucleo.leer_inventario().set_index("codigo")["existencia"].to_dict() == {"P1": 0, "P2": 0}
+
+
+def _en_otro_hilo(funcion):
+    """Corre funcion en un hilo nuevo (con su propia conexión) y devuelve o relanza lo que dé."""
+    resultado = {}
+
+    def correr():
+        try:
+            resultado["valor"] = funcion()
+        except Exception as e:
+            resultado["error"] = e
+    hilo = threading.Thread(target=correr)
+    hilo.start()
+    hilo.join()
+    if "error" in resultado:
+        raise resultado["error"]
+    return resultado["valor"]
+
+
+def _otra_instancia(nucleo):
+    """Un motor propio sobre los mismos datos, como el de otro proceso."""
+    motor = nucleo._motor()
+    return type(motor)(motor.ruta, nucleo.TABLAS)
+
+
+def test_existencias_ven_los_cambios_de_otra_instancia_desde_cualquier_hilo(nucleo):
+    assert nucleo.validar_existencia("P1", 5)
+    _otra_instancia(nucleo).actualizar(nucleo.HOJA_INVENTARIO, "P1", {"existencia": 0})
+    assert not _en_otro_hilo(lambda: nucleo.validar_existencia("P1", 5))
+    assert not nucleo.validar_existencia("P1", 5)
+    with pytest.raises(nucleo.StockInsuficiente):
+        _en_otro_hilo(lambda: nucleo.crear_venta("P1", "C1", 1, 2.5))
+
+
+def test_la_version_es_la_misma_en_todos_los_hilos(nucleo):
+    nucleo.crear_venta("P1", "C1", 1, 2.5)
+    antes = nucleo.version(nucleo.HOJA_INVENTARIO)
+    assert _en_otro_hilo(lambda: nucleo.version(nucleo.HOJA_INVENTARIO)) == antes
+    _en_otro_hilo(lambda: nucleo.crear_venta("P1", "C1", 1, 2.5))
+    despues = nucleo.version(nucleo.HOJA_INVENTARIO)
+    assert despues != antes
+    assert _en_otro_hilo(lambda: nucleo.version(nucleo.HOJA_INVENTARIO)) == despues
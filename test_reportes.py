@@ -0,0 +1,76 @@
+"""Reportes en archivo e índices en memoria de reportes.py."""
+import json
+from pathlib import Path
+
+import pandas as pd
+
+import reportes
+
+
+def _ventas(n_clientes: int) -> pd.DataFrame:
+    filas = [{"id": i + 1, "pedido": i + 1, "fecha": f"2024-01-{i % 28 + 1:02d} 10:00:00",
+              "producto": "Producto 1", "cliente": f"Cliente {i}", "producto_codigo": "P1",
+              "cliente_codigo": f"C{i}", "cantidad": 1.0, "precio_unit": 2.0, "total": 2.0, "anulada": False}
+             for i in range(n_clientes)]
+    df = pd.DataFrame(filas)
+    df["Cliente"] = df["cliente"]
+    return df
+
+
+def test_lote_usa_hilos_y_no_procesos(tmp_path, monkeypatch):
+    def sin_procesos(*args, **kwargs):
+        raise AssertionError("el lote no debe levantar procesos salvo que se pida")
+    monkeypatch.setattr(reportes, "ProcessPoolExecutor", sin_procesos)
+    n = reportes.MINIMO_PARALELO + 5
+    manifiesto = reportes.generar_reportes_lote(_ventas(n), tmp_path, trabajadores=4)
+    assert len(manifiesto) == n
+    assert json.loads((tmp_path / "manifiesto.json").read_text(encoding="utf-8")) == manifiesto
+    assert all(Path(m["archivo"]).exists() for m in manifiesto)
+
+
+def _homonimos() -> pd.DataFrame:
+    # dos clientes distintos que se llaman igual
+    return pd.DataFrame([
+        {"id": 1, "fecha": "2024-01-02 10:00:00", "producto": "Producto 1", "producto_codigo": "P1",
+         "cliente": "Ana", "cliente_codigo": "C1", "cantidad": 1.0, "total": 10.0, "anulada": False},
+        {"id": 2, "fecha": "2024-01-03 10:00:00", "producto": "Producto 1", "producto_codigo": "P1",
+         "cliente": "Ana", "cliente_codigo": "C2", "cantidad": 2.0, "total": 3.0, "anulada": False},
+        {"id": 3, "fecha": "2024-01-04 10:00:00", "producto": "Producto 1", "producto_codigo": "P1",
+         "cliente": "Ana", "cliente_codigo": "C2", "cantidad": 1.0, "total": 4.0, "anulada": False},
+    ])
+
+
+def test_agregados_separan_clientes_con_el_mismo_nombre():
+    agregados = reportes.AgregadosVentas()
+    agregados.construir(_homonimos())
+    assert agregados.resumen("cliente_codigo", "C1")["total"] == 10.0
+    assert agregados.resumen("cliente_codigo", "C2")["ids"] == [2, 3]
+    assert agregados.grupos("cliente") == ["Ana", "Ana"]
+    # por nombre se suman los dos
+    assert agregados.ids("cliente", "ana") == [1, 2, 3]
+    assert agregados.resumen("cliente", "Ana")["total"] == 17.0
+
+
+def test_agregados_incrementales_igual_que_construir():
+    ventas = _homonimos()
+    agregados = reportes.AgregadosVentas()
+    agregados.construir(ventas.iloc[:1])
+    for venta in ventas.iloc[1:].to_dict("records"):
+        agregados.agregar(venta)
+    agregados.quitar(ventas.iloc[0].to_dict())
+    de_una = reportes.AgregadosVentas()
+    de_una.construir(ventas.iloc[1:])
+    for valor in ("C1", "C2"):
+        assert agregados.resumen("cliente_codigo", valor) == de_una.resumen("cliente_codigo", valor)
+    assert agregados.resumen("cliente", "Ana") == de_una.resumen("cliente", "Ana")
+
+
+def test_top_agrupa_por_codigo_y_agrega_el_nombre():
+    analitica = reportes.AnaliticaVentas()
+    analitica.construir(_homonimos())
+    top = analitica.top("cliente")
+    assert top.columns.tolist() == ["cliente", "ingresos", "unidades", "cliente_codigo"]
+    assert top.values.tolist() == [["Ana", 10.0, 1.0, "C1"], ["Ana", 7.0, 3.0, "C2"]]
+    analitica.agregar({"id": 4, "fecha": "2024-01-05", "producto": "Producto 1", "producto_codigo": "P1",
+                       "cliente": "Ana", "cliente_codigo": "C2", "cantidad": 1.0, "total": 5.0})
+    assert analitica.top("cliente", 1).values.tolist() == [["Ana", 12.0, 4.0, "C2"]]
@@ -0,0 +1,71 @@
+"""ClienteRemoto contra un servidor de verdad en un puerto libre."""
+import pandas as pd
+import pytest
+
+import servidor
+
+
+@pytest.fixture
+def cliente(nucleo):
+    srv = servidor.iniciar("127.0.0.1", 0, trabajadores=2, compactar_cada=3600)
+    yield servidor.ClienteRemoto(f"http://127.0.0.1:{srv.server_address[1]}")
+    servidor.detener(srv)
+
+
+def test_altas_y_ventas_quedan_en_el_servidor(cliente, nucleo):
+    antes = cliente.version(nucleo.HOJA_VENTAS)
+    cliente.crear_producto("P3", "Producto 3", 7, "Proveedor", 1.0)
+    venta = cliente.crear_venta("P3", "C1", 2, 1.0)
+    pedido = cliente.crear_pedido("C2", [("P1", 1, 2.5), ("P3", 1, 1.0)])
+    assert [venta["id"]] + [l["id"] for l in pedido["lineas"]] == [1, 2, 3]
+    assert nucleo.leer_inventario().set_index("codigo")["existencia"]["P3"] == 4
+    assert cliente.anular_venta(venta["id"])["anulada"]
+    assert cliente.vista_ventas()["id"].tolist() == [1, 2, 3]
+    assert cliente.version(nucleo.HOJA_VENTAS) != antes
+
+
+def test_errores_llegan_como_excepciones_del_nucleo(cliente, nucleo):
+    # el tipo exacto no viaja: se levanta la excepción que corresponde al código HTTP
+    with pytest.raises(nucleo.DatosInvalidos, match="Ya existe"):
+        cliente.crear_producto("P1", "Otra vez", 1, "", 1)
+    with pytest.raises(nucleo.DatosInvalidos, match="existencia"):
+        cliente.crear_venta("P2", "C1", 99, 1)
+    with pytest.raises(nucleo.NoEncontrado):
+        cliente.anular_venta(999)
+
+
+def test_lote_se_valida_y_guarda_en_el_servidor(cliente, nucleo, tmp_path):
+    csv = tmp_path / "lote.csv"
+    csv.write_text("producto,cliente,cantidad,precio_unit\nP1,C1,3,2.5\nNO,C1,1,1\nP2,C2,x,1\n")
+    creadas, errores = cliente.importar_ventas_lote(csv)
+    assert creadas["id"].tolist() == [1] and len(errores) == 2
+    assert nucleo.leer_ventas()["id"].tolist() == [1]
+    assert nucleo.leer_inventario().set_index("codigo")["existencia"]["P1"] == 7
+
+
+def test_reportes_y_analisis_con_datos_del_servidor(cliente, nucleo, tmp_path):
+    cliente.crear_venta("P1", "C1", 1, 2.5)
+    cliente.crear_venta("P2", "C2", 1, 4)
+    reporte = cliente.generar_reporte("cliente", "Cliente 1")
+    assert len(reporte) == 1 and reporte["id"].tolist() == [1]
+    assert cliente.generar_reporte("cliente", "Nadie/raro").empty
+    assert len(cliente.generar_reportes_clientes(tmp_path / "reportes")) == 2
+    serie, productos, clientes, version = cliente.analisis("mes", 5)
+    local = nucleo.analisis("mes", 5)
+    pd.testing.assert_frame_equal(productos, local[1], check_dtype=False)
+    pd.testing.assert_frame_equal(clientes, local[2], check_dtype=False)
+    assert isinstance(version, tuple) and version[0] == nucleo.MOTOR_DATOS
+
+
+def test_solo_lo_local_se_toma_de_nucleo(cliente, nucleo):
+    assert cliente.NoEncontrado is nucleo.NoEncontrado
+    assert cliente.bandeja is nucleo.bandeja
+    for nombre in ("ventas_por", "escribir_ventas", "_motor", "no_existe"):
+        with pytest.raises(AttributeError):
+            getattr(cliente, nombre)
+
+
+def test_sin_servidor_es_error_de_almacenamiento(nucleo):
+    cliente = servidor.ClienteRemoto("http://127.0.0.1:9", espera=1)
+    with pytest.raises(nucleo.ErrorAlmacenamiento):
+        cliente.leer_inventario()